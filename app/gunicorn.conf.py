@@ -0,0 +1,28 @@
+"""gunicorn configuration of the docker setup."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+bind = "0.0.0.0:5000"
+workers = 3
+timeout = 60
+# create the application once and share its memory with the workers
+preload_app = True
+
+
+def post_fork(server, worker):
+    # connections must not be shared between processes
+    from wsgi import app
+    from tfomat.models import db
+
+    with app.app_context():
+        db.engine.dispose(close=False)
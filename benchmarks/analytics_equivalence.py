@@ -0,0 +1,136 @@
+"""Check that the NumPy rankings agree with the SQL rankings and time both."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import argparse
+import random
+import sys
+import tempfile
+from datetime import date
+from os.path import join
+from time import perf_counter
+
+from generate import DISCIPLINES, INVALID_VALUES, populate, \
+    make_performances
+from hot_paths import SCALES
+from tfomat import init_app, init_db
+from tfomat.map import INVERSE_DISCIPLINE_MAPPER, AGEGROUPS
+from tfomat.models import db, Performance
+
+WHERE = ["Halle + Freiluft", "Halle", "Freiluft"]
+
+
+def compare(app, years):
+    """
+    Get the rankings of all combinations of filters with and without the
+    analytics engine.
+
+    Args:
+        app (flask.Flask): The application.
+        years (list): The years to compare besides all time.
+
+    Returns:
+        tuple: The differing combinations and the seconds spent in the SQL
+            and the NumPy rankings.
+
+    """
+    from tfomat.views import Rankings
+
+    mismatches = []
+    seconds = {False: 0.0, True: 0.0}
+    for code in DISCIPLINES:
+        discipline = INVERSE_DISCIPLINE_MAPPER.get(code)
+        if discipline is None:
+            continue
+        for year in years + ["Ewige"]:
+            for agegroup in AGEGROUPS:
+                for where in WHERE:
+                    for legal in (False, True):
+                        rankings = dict()
+                        for engine in (False, True):
+                            app.config["ANALYTICS_ENGINE"] = engine
+                            start = perf_counter()
+                            rankings[engine] = Rankings()._get_rankings(
+                                agegroup, discipline, year, where, legal)
+                            seconds[engine] += perf_counter() - start
+                        if rankings[False] != rankings[True]:
+                            mismatches.append(
+                                (discipline, year, agegroup, where, legal))
+    return mismatches, seconds[False], seconds[True]
+
+
+def change_performances(athletes, n, seed):
+    """
+    Add, change and delete performances through the ORM, so the change log
+    is written, including results that are not ranked.
+
+    Args:
+        athletes (list): The athletes as returned by `populate`.
+        n (int): The number of performances to add, change and delete each.
+        seed (int): The seed of the random number generator.
+
+    """
+    rng = random.Random(seed)
+    for values in make_performances(athletes, n, rng):
+        db.session.add(Performance(**values))
+    performances = Performance.query.all()
+    for p in rng.sample(performances, n):
+        p.value = rng.choice([p.value] * 3 + INVALID_VALUES)
+    for p in rng.sample(performances, n):
+        db.session.delete(p)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scale", default="small", choices=list(SCALES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--changes", type=int, default=50,
+                        help="number of performances to add, change and "
+                             "delete between the comparisons")
+    args = parser.parse_args()
+
+    n_athletes, n_performances, _ = SCALES[args.scale]
+    this_year = date.today().year
+    years = [str(this_year), str(this_year - 1)]
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        app = init_app({
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///" + join(tmp, "bench.db"),
+            "CACHE_PATH": tmp,
+            "LADV_OFFLINE": True
+        })
+        init_db(app)
+        with app.app_context():
+            from tfomat.analytics import performance_arrays
+
+            athletes = populate(n_athletes, n_performances, args.seed)
+            for step in ("initial load", "incremental refresh"):
+                if step == "incremental refresh":
+                    change_performances(athletes, args.changes, args.seed)
+                    if not performance_arrays.refresh():
+                        print("the change log was not applied")
+                        failed = True
+                mismatches, sql, vectorized = compare(app, years)
+                print(f"{step}: {len(mismatches)} differing rankings, "
+                      f"SQL {sql:.2f} s, NumPy {vectorized:.2f} s")
+                for mismatch in mismatches[:10]:
+                    print("  differs:", *mismatch)
+                failed |= bool(mismatches)
+            db.session.remove()
+            db.engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""Compare two result files of `hot_paths.py`, e.g. from two commits."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        results = json.load(f)
+    timings = {(t["scale"], t["name"]): t for t in results["timings"]}
+    return results.get("commit"), timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown of the median that is "
+                             "reported as a regression")
+    args = parser.parse_args()
+
+    old_commit, old = load(args.old)
+    new_commit, new = load(args.new)
+    print(f"{'':>6} {'':<28} {old_commit or args.old:>12} "
+          f"{new_commit or args.new:>12}")
+    regressions = 0
+    for key in sorted(old.keys() & new.keys()):
+        before = old[key]["median"]
+        after = new[key]["median"]
+        ratio = after / before if before else float("inf")
+        flag = ""
+        if ratio > 1 + args.threshold:
+            flag = "  slower"
+            regressions += 1
+        elif ratio < 1 - args.threshold:
+            flag = "  faster"
+        print(f"{key[0]:>6} {key[1]:<28} {before * 1000:9.2f} ms "
+              f"{after * 1000:9.2f} ms  {ratio:5.2f}x{flag}")
+    for key in sorted(old.keys() ^ new.keys()):
+        print(f"{key[0]:>6} {key[1]:<28} only in one file")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
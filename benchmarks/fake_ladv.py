@@ -0,0 +1,239 @@
+"""A local stand-in for ladv that serves result pages and API responses."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import argparse
+import json
+import os
+import random
+import re
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+from urllib.parse import urlsplit, parse_qs
+
+from generate import CITIES, DISCIPLINES, format_value, make_athletes, \
+    make_result_page, populate
+from tfomat.response_store import ResponseStore
+
+CLUB_NUMBER = 25
+API_PATH = re.compile(r"^/api/[^/]*/(\w+)$")
+
+
+def normalize(url):
+    """
+    Get the part of a URL that identifies a response regardless of the host
+    and the API key.
+
+    Args:
+        url (str): The URL.
+
+    Returns:
+        str: The path and query of the URL with a placeholder for the key.
+
+    """
+    parts = urlsplit(url)
+    path = re.sub(r"^/api/[^/]*/", "/api/KEY/", parts.path)
+    return path + ("?" + parts.query if parts.query else "")
+
+
+class FakeLadv:
+    """
+    Responses of ladv that are replayed from a response store or generated
+    from a seed.
+
+    Args:
+        store (str): The directory of a response store with recorded
+            responses or None.
+        n_athletes (int): The number of athletes of the club that appear in
+            generated result pages.
+        n_results (int): The number of rows of a generated result page.
+        seed (int): The seed of the generated data.
+
+    """
+
+    def __init__(self, store=None, n_athletes=200, n_results=500, seed=0):
+        self.store = None
+        self.recorded = dict()
+        if store is not None:
+            self.store = ResponseStore(store, offline=True)
+            self.recorded = {normalize(url): url for url in self.store.urls()}
+        self.athletes = make_athletes(n_athletes, random.Random(seed))
+        self.n_results = n_results
+        self.seed = seed
+
+    def get(self, path, base_url):
+        """
+        Get the response for a request.
+
+        Args:
+            path (str): The path and query of the request.
+            base_url (str): The URL of this server for links in responses.
+
+        Returns:
+            tuple: The status code, content type and body of the response.
+
+        """
+        url = self.recorded.get(normalize(path))
+        if url is not None:
+            response = self.store.load(url)
+            if response is not None:
+                return (200, response.headers.get("Content-Type", "text/html"),
+                        response.content)
+
+        parts = urlsplit(path)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        match = re.match(r"^/ergebnisse/(\d+)/?$", parts.path)
+        if match:
+            page = make_result_page(self.athletes, self.n_results,
+                                    seed=self.seed + int(match.group(1)))
+            return 200, "text/html; charset=utf-8", page
+        match = re.match(r"^/veranstaltung/(\d+)/?$", parts.path)
+        if match:
+            page = f'<html><body><a class="ergxml" href="{base_url}' \
+                   f'/ergebnisse/{match.group(1)}/">Ergebnisse</a></body></html>'
+            return 200, "text/html; charset=utf-8", page.encode("utf-8")
+        match = API_PATH.match(parts.path)
+        if match:
+            handler = getattr(self, "_" + match.group(1), None)
+            if handler is not None:
+                body = json.dumps(handler(query, base_url)).encode("utf-8")
+                return 200, "application/json", body
+        return 404, "text/plain", b"not found"
+
+    def _veaList(self, query, base_url):
+        year = int(query.get("datayear", date.today().year))
+        rng = random.Random(self.seed + year)
+        first_day = date(year, 1, 1)
+        return [
+            self._event(year * 1000 + i, first_day + timedelta(
+                days=rng.randint(0, 364)), rng, base_url)
+            for i in range(int(query.get("limit", 200)) // 5)
+        ]
+
+    def _meldList(self, query, base_url):
+        rng = random.Random(self.seed)
+        return [
+            self._event(900000 + i, date.today() + timedelta(days=3 * i + 1),
+                        rng, base_url)
+            for i in range(20)
+        ]
+
+    def _athletDetail(self, query, base_url):
+        athlete_id = int(query.get("id") or 0)
+        year = int(query.get("datayear", date.today().year))
+        rng = random.Random(self.seed + athlete_id * 10000 + year)
+        disciplines = rng.sample(sorted(DISCIPLINES), 3)
+        detail = {"id": athlete_id, "vereinnumber": CLUB_NUMBER,
+                  "meldungen": [], "leistungen": []}
+        if query.get("meld"):
+            for i in range(rng.randint(0, 3)):
+                day = date.today() + timedelta(days=rng.randint(1, 120))
+                event = self._event(800000 + i, day, rng, base_url)
+                event["wettbewerbe"] = [{"disziplin": d} for d in disciplines]
+                detail["meldungen"].append(event)
+        if query.get("leistung"):
+            for _ in range(rng.randint(5, 20)):
+                day = date(year, 1, 1) + timedelta(days=rng.randint(0, 364))
+                discipline = rng.choice(disciplines)
+                detail["leistungen"].append({
+                    "datum": day.strftime("%d.%m.%Y"),
+                    "ort": rng.choice(CITIES),
+                    "disziplin": discipline,
+                    "leistung": format_value(discipline, rng, 1.1),
+                    "wind": "",
+                    "halle": "true" if not 2 < day.month < 11 else "false"
+                })
+        return [detail]
+
+    def _athletQuery(self, query, base_url):
+        return [{"id": sum(map(ord, query.get("query", ""))) % 100000}]
+
+    @staticmethod
+    def _event(event_id, day, rng, base_url):
+        city = rng.choice(CITIES)
+        return {
+            "id": event_id,
+            "name": f"Sportfest {city}",
+            "ort": city,
+            "datum": int(datetime(day.year, day.month, day.day).timestamp())
+            * 1000,
+            "datumText": day.strftime("%d.%m.%Y"),
+            "url": f"{base_url}/veranstaltung/{event_id}/"
+        }
+
+
+def make_handler(ladv, latency, jitter):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+            base_url = f"http://{self.headers.get('Host', 'localhost')}"
+            status, content_type, body = ladv.get(self.path, base_url)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--store",
+                        help="replay the responses recorded in this ladv "
+                             "response store directory")
+    parser.add_argument("--latency", type=float, default=200,
+                        help="mean response time in milliseconds")
+    parser.add_argument("--jitter", type=float, default=100,
+                        help="maximum deviation from the mean response "
+                             "time in milliseconds")
+    parser.add_argument("--athletes", type=int, default=200)
+    parser.add_argument("--results", type=int, default=500,
+                        help="number of rows of a generated result page")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--populate", metavar="DATABASE",
+                        help="fill this SQLite database with the athletes "
+                             "of the generated result pages and exit")
+    parser.add_argument("--performances", type=int, default=20000,
+                        help="number of performances for --populate")
+    args = parser.parse_args()
+
+    if args.populate:
+        from tfomat import init_app, init_db
+        app = init_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///"
+                        + os.path.abspath(args.populate)})
+        init_db(app)
+        with app.app_context():
+            populate(args.athletes, args.performances, args.seed)
+        return 0
+
+    ladv = FakeLadv(args.store, args.athletes, args.results, args.seed)
+    server = ThreadingHTTPServer(
+        (args.host, args.port),
+        make_handler(ladv, args.latency / 1000, args.jitter / 1000))
+    print(f"serving ladv on {args.host}:{args.port} "
+          f"({len(ladv.recorded)} recorded responses)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Seeded generator of synthetic athletes, performances and result pages."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import random
+from datetime import date, timedelta
+from html import escape
+
+from sqlalchemy import insert
+from tfomat.map import INVERSE_DISCIPLINE_MAPPER
+from tfomat.models import db, Athlete, Performance
+
+CLUB = "SV Werder Bremen"
+OTHER_CLUBS = ["LG Nord Berlin", "Hamburger SV", "TuS Lübeck 93",
+               "VfL Wolfsburg", "LG Osnabrück"]
+CITIES = ["Bremen", "Hamburg", "Berlin", "Hannover", "Oldenburg", "Kiel",
+          "Lübeck", "Osnabrück", "Bremerhaven", "Rostock", "Braunschweig",
+          "Göttingen", "Celle", "Verden", "Leverkusen", "Dortmund"]
+FIRST_NAMES = {
+    "M": ["Lukas", "Jonas", "Finn", "Paul", "Leon", "Noah", "Elias", "Ben",
+          "Tim", "Jan", "Max", "Ole"],
+    "W": ["Mia", "Emma", "Lea", "Lena", "Anna", "Marie", "Hannah", "Clara",
+          "Lina", "Sophie", "Ida", "Greta"]
+}
+FAMILY_NAMES = ["Müller", "Schmidt", "Schneider", "Fischer", "Meyer",
+                "Wagner", "Becker", "Hoffmann", "Schulz", "Koch", "Richter",
+                "Wolf", "Krüger", "Hartmann", "Lange", "Brandt", "Janssen",
+                "Peters", "Claßen", "Ahrens"]
+INVALID_VALUES = ["aufg.", "disq.", "o.g.V.", "DNS"]
+
+# best value of a good athlete and the value format of each discipline
+DISCIPLINES = {
+    "60": (7.2, "sprint"), "100": (11.2, "sprint"), "200": (22.8, "sprint"),
+    "400": (51.0, "sprint"), "60H": (8.6, "sprint"),
+    "100H": (14.2, "sprint"), "110H": (15.0, "sprint"),
+    "400H": (58.0, "sprint"), "800": (118.0, "distance"),
+    "1K5": (245.0, "distance"), "MEI": (265.0, "distance"),
+    "HOC": (1.85, "technical"), "WEI": (6.6, "technical"),
+    "DRE": (13.5, "technical"), "STA": (4.2, "technical"),
+    "KUG": (13.0, "technical"), "DIS": (40.0, "technical"),
+    "SPE": (55.0, "technical"), "5-K": (3200, "multi"),
+    "7-K": (5000, "multi"), "10-K": (6500, "multi")
+}
+WIND_DISCIPLINES = {"100", "200", "100H", "110H", "WEI", "DRE"}
+AGEGROUPS = ["JU16", "JU18", "JU20", "U23", ""]
+
+
+def format_value(discipline, rng, level=1.0):
+    """
+    Get a random performance in the format ladv uses for a discipline.
+
+    Args:
+        discipline (str): The short name of the discipline.
+        rng (random.Random): The random number generator.
+        level (float): The relative strength of the athlete, 1 is best.
+
+    Returns:
+        str: The performance, e.g. '11,34', '2:05,12', '6,45' or '5.123'.
+
+    """
+    best, kind = DISCIPLINES[discipline]
+    if rng.random() < 0.02:
+        return rng.choice(INVALID_VALUES)
+    noise = abs(rng.gauss(0, 0.03))
+    if kind == "technical" or kind == "multi":
+        value = best / level * (1 - noise)
+    else:
+        value = best * level * (1 + noise)
+    if kind == "sprint" or kind == "technical":
+        return f"{value:.2f}".replace(".", ",")
+    if kind == "distance":
+        minutes, seconds = divmod(round(value * 100), 6000)
+        return f"{minutes}:{seconds // 100:02d},{seconds % 100:02d}"
+    points = round(value)
+    return f"{points // 1000}.{points % 1000:03d}"
+
+
+def make_athletes(n, rng, start_id=1):
+    """
+    Create athletes with unique names.
+
+    Args:
+        n (int): The number of athletes.
+        rng (random.Random): The random number generator.
+        start_id (int): The id of the first athlete.
+
+    Returns:
+        list: The athletes as dictionaries of column values.
+
+    """
+    athletes = []
+    for i in range(n):
+        gender = rng.choice("MW")
+        name = f"{rng.choice(FIRST_NAMES[gender])} " \
+               f"{rng.choice(FAMILY_NAMES)}-{i}"
+        athletes.append({
+            "id": start_id + i,
+            "name": name,
+            "gender": gender,
+            "year_of_birth": date.today().year - rng.randint(12, 40),
+            "ladv_athlete_number": 100000 + i,
+            "ladv_id": 500000 + i
+        })
+    return athletes
+
+
+def make_performances(athletes, n, rng, years=10):
+    """
+    Create performances of athletes in their favourite disciplines.
+
+    Args:
+        athletes (list): The athletes as returned by `make_athletes`.
+        n (int): The number of performances.
+        rng (random.Random): The random number generator.
+        years (int): The number of years up to today the performances are
+            spread over.
+
+    Returns:
+        list: The performances as dictionaries of column values.
+
+    """
+    profiles = []
+    for athlete in athletes:
+        disciplines = rng.sample(sorted(DISCIPLINES), rng.randint(1, 4))
+        profiles.append((athlete["id"], disciplines, rng.uniform(1.0, 1.3)))
+    # some athletes compete far more often than others
+    weights = [rng.paretovariate(1.5) for _ in profiles]
+
+    today = date.today()
+    first_day = date(today.year - years + 1, 1, 1)
+    span = (today - first_day).days
+    performances = []
+    for athlete_id, disciplines, level in rng.choices(profiles, weights, k=n):
+        discipline = rng.choice(disciplines)
+        day = first_day + timedelta(days=rng.randint(0, span))
+        indoor = not 2 < day.month < 11
+        wind = None
+        if discipline in WIND_DISCIPLINES and not indoor:
+            wind = round(rng.gauss(0.5, 1.2), 1)
+        performances.append({
+            "date": day.strftime("%d.%m.%Y"),
+            "city": rng.choice(CITIES),
+            "athlete_id": athlete_id,
+            "discipline": discipline,
+            "value": format_value(discipline, rng, level),
+            "unit": None,
+            "wind": wind,
+            "placement": rng.randint(1, 8),
+            "championship": None,
+            "indoor": indoor
+        })
+    return performances
+
+
+def populate(n_athletes, n_performances, seed=0, years=10):
+    """
+    Fill the database of the current application with synthetic data.
+
+    Args:
+        n_athletes (int): The number of athletes.
+        n_performances (int): The number of performances.
+        seed (int): The seed of the random number generator.
+        years (int): The number of years the performances are spread over.
+
+    Returns:
+        list: The athletes as dictionaries of column values.
+
+    """
+    rng = random.Random(seed)
+    athletes = make_athletes(n_athletes, rng)
+    performances = make_performances(athletes, n_performances, rng, years)
+    db.session.execute(insert(Athlete), athletes)
+    db.session.execute(insert(Performance), performances)
+    db.session.commit()
+    return athletes
+
+
+def make_result_page(athletes, n_results, seed=0, day=None, city="Bremen",
+                     club_share=0.3):
+    """
+    Create a result page of a meeting in the layout of ladv.
+
+    Args:
+        athletes (list): The athletes of the club as returned by
+            `make_athletes`.
+        n_results (int): The number of result rows of all clubs.
+        seed (int): The seed of the random number generator.
+        day (datetime.date): The day of the meeting, today by default.
+        city (str): The city of the meeting.
+        club_share (float): The share of rows from athletes of `CLUB`.
+
+    Returns:
+        bytes: The HTML contents of the page.
+
+    """
+    rng = random.Random(seed)
+    day = (day or date.today()).strftime("%d.%m.%Y")
+    names = {"M": [a for a in athletes if a["gender"] == "M"],
+             "W": [a for a in athletes if a["gender"] == "W"]}
+    lines = [
+        "<html><head><title>ladv</title></head><body>",
+        '<div class="header"><div class="title">Synthetisches Sportfest '
+        f'{city}</div><div class="titleortdatum">am {day} in {city}</div>'
+        "</div>"
+    ]
+    written = 0
+    while written < n_results:
+        discipline = rng.choice(sorted(DISCIPLINES))
+        gender = rng.choice("MW")
+        agegroup = gender + rng.choice(AGEGROUPS)
+        subtitle = rng.choice(["Finale", "Vorlauf", "Zeitvorlauf",
+                               "Rangfolge"])
+        heading = f"{INVERSE_DISCIPLINE_MAPPER.get(discipline, discipline)} " \
+                  f"({subtitle}) - {agegroup}"
+        lines.append('<div class="erg_runde">')
+        lines.append(f'<div class="erg_headline_left">{escape(heading)}</div>'
+                     f'<div class="erg_headline_right">{day}</div>')
+        for rank in range(1, min(rng.randint(4, 12), n_results - written) + 1):
+            if names[gender] and rng.random() < club_share:
+                athlete = rng.choice(names[gender])
+                first_name, family_name = athlete["name"].split(" ", 1)
+                club = CLUB
+            else:
+                first_name = rng.choice(FIRST_NAMES[gender])
+                family_name = rng.choice(FAMILY_NAMES)
+                club = rng.choice(OTHER_CLUBS)
+            wind = f"{rng.gauss(0.5, 1.2):+.1f}".replace(".", ",") \
+                if discipline in WIND_DISCIPLINES else ""
+            lines.append(
+                '<div class="erg_row">'
+                f'<div class="platz">{rank}.</div>'
+                f'<div class="erg_athlet">{escape(family_name)}, '
+                f'{escape(first_name)}</div>'
+                f'<div class="club">{escape(club)}</div>'
+                f'<div class="performance">'
+                f'{format_value(discipline, rng, 1 + rank / 50)}</div>'
+                f'<div class="wind">{wind}</div>'
+                "</div>"
+            )
+            written += 1
+        lines.append("</div>")
+    lines.append("</body></html>")
+    return "\n".join(lines).encode("utf-8")
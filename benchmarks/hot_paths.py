@@ -0,0 +1,167 @@
+"""Time the hot paths of tfomat on synthetic data at several scales."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import argparse
+import copy
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import date, datetime
+from hashlib import sha256
+from os.path import join
+from timeit import repeat
+
+from generate import CLUB, populate, make_result_page
+from tfomat import init_app, init_db
+from tfomat.map import map_to_number
+from tfomat.models import db, Athlete, Performance
+
+# number of athletes, performances and result rows of a meeting
+SCALES = {
+    "small": (50, 2_000, 200),
+    "medium": (200, 20_000, 500),
+    "large": (1_000, 100_000, 2_000)
+}
+
+
+def run_scale(scale, seed, n_repeat):
+    """
+    Time all hot paths on a fresh database of one scale.
+
+    Args:
+        scale (str): The name of the scale in `SCALES`.
+        seed (int): The seed for the synthetic data.
+        n_repeat (int): How often each function is timed.
+
+    Returns:
+        list: The timings of the functions.
+
+    """
+    n_athletes, n_performances, n_results = SCALES[scale]
+    with tempfile.TemporaryDirectory() as tmp:
+        app = init_app({
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///" + join(tmp, "bench.db"),
+            "CACHE_PATH": tmp,
+            "LADV_CACHE_PATH": join(tmp, "ladv"),
+            "LADV_OFFLINE": True
+        })
+        init_db(app)
+        with app.app_context():
+            from tfomat.ladv_scraper import LADV_RESULT_URL, find_results
+            from tfomat.response_store import response_store, StoredResponse
+            from tfomat.views import Rankings, _update_database
+
+            athletes = populate(n_athletes, n_performances, seed)
+            page = make_result_page(athletes, n_results, seed)
+            url = LADV_RESULT_URL.format(1)
+            response_store._store(sha256(url.encode("utf-8")).hexdigest(),
+                                  url, StoredResponse(url, 200, page, {}))
+
+            values = [v for v, in db.session.query(Performance.value)]
+            athlete_id, _ = db.session.query(
+                Performance.athlete_id, db.func.count()
+            ).group_by(Performance.athlete_id).order_by(
+                db.func.count().desc()).first()
+            athlete = db.session.get(Athlete, athlete_id)
+            discipline, value = db.session.query(
+                Performance.discipline, Performance.value
+            ).filter_by(athlete_id=athlete_id).first()
+            year = str(date.today().year)
+            _, results = find_results(1, CLUB)
+
+            def update_database():
+                _update_database("Bremen", copy.deepcopy(results))
+                db.session.expire_all()
+
+            # the first call inserts the results, later calls find them
+            update_database()
+            cases = [
+                ("map_to_number", len(values),
+                 lambda: [map_to_number(v) for v in values]),
+                ("rankings_year", n_performances,
+                 lambda: Rankings()._get_rankings(
+                     "Alle", "100 m", year, "Halle + Freiluft")),
+                ("rankings_all_time_agegroup", n_performances,
+                 lambda: Rankings()._get_rankings(
+                     "MJU18", "Weitsprung", "Ewige", "Freiluft")),
+                ("get_disciplines", n_performances,
+                 lambda: athlete.get_disciplines()),
+                ("get_last_competitions", n_performances,
+                 lambda: athlete.get_last_competitions()),
+                ("is_record", n_performances,
+                 lambda: athlete.is_record(discipline, value)),
+                ("find_results", n_results, lambda: find_results(1, CLUB)),
+                ("update_database", len(results), update_database)
+            ]
+
+            timings = []
+            for name, n, func in cases:
+                times = repeat(func, number=1, repeat=n_repeat)
+                db.session.rollback()
+                timings.append({
+                    "name": name, "scale": scale, "n": n,
+                    "min": min(times), "median": statistics.median(times),
+                    "repeat": n_repeat
+                })
+                print(f"{scale:>6} {name:<28} n={n:<7} "
+                      f"min {min(times) * 1000:9.2f} ms  "
+                      f"median {statistics.median(times) * 1000:9.2f} ms",
+                      file=sys.stderr)
+            db.session.remove()
+            db.engine.dispose()
+    return timings
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scales", nargs="+", default=["small", "medium"],
+                        choices=list(SCALES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output",
+                        help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {
+        "commit": get_commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "timings": []
+    }
+    for scale in args.scales:
+        results["timings"] += run_scale(scale, args.seed, args.repeat)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""Drive a running tfomat instance with concurrent requests and report the
+throughput, latency percentiles and error rate per endpoint."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import argparse
+import json
+import random
+import sys
+from datetime import date
+from threading import Thread
+from time import perf_counter
+
+import requests
+
+RANKING_DISCIPLINES = ["100 m", "200 m", "800 m", "Weitsprung", "Hochsprung",
+                       "Kugel", "Speer"]
+RANKING_AGEGROUPS = ["Alle", "MJU18", "WJU18", "MJU20", "WJU20"]
+# outcomes of a request
+OK = "ok"
+# the placeholder of a background job instead of the page
+PENDING = "pending"
+ERROR = "error"
+
+
+def results_requests(rng, args):
+    meeting_id = rng.choice(args.meetings)
+    return [("results", f"/results/{meeting_id}")]
+
+
+def ranking_requests(rng, args):
+    params = {
+        "disc": rng.choice(RANKING_DISCIPLINES),
+        "year": rng.choice([str(args.year), str(args.year - 1), "Ewige"]),
+        "age": rng.choice(RANKING_AGEGROUPS),
+        "where": "Halle + Freiluft"
+    }
+    query = "&".join(f"{k}={requests.utils.quote(v)}" for k, v in params.items())
+    return [("ranking", "/api/ranking?" + query)]
+
+
+def profile_requests(rng, args):
+    athlete_id = rng.choice(args.athletes)
+    # the requests a browser sends when opening a profile
+    return [
+        ("profile", f"/athletes/{athlete_id}"),
+        ("athlete-profile", f"/api/athlete-profile?id={athlete_id}"),
+        ("upcoming-competitions",
+         f"/api/athlete-upcoming-competitions?id={athlete_id}")
+    ]
+
+
+SCENARIOS = {
+    "results": results_requests,
+    "ranking": ranking_requests,
+    "profile": profile_requests
+}
+
+
+def percentile(values, p):
+    """
+    Get the p-th percentile of sorted values with the nearest-rank method.
+
+    Args:
+        values (list): The sorted values.
+        p (float): The percentile between 0 and 100.
+
+    Returns:
+        float: The percentile.
+
+    """
+    if not values:
+        return float("nan")
+    index = max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+def worker(worker_id, args, deadline, records):
+    rng = random.Random(args.seed + worker_id)
+    scenarios = list(args.mix)
+    weights = [args.mix[s] for s in scenarios]
+    session = requests.Session()
+    while perf_counter() < deadline:
+        scenario = rng.choices(scenarios, weights)[0]
+        for endpoint, path in SCENARIOS[scenario](rng, args):
+            start = perf_counter()
+            try:
+                response = session.get(args.base_url + path,
+                                       timeout=args.timeout)
+                if response.status_code >= 400:
+                    outcome = ERROR
+                elif "Retry-After" in response.headers:
+                    outcome = PENDING
+                else:
+                    outcome = OK
+            except requests.RequestException:
+                outcome = ERROR
+            records.append((endpoint, perf_counter() - start, outcome))
+
+
+def summarize(records, duration):
+    """
+    Get the throughput, latency percentiles and error rate of requests.
+
+    Only requests that got the page count for the throughput and the
+    latencies. Requests that got the placeholder of a background job are
+    counted as pending.
+
+    Args:
+        records (list): Tuples of the endpoint, latency in seconds and
+            the outcome of the request (`OK`, `PENDING` or `ERROR`).
+        duration (float): The duration of the test in seconds.
+
+    Returns:
+        dict: The statistics by endpoint and in total.
+
+    """
+    by_endpoint = {"total": records}
+    for record in records:
+        by_endpoint.setdefault(record[0], []).append(record)
+
+    summary = dict()
+    for endpoint, entries in by_endpoint.items():
+        latencies = sorted(latency for _, latency, outcome in entries
+                           if outcome == OK)
+        outcomes = [outcome for _, _, outcome in entries]
+        summary[endpoint] = {
+            "requests": len(entries),
+            "throughput": len(latencies) / duration,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "pending_rate": outcomes.count(PENDING) / len(entries)
+            if entries else 0.0,
+            "error_rate": outcomes.count(ERROR) / len(entries)
+            if entries else 0.0
+        }
+    return summary
+
+
+def parse_mix(mix):
+    weights = dict()
+    for entry in mix.split(","):
+        scenario, _, weight = entry.partition("=")
+        if scenario not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario {scenario}")
+        weights[scenario] = float(weight or 1)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost")
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-d", "--duration", type=float, default=30,
+                        help="duration of the test in seconds")
+    parser.add_argument("--mix", type=parse_mix,
+                        default="results=5,ranking=3,profile=2",
+                        help="relative weights of the scenarios "
+                             f"{', '.join(SCENARIOS)}")
+    parser.add_argument("--meetings", type=int, nargs="+",
+                        default=list(range(1, 21)),
+                        help="ids of the result pages to request")
+    parser.add_argument("--athletes", type=int, nargs="+",
+                        default=list(range(1, 51)),
+                        help="ids of the athletes whose profiles are "
+                             "requested")
+    parser.add_argument("--year", type=int, default=date.today().year)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output",
+                        help="write the statistics as JSON to this file")
+    args = parser.parse_args()
+    args.base_url = args.base_url.rstrip("/")
+
+    records = []
+    start = perf_counter()
+    deadline = start + args.duration
+    threads = [Thread(target=worker, args=(i, args, deadline, records))
+               for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    summary = summarize(records, perf_counter() - start)
+
+    print(f"{'endpoint':<24} {'requests':>9} {'req/s':>8} {'p50 ms':>9} "
+          f"{'p95 ms':>9} {'p99 ms':>9} {'pending':>8} {'errors':>7}")
+    for endpoint, stats in summary.items():
+        print(f"{endpoint:<24} {stats['requests']:>9} "
+              f"{stats['throughput']:>8.1f} {stats['p50'] * 1000:>9.1f} "
+              f"{stats['p95'] * 1000:>9.1f} {stats['p99'] * 1000:>9.1f} "
+              f"{stats['pending_rate']:>8.1%} {stats['error_rate']:>7.1%}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"concurrency": args.concurrency,
+                       "duration": args.duration, "mix": args.mix,
+                       "endpoints": summary}, f, indent=2)
+    return 1 if not records else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
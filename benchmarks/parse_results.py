@@ -0,0 +1,99 @@
+"""Compare the targeted result page parser with the full tree parser."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import argparse
+import re
+from timeit import repeat
+
+from bs4 import BeautifulSoup
+from tfomat.ladv_scraper import CLASSES, PARSER, get_meeting_info, \
+    parse_results
+from tfomat.response_store import ResponseStore
+
+
+def legacy_parse_results(content, club_name):
+    """
+    Parse a result page the way `find_results` used to: build the complete
+    document tree and search every table and row separately.
+    """
+    soup = BeautifulSoup(content, "html.parser")
+    meeting_info = get_meeting_info(soup)
+    results = []
+    for table in soup.find_all("div", class_=CLASSES["tables"]):
+        heading = table.find("div", class_=CLASSES["event"])
+        date = table.find("div", class_=CLASSES["date"])
+        if heading is None or date is None:
+            continue
+        event_data = {
+            "agegroup": heading.text.split("-")[-1].strip(),
+            "date": date.text.strip(),
+            "event": re.search(r".*(?=\()", heading.text).group(0).strip(),
+            "subtitle": re.search(r"(?<=\().*(?=\))", heading.text).group(0).strip()
+        }
+        for row in table.find_all("div", class_=CLASSES["row"]):
+            club = row.find("div", class_=CLASSES["club"])
+            if club and club.text != club_name:
+                continue
+            name_div = row.find("div", class_=CLASSES["name"])
+            rank = row.find("div", class_=CLASSES["rank"])
+            result = row.find("div", class_=CLASSES["result"])
+            wind = row.find("div", class_=CLASSES["wind"])
+            if any(a is None for a in (name_div, rank, result, wind)):
+                continue
+            names = [c.strip() for c in name_div.text.split(",")]
+            entry = {"name": f"{names[-1]} {names[0]}", "surname": names[-1],
+                     "familyname": names[0], "result": result.text.strip(),
+                     "wind": wind.text.strip(), "rank": rank.text.strip()}
+            entry.update(event_data)
+            results.append(entry)
+    return meeting_info, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("pages", nargs="*",
+                        help="saved ladv result pages (HTML files)")
+    parser.add_argument("--store",
+                        help="benchmark all result pages recorded in a "
+                             "ladv response store directory")
+    parser.add_argument("--club", default="SV Werder Bremen")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = []
+    for page in args.pages:
+        with open(page, "rb") as f:
+            pages.append((page, f.read()))
+    if args.store:
+        store = ResponseStore(args.store, offline=True)
+        pages += [(url, store.load(url).content) for url in store.urls()
+                  if "/ergebnisse/" in url]
+
+    print(f"parser backend: {PARSER}")
+    for page, content in pages:
+        if legacy_parse_results(content, args.club) != \
+                parse_results(content, args.club):
+            print(f"{page}: WARNING results differ between parsers")
+        legacy = min(repeat(lambda: legacy_parse_results(content, args.club),
+                            number=1, repeat=args.repeat))
+        targeted = min(repeat(lambda: parse_results(content, args.club),
+                              number=1, repeat=args.repeat))
+        print(f"{page}: {len(content) / 1024:.0f} kB, "
+              f"legacy {legacy * 1000:.1f} ms, targeted {targeted * 1000:.1f} ms "
+              f"({legacy / targeted:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
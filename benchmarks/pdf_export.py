@@ -0,0 +1,143 @@
+"""Benchmark the pdf export of a large championship meeting."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import argparse
+import os
+import random
+import tempfile
+from time import perf_counter
+
+from tfomat import print as latex_print
+from tfomat.cache import result_cache
+from tfomat.pdf_writer import make_pdf as make_direct_pdf
+
+AGEGROUPS = ["Männer", "Frauen", "MU20", "WU20", "MU18", "WU18", "MU16",
+             "WU16"]
+DISCIPLINES = ["100 m", "200 m", "400 m", "800 m", "1.500 m", "110 m Hürden",
+               "Hochsprung", "Weitsprung", "Dreisprung", "Kugel", "Diskus",
+               "Speer"]
+
+
+def make_meeting(rows, seed=0):
+    """
+    Create the print view of a meeting with `rows` results.
+
+    Args:
+        rows (int): The number of results.
+        seed (int): The seed for the random number generator.
+
+    Returns:
+        dict: The results grouped by age group and discipline.
+
+    """
+    rng = random.Random(seed)
+    data = dict()
+    for i in range(rows):
+        age = AGEGROUPS[i % len(AGEGROUPS)]
+        disc = DISCIPLINES[(i // len(AGEGROUPS)) % len(DISCIPLINES)]
+        data.setdefault(age, dict()).setdefault(disc, []).append({
+            "name": f"Athlet_in {i} Nachname-{rng.randint(0, 999)}",
+            "subtitle": rng.choice(["Vorlauf", "Finale", "Zeitläufe"]),
+            "rank": f"{rng.randint(1, 12)}.",
+            "result": f"{rng.uniform(10, 60):.2f}".replace(".", ","),
+            "pborsb": rng.choice(["", "SB", "PB", "=PB"])
+        })
+    return data
+
+
+def legacy_make_pdf(data, title, subtitle, name):
+    """Create the pdf with a pylatex document tree, as `make_pdf` used to."""
+    from pylatex import Document, Section, MultiColumn, NewLine, \
+        MediumText, LargeText, LongTabu, NoEscape, Package
+    from pylatex.utils import bold
+
+    geometry_options = {
+        "tmargin": "15mm", "lmargin": "20mm", "rmargin": "20mm",
+        "bmargin": "20mm"
+    }
+    doc = Document(geometry_options=geometry_options, page_numbers=False)
+    doc.change_length("\\tabulinesep", "4pt")
+    doc.packages.append(Package("xcolor"))
+    LongTabu.packages = [Package("tabu")]
+    doc.preamble.append(NoEscape(r'\usepackage{longtable}[=v4.13]'))
+    with doc.create(Section(title, numbering=False)):
+        doc.append(MediumText(bold(subtitle)))
+        doc.append(NewLine())
+        doc.append(NewLine())
+        fmt_string = r"\hspace*{-1mm}\colorbox{black!10}{\strut\parbox{\dimexpr\textwidth - 2\fboxsep\relax}{"
+        with doc.create(LongTabu("X[2.5, l] X[1.5, l] X[r] X[1.5, r] X[r]")) as data_table:
+            row_counter = 0
+            for age in data:
+                data_table.add_row((MultiColumn(5, align='l', data=LargeText(bold(age))),))
+                data_table.add_empty_row()
+                for disc in data[age]:
+                    data_table.add_row((MultiColumn(5, align='l', data=MediumText(bold(disc))),))
+                    data_table.add_row(["Name", "", "Rang", "Leistung", "SB/PB"], mapper=[bold])
+                    data_table.add_hline()
+                    for r in data[age][disc]:
+                        name_cell = NoEscape(fmt_string + r["name"] + r"}}") if row_counter % 2 else r["name"]
+                        data_table.add_row([name_cell, r["subtitle"], r["rank"], r["result"], r["pborsb"]])
+                        row_counter += 1
+                    data_table.add_empty_row()
+                data_table.add_empty_row()
+                data_table.add_empty_row()
+    doc.generate_pdf(name, clean_tex=True)
+
+
+def _time(func, *args):
+    start = perf_counter()
+    func(*args)
+    return perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    data = make_meeting(args.rows)
+    title, subtitle = "Deutsche Meisterschaften", "am 01.07.2024 in Bremen"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        name = os.path.join(tmp_dir, "meeting")
+        result_cache.path = os.path.join(tmp_dir, "results")
+        os.makedirs(result_cache.path)
+
+        timings = dict()
+        if not args.skip_legacy:
+            timings["legacy pylatex"] = _time(
+                legacy_make_pdf, data, title, subtitle, name)
+        timings["tex source only"] = _time(
+            latex_print.make_tex, data, title, subtitle)
+        timings["build without format"] = _time(
+            latex_print.make_pdf, data, title, subtitle, name)
+        result_cache.invalidate(*os.listdir(result_cache.path))
+        timings["precompile format"] = _time(latex_print.build_format)
+        timings["build with format"] = _time(
+            latex_print.make_pdf, data, title, subtitle, name)
+        timings["unchanged (hash cache)"] = _time(
+            latex_print.make_pdf, data, title, subtitle, name)
+        timings["direct renderer"] = _time(
+            make_direct_pdf, data, title, subtitle, name)
+        # the format is stored in the temporary result cache
+        has_format = latex_print.build_format()
+
+    print(f"{args.rows} rows, precompiled format: {has_format}")
+    for label, seconds in timings.items():
+        print(f"{label:>28}: {seconds * 1000:8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
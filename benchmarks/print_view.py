@@ -0,0 +1,88 @@
+"""Benchmark the grouping and sorting of meeting results for the print view."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import argparse
+import random
+from time import perf_counter
+
+from tfomat.results import group_results
+
+DISCIPLINES = {"100 m": (10, 14), "800 m": None, "Weitsprung": (4, 8),
+               "Kugel": (8, 18), "Hochsprung": (1, 2.2), "60 m Hürden": (7, 10)}
+
+
+def make_results(n, agegroups, seed=0):
+    """Create `n` scraped results spread over `agegroups` age groups."""
+    rng = random.Random(seed)
+    results = []
+    for i in range(n):
+        discipline = rng.choice(list(DISCIPLINES))
+        limits = DISCIPLINES[discipline]
+        if rng.random() < 0.05:
+            result = rng.choice(["DNF", "DNS", "o.g.V."])
+        elif limits is None:
+            result = f"{rng.randint(1, 3)}:{rng.randint(0, 59):02d},{rng.randint(0, 99):02d}"
+        else:
+            result = f"{rng.uniform(*limits):.2f}".replace(".", ",")
+        results.append({"agegroup": f"U{agegroups + i % agegroups}",
+                        "event": discipline, "result": result})
+    return results
+
+
+def legacy_group_results(results):
+    """Group results as the print view used to, with a scan per group."""
+    def sort_by_result(value):
+        digits = "".join(c for c in value["result"] if c.isdigit())
+        return int(digits) if digits else 0
+
+    def contains_digits(s):
+        return any(d in s for d in "123456789")
+
+    print_view = dict()
+    for agegroup in sorted(set(r["agegroup"] for r in results)):
+        events = [r for r in results if r["agegroup"] == agegroup]
+        print_view[agegroup] = {}
+        for d in sorted(set(e["event"] for e in events)):
+            matches = [e for e in events if e["event"] == d]
+            matches.sort(key=sort_by_result)
+            if not contains_digits(d):
+                matches.reverse()
+            print_view[agegroup][d] = \
+                [m for m in matches if contains_digits(m["result"])] + \
+                [m for m in matches if not contains_digits(m["result"])]
+    return print_view
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1000, 10000, 100000])
+    parser.add_argument("--agegroups", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'results':>8} {'legacy ms':>10} {'new ms':>10} {'new us/result':>14}")
+    for n in args.sizes:
+        results = make_results(n, args.agegroups)
+        timings = []
+        for func in (legacy_group_results, group_results):
+            start = perf_counter()
+            func(results)
+            timings.append(perf_counter() - start)
+        print(f"{n:>8} {timings[0] * 1000:>10.1f} {timings[1] * 1000:>10.1f} "
+              f"{timings[1] / n * 1e6:>14.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
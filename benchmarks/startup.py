@@ -0,0 +1,122 @@
+"""Measure how long it takes to import tfomat and create the application."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+from hot_paths import get_commit
+
+# what a gunicorn worker does on boot
+STARTUP = """
+from time import perf_counter
+start = perf_counter()
+from tfomat import init_app
+app = init_app()
+print(perf_counter() - start)
+"""
+# modules whose cumulative import time is reported
+MODULES = ["tfomat", "tfomat.views", "tfomat.models", "tfomat.ladv_scraper",
+           "flask", "flask_restful", "flask_sqlalchemy", "sqlalchemy",
+           "bs4", "lxml", "requests", "numpy"]
+
+
+def run_once(cwd):
+    """
+    Create the application in a new interpreter.
+
+    Args:
+        cwd (str): The working directory of the interpreter.
+
+    Returns:
+        tuple: The time to create the application in seconds and the
+            cumulative import times of the modules in seconds by name.
+
+    """
+    env = dict(os.environ, **{"CACHE-PATH": cwd})
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP], cwd=cwd,
+        env=env, capture_output=True, text=True, check=True)
+    imports = dict()
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = [f.strip() for f in line[len("import time:"):].split("|")]
+        try:
+            imports[fields[2]] = int(fields[1]) / 1e6
+        except ValueError:
+            continue
+    return float(process.stdout.strip().splitlines()[-1]), imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15,
+                        help="number of the slowest imports to show")
+    parser.add_argument("-o", "--output",
+                        help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    totals = []
+    imports = dict()
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(args.repeat):
+            total, run_imports = run_once(tmp)
+            totals.append(total)
+            for module, seconds in run_imports.items():
+                imports.setdefault(module, []).append(seconds)
+
+    timings = [{"name": "init_app", "scale": "startup", "n": 1,
+                "min": min(totals), "median": statistics.median(totals),
+                "repeat": args.repeat}]
+    for module in MODULES:
+        if module in imports:
+            timings.append({
+                "name": f"import {module}", "scale": "startup", "n": 1,
+                "min": min(imports[module]),
+                "median": statistics.median(imports[module]),
+                "repeat": len(imports[module])
+            })
+
+    print(f"init_app: median {statistics.median(totals) * 1000:.1f} ms",
+          file=sys.stderr)
+    slowest = sorted(imports.items(), key=lambda i: -statistics.median(i[1]))
+    for module, seconds in slowest[:args.top]:
+        print(f"  {statistics.median(seconds) * 1000:8.1f} ms  {module}",
+              file=sys.stderr)
+
+    results = {
+        "commit": get_commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "timings": timings
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
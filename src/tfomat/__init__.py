@@ -19,27 +19,102 @@ from dotenv import load_dotenv
 from flask import Flask
 from flask_bootstrap import Bootstrap
 from flask_restful import Api
-from tfomat.models import db
+from sqlalchemy import inspect, text
+from tfomat.cache import result_cache
+from tfomat.metrics import metrics
+from tfomat.models import db, Performance, Qualification, \
+    update_qualifications, MAX_LEGAL_WIND
+from tfomat.query_log import nplusone
+from tfomat.response_store import response_store
 
 
-def init_app():
-    """Create Flask application."""
+def init_app(test_config=None):
+    """
+    Create Flask application.
+
+    No database connection is opened and no threads or processes are
+    started, so the application can be created once before the worker
+    processes are forked (`gunicorn --preload`). The database schema is
+    created by `init_db`.
+    """
     app = Flask(__name__, instance_relative_config=False)
     Bootstrap(app)
     app.config.from_object('tfomat.config.Config')
-    cache_path = join(app.root_path, "cache")
+    if test_config is not None:
+        app.config.update(test_config)
+    cache_path = app.config["CACHE_PATH"] or join(app.root_path, "cache")
     if not exists(cache_path):
         mkdir(cache_path)
     db.init_app(app)
+    result_cache.init_app(app)
+    response_store.init_app(app)
+    metrics.init_app(app)
+    nplusone.init_app(app)
+
+    from tfomat.views import nav, views, add_resources
+    nav.init_app(app)
+    app.register_blueprint(views)
+    api = Api(app)
+    add_resources(api)
+    return app
+
+
+def init_db(app):
+    """
+    Create the tables of the database that do not exist yet and add the
+    columns and indexes that databases of older versions are missing. Also
+    precompiles the LaTeX preamble if pdfs are rendered with LaTeX.
 
+    Args:
+        app (flask.Flask): The application.
+
+    Returns:
+        None.
+
+    """
     with app.app_context():
         db.create_all()
-        from tfomat.views import nav, views, add_resources
-        nav.init_app(app)
-        app.register_blueprint(views)
-        api = Api(app)
-        add_resources(api)
-        return app
+        columns = {c["name"] for c in inspect(db.engine).get_columns(
+            Performance.__tablename__)}
+        if "wind_legal" not in columns:
+            with db.engine.begin() as connection:
+                connection.execute(text(
+                    "ALTER TABLE performance ADD COLUMN wind_legal BOOLEAN"))
+                connection.execute(
+                    Performance.__table__.update().values(
+                        wind_legal=db.or_(Performance.wind.is_(None),
+                                          Performance.wind <= MAX_LEGAL_WIND)))
+        if "number" not in columns:
+            with db.engine.begin() as connection:
+                connection.execute(text(
+                    "ALTER TABLE performance ADD COLUMN number FLOAT"))
+                connection.execute(
+                    Performance.__table__.update().values(
+                        number=db.func.map_to_number(Performance.value)))
+        # create_all only adds the indexes of new tables and keeps indexes
+        # whose columns have changed
+        existing = {
+            index["name"]: index["column_names"]
+            for index in inspect(db.engine).get_indexes(
+                Performance.__tablename__)
+        }
+        with db.engine.begin() as connection:
+            if "ix_performance_wind_legal" in existing:
+                connection.execute(text("DROP INDEX ix_performance_wind_legal"))
+            for index in Performance.__table__.indexes:
+                columns = [column.name for column in index.columns]
+                if existing.get(index.name, columns) != columns:
+                    index.drop(connection)
+                if existing.get(index.name) != columns:
+                    index.create(connection)
+        if db.session.query(Qualification.id).first() is None:
+            update_qualifications(db.session.connection())
+            db.session.commit()
+    if app.config["PDF_RENDERER"] == "latex":
+        from tfomat.print import build_format
+
+        # so the first pdf request does not wait for it
+        build_format()
 
 
 def _check_env_variables():
@@ -62,8 +137,21 @@ def _check_env_variables():
     return True
 
 
+def _work():
+    if not _check_env_variables():
+        return -1
+    from tfomat.jobs import work
+    app = init_app()
+    work(app, poll_interval=app.config["JOB_POLL_INTERVAL"])
+
+
+def _init_db():
+    init_db(init_app())
+
+
 def _up():
     if not _check_env_variables():
         return -1
     app = init_app()
+    init_db(app)
     app.run(port=app.config["PORT"])
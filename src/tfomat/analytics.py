@@ -0,0 +1,231 @@
+"""Vectorized queries over a copy of the performance table held in memory."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from datetime import datetime
+from threading import Lock
+
+import numpy as np
+from tfomat.map import map_to_number
+from tfomat.models import db, Performance, PerformanceChange, ASCENDING, \
+    MAX_LEGAL_WIND
+
+# dtypes of the columns
+COLUMNS = {
+    "id": np.int64,
+    "athlete": np.int64,
+    # index into `PerformanceArrays.disciplines`
+    "discipline": np.int32,
+    # the value of `map_to_number`, NaN for results that are not ranked
+    "value": np.float64,
+    # days since 0001-01-01 like `date.toordinal`, -1 for invalid dates
+    "date": np.int32,
+    "year": np.int32,
+    "indoor": np.bool_,
+    # NaN if there was no wind measurement
+    "wind": np.float32
+}
+# reload everything if more performances have changed since the last refresh
+MAX_CHANGES = 5000
+
+
+class PerformanceArrays:
+    """
+    The performance table as one NumPy array per column, for the queries of
+    the rankings without one SQL statement per athlete.
+
+    The arrays are loaded on first use and refreshed from the
+    `PerformanceChange` log before every query, so only the performances that
+    changed since the last query are read from the database. Results that
+    are not ranked, i.e. values that `map_to_number` cannot read or that
+    contain 'a', 'd' or 'o' (e.g. 'DNF', 'aufg.'), have a NaN value.
+    Queries require an application context.
+
+    Attributes:
+        disciplines (dict): The integer codes of the disciplines by name.
+        change_id (int): The id of the last change that is included.
+
+    """
+
+    def __init__(self):
+        self.disciplines = dict()
+        self.change_id = None
+        self._columns = None
+        self._lock = Lock()
+
+    def refresh(self):
+        """
+        Include the performances that changed since the last refresh.
+
+        Returns:
+            bool: Whether the arrays changed.
+
+        """
+        latest, oldest = db.session.query(
+            db.func.max(PerformanceChange.id), db.func.min(PerformanceChange.id)
+        ).one()
+        latest = latest or 0
+        with self._lock:
+            if self._columns is not None and latest <= self.change_id:
+                return False
+            if self._columns is None or (
+                    oldest is not None and oldest > self.change_id + 1):
+                # never loaded or the log was pruned past the last refresh
+                self._columns = self._to_columns(self._query_rows())
+            else:
+                self._apply_changes(latest)
+            self.change_id = latest
+            return True
+
+    def best_per_athlete(self, discipline, year=None, indoor=None,
+                         years_of_birth=None, max_age=None, legal=False):
+        """
+        Get the best performance of each athlete in a discipline.
+
+        Args:
+            discipline (str): The discipline as stored, e.g. '100'.
+            year (int): Only include performances of this year.
+            indoor (bool): Only include indoor (True) or outdoor (False)
+                performances.
+            years_of_birth (dict): Only include the athletes with these ids
+                and their years of birth as values.
+            max_age (int): Only include performances of athletes that were
+                at most this old in the year of the performance. Requires
+                `years_of_birth`.
+            legal (bool): Only include performances with at most
+                `MAX_LEGAL_WIND` or without wind measurement.
+
+        Returns:
+            dict: The ids of the best performances by athlete id, best
+                first. Ties are resolved by the lower performance id.
+
+        """
+        self.refresh()
+        columns = self._columns
+        code = self.disciplines.get(discipline)
+        if code is None:
+            return dict()
+
+        mask = (columns["discipline"] == code) & ~np.isnan(columns["value"])
+        if year is not None:
+            mask &= columns["year"] == int(year)
+        if indoor is not None:
+            mask &= columns["indoor"] == indoor
+        if legal:
+            wind = columns["wind"]
+            mask &= np.isnan(wind) | (wind <= MAX_LEGAL_WIND)
+        if years_of_birth is not None:
+            if not years_of_birth:
+                return dict()
+            ids = np.fromiter(years_of_birth, np.int64,
+                              count=len(years_of_birth))
+            births = np.fromiter(years_of_birth.values(), np.int64,
+                                 count=len(years_of_birth))
+            order = np.argsort(ids)
+            ids, births = ids[order], births[order]
+            position = np.searchsorted(ids, columns["athlete"])
+            position[position == len(ids)] = 0
+            mask &= ids[position] == columns["athlete"]
+            if max_age is not None:
+                mask &= columns["year"] - births[position] <= max_age
+
+        index = np.flatnonzero(mask)
+        key = columns["value"][index]
+        if ASCENDING.get(discipline, False):
+            key = -key
+        # best of each athlete first, then the lower performance id
+        order = np.lexsort((columns["id"][index], key,
+                            columns["athlete"][index]))
+        index, key = index[order], key[order]
+        first = np.unique(columns["athlete"][index], return_index=True)[1]
+        best = index[first]
+        best = best[np.lexsort((columns["id"][best], key[first]))]
+        return dict(zip(columns["athlete"][best].tolist(),
+                        columns["id"][best].tolist()))
+
+    def top_k(self, discipline, k, **filters):
+        """
+        Get the best performances of the `k` best athletes in a discipline.
+
+        Args:
+            discipline (str): The discipline as stored, e.g. '100'.
+            k (int): The number of athletes.
+            **filters: The filters of `best_per_athlete`.
+
+        Returns:
+            list: Pairs of athlete id and performance id, best first.
+
+        """
+        best = self.best_per_athlete(discipline, **filters)
+        return list(best.items())[:k]
+
+    def _apply_changes(self, latest):
+        changed = [
+            performance_id for performance_id, in db.session.query(
+                PerformanceChange.performance_id
+            ).filter(PerformanceChange.id > self.change_id,
+                     PerformanceChange.id <= latest).distinct()
+        ]
+        if len(changed) > MAX_CHANGES:
+            self._columns = self._to_columns(self._query_rows())
+            return
+        # deleted performances have no row and are only removed
+        rows = self._query_rows(Performance.id.in_(changed))
+        keep = ~np.isin(self._columns["id"], changed)
+        new = self._to_columns(rows)
+        self._columns = {
+            name: np.concatenate([column[keep], new[name]])
+            for name, column in self._columns.items()
+        }
+
+    @staticmethod
+    def _query_rows(*criteria):
+        return db.session.query(
+            Performance.id, Performance.athlete_id, Performance.discipline,
+            Performance.value, Performance.date, Performance.indoor,
+            Performance.wind
+        ).filter(*criteria).all()
+
+    def _to_columns(self, rows):
+        columns = {name: [] for name in COLUMNS}
+        for p in rows:
+            columns["id"].append(p.id)
+            columns["athlete"].append(
+                -1 if p.athlete_id is None else p.athlete_id)
+            columns["discipline"].append(
+                self.disciplines.setdefault(p.discipline, len(self.disciplines)))
+            columns["value"].append(_to_value(p.value))
+            date = _parse_date(p.date)
+            columns["date"].append(date.toordinal() if date else -1)
+            columns["year"].append(date.year if date else -1)
+            columns["indoor"].append(bool(p.indoor))
+            columns["wind"].append(np.nan if p.wind is None else p.wind)
+        return {name: np.array(columns[name], dtype=dtype)
+                for name, dtype in COLUMNS.items()}
+
+
+def _to_value(value):
+    if value is None or any(c in value for c in "ado"):
+        return np.nan
+    number = map_to_number(value)
+    return np.nan if number < 0 else number
+
+
+def _parse_date(date):
+    try:
+        return datetime.strptime(date, "%d.%m.%Y").date()
+    except (TypeError, ValueError):
+        return None
+
+
+performance_arrays = PerformanceArrays()
@@ -0,0 +1,303 @@
+"""Cache for rendered result pages and pdf files."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from importlib.metadata import version, PackageNotFoundError
+from time import time, sleep
+
+from tfomat.metrics import metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+META_SUFFIX = ".meta.json"
+# the share of the size limit that is written between two scans for entries
+# to evict, the cache holds up to the limit afterwards
+EVICT_INTERVAL = 0.1
+
+
+class ResultCache:
+    """
+    A size-bounded file cache that is safe to share between worker processes.
+
+    Entries are written to a temporary file and renamed into place, so
+    readers never see partially written files. Every entry has a metadata
+    file with its creation time and the version of the application that
+    created it. Entries of other versions are treated as missing and the
+    least recently used entries are removed once the cache exceeds its size
+    limit. The cache directory is only scanned for entries to remove after
+    `EVICT_INTERVAL` of the size limit has been written by this process
+    since the last scan, so writes do not depend on the size of the cache.
+    """
+
+    def __init__(self, path=None, max_size=512 * 1024 ** 2, version=None,
+                 lock_timeout=50):
+        self.path = path
+        self.max_size = max_size
+        self.version = version
+        self.lock_timeout = lock_timeout
+        # scan on the first write
+        self._written = float("inf")
+
+    def init_app(self, app):
+        cache_path = app.config.get("CACHE_PATH") or os.path.join(
+            app.root_path, "cache")
+        self.path = os.path.join(cache_path, "results")
+        self.max_size = app.config.get("RESULT_CACHE_SIZE", self.max_size)
+        self.version = app.config.get("CACHE_VERSION") or _get_version()
+        self.lock_timeout = app.config.get("SINGLE_FLIGHT_TIMEOUT",
+                                           self.lock_timeout)
+        os.makedirs(os.path.join(self.path, "locks"), exist_ok=True)
+
+    def get_path(self, key):
+        """
+        Get the path of a cached entry.
+
+        Args:
+            key (str): The key of the entry, e.g. '<meeting_id>.html'.
+
+        Returns:
+            str or None: The path to the cached file or None if there is no
+                valid entry for `key`.
+
+        """
+        meta = self.get_meta(key)
+        if meta is None:
+            metrics.record("cache_misses", cache="results")
+            return None
+        if meta.get("version") != self.version:
+            self.invalidate(key)
+            metrics.record("cache_misses", cache="results")
+            return None
+        path = self._entry_path(key)
+        try:
+            # mark the entry as recently used
+            os.utime(path)
+        except OSError:
+            metrics.record("cache_misses", cache="results")
+            return None
+        metrics.record("cache_hits", cache="results")
+        return path
+
+    def get_meta(self, key):
+        """
+        Get the metadata of a cached entry.
+
+        Args:
+            key (str): The key of the entry.
+
+        Returns:
+            dict or None: The creation time, version and size of the entry.
+
+        """
+        try:
+            with open(self._entry_path(key) + META_SUFFIX, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def read(self, key):
+        """
+        Read a cached entry.
+
+        Args:
+            key (str): The key of the entry.
+
+        Returns:
+            bytes or None: The content of the entry or None if there is no
+                valid entry for `key`.
+
+        """
+        path = self.get_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key, data):
+        """
+        Add an entry to the cache.
+
+        Args:
+            key (str): The key of the entry.
+            data (bytes or str): The content of the entry.
+
+        Returns:
+            str: The path to the cached file.
+
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        path = self._entry_path(key)
+        atomic_write(path, data)
+        self._write_meta(key, len(data))
+        self._evict(len(data))
+        return path
+
+    def put_file(self, key, file_path):
+        """
+        Move a file into the cache.
+
+        Args:
+            key (str): The key of the entry.
+            file_path (str): The path of the file. The file needs to be on
+                the same file system as the cache, see `build_dir`.
+
+        Returns:
+            str: The path to the cached file.
+
+        """
+        path = self._entry_path(key)
+        os.replace(file_path, path)
+        size = os.path.getsize(path)
+        self._write_meta(key, size)
+        self._evict(size)
+        return path
+
+    def build_dir(self):
+        """
+        Create a temporary directory inside the cache to build files in.
+
+        Returns:
+            tempfile.TemporaryDirectory: The directory.
+
+        """
+        return tempfile.TemporaryDirectory(dir=self.path, suffix=".tmp")
+
+    def invalidate(self, *keys):
+        """
+        Remove entries from the cache.
+
+        Args:
+            *keys (str): The keys of the entries.
+
+        Returns:
+            None.
+
+        """
+        for key in keys:
+            path = self._entry_path(key)
+            for p in (path + META_SUFFIX, path):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+
+    @contextmanager
+    def lock(self, name):
+        """
+        Hold an exclusive lock shared by all worker processes, e.g. to make
+        sure that only one worker builds an entry while the others wait for
+        it and read it from the cache afterwards.
+
+        Args:
+            name (str): The name of the lock.
+
+        Raises:
+            TimeoutError: If the lock could not be acquired within
+                `lock_timeout` seconds.
+
+        """
+        if fcntl is None:
+            yield
+            return
+        lock_path = os.path.join(self.path, "locks",
+                                 f"{os.path.basename(name)}.lock")
+        with open(lock_path, "a") as f:
+            deadline = time() + self.lock_timeout
+            while True:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time() > deadline:
+                        raise TimeoutError(f"Could not acquire lock {name}")
+                    sleep(0.1)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, os.path.basename(key))
+
+    def _write_meta(self, key, size):
+        meta = {"key": key, "created": time(), "version": self.version,
+                "size": size}
+        atomic_write(self._entry_path(key) + META_SUFFIX,
+                     json.dumps(meta).encode("utf-8"))
+
+    def _evict(self, written):
+        self._written += written
+        if self._written < self.max_size * EVICT_INTERVAL:
+            return
+        self._written = 0
+        entries = []
+        for entry in os.scandir(self.path):
+            if not entry.is_file() or entry.name.endswith((META_SUFFIX, ".tmp")):
+                continue
+            try:
+                entries.append((entry.stat().st_mtime, entry.stat().st_size,
+                                entry.name))
+            except OSError:
+                # removed by another process
+                continue
+        size = sum(e[1] for e in entries)
+        # leave room for the writes until the next scan
+        max_size = self.max_size * (1 - EVICT_INTERVAL)
+        for _, entry_size, key in sorted(entries):
+            if size <= max_size:
+                break
+            size -= entry_size
+            self.invalidate(key)
+
+
+def atomic_write(path, data):
+    """
+    Write `data` to a temporary file next to `path` and move it to `path`.
+
+    Args:
+        path (str): The path of the file.
+        data (bytes): The content of the file.
+
+    Returns:
+        None.
+
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _get_version():
+    try:
+        return version("tfomat")
+    except PackageNotFoundError:
+        return None
+
+
+result_cache = ResultCache()
@@ -0,0 +1,286 @@
+"""Columnar export of athletes and performances to NumPy files."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from time import time
+
+import numpy as np
+from tfomat.map import map_to_number
+from tfomat.models import db, Athlete, Performance, get_data_version
+
+FORMAT_VERSION = 1
+# dtypes of the performance columns
+PERFORMANCE_COLUMNS = {
+    "id": np.int64,
+    "athlete_id": np.int32,
+    # index into `disciplines` and `cities` of the metadata
+    "discipline": np.int16,
+    "city": np.int32,
+    # the value of `map_to_number`, -1 for results that are not a
+    # performance (e.g. 'DNF')
+    "value": np.float64,
+    # days since 1970-01-01, NaT for invalid dates
+    "date": "datetime64[D]",
+    # NaN if there was no wind measurement
+    "wind": np.float32,
+    "indoor": np.bool_,
+    # -1 if unknown
+    "placement": np.int16
+}
+ATHLETE_COLUMNS = {
+    "id": np.int32,
+    # -1 if unknown
+    "year_of_birth": np.int16,
+    "gender": "S1"
+}
+
+
+def export(path, batch_size=10000):
+    """
+    Write the athletes and performances of the database into a directory of
+    NumPy files with one file per column.
+
+    Disciplines and cities are stored as integer codes into the lists in
+    `meta.json`, dates as days since the epoch and values as numbers. Each
+    export is written into a new directory next to `path` and `path` is a
+    symbolic link to the latest one, which is replaced with a single rename,
+    so readers never see a partial or missing export. The previous export is
+    kept until the next one for readers that are still loading it.
+    Requires an application context.
+
+    Args:
+        path (str): The directory of the export.
+        batch_size (int): The number of rows that are loaded at once.
+
+    Returns:
+        dict: The metadata of the export.
+
+    """
+    disciplines = dict()
+    cities = dict()
+    columns = {name: [] for name in PERFORMANCE_COLUMNS}
+    query = db.session.query(
+        Performance.id, Performance.athlete_id, Performance.discipline,
+        Performance.city, Performance.value, Performance.date,
+        Performance.wind, Performance.indoor, Performance.placement
+    ).order_by(Performance.id).execution_options(yield_per=batch_size)
+    for p in query:
+        columns["id"].append(p.id)
+        columns["athlete_id"].append(p.athlete_id or -1)
+        columns["discipline"].append(
+            disciplines.setdefault(p.discipline or "", len(disciplines)))
+        columns["city"].append(cities.setdefault(p.city or "", len(cities)))
+        columns["value"].append(map_to_number(p.value))
+        columns["date"].append(_parse_date(p.date))
+        columns["wind"].append(np.nan if p.wind is None else p.wind)
+        columns["indoor"].append(bool(p.indoor))
+        columns["placement"].append(
+            -1 if p.placement is None else p.placement)
+
+    athletes = db.session.query(Athlete.id, Athlete.name,
+                                Athlete.year_of_birth, Athlete.gender
+                                ).order_by(Athlete.id).all()
+    athlete_columns = {
+        "id": [a.id for a in athletes],
+        "year_of_birth": [a.year_of_birth or -1 for a in athletes],
+        "gender": [(a.gender or "")[:1] for a in athletes]
+    }
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "data_version": get_data_version(),
+        "exported": time(),
+        "performances": len(columns["id"]),
+        "athletes": len(athletes),
+        "disciplines": list(disciplines),
+        "cities": list(cities),
+        "athlete_names": [a.name for a in athletes]
+    }
+
+    path = os.path.abspath(path)
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    build_dir = tempfile.mkdtemp(dir=parent, prefix=_export_prefix(path))
+    try:
+        for name, dtype in PERFORMANCE_COLUMNS.items():
+            np.save(os.path.join(build_dir, f"performance.{name}.npy"),
+                    np.array(columns[name], dtype=dtype))
+        for name, dtype in ATHLETE_COLUMNS.items():
+            np.save(os.path.join(build_dir, f"athlete.{name}.npy"),
+                    np.array(athlete_columns[name], dtype=dtype))
+        with open(os.path.join(build_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        _publish(build_dir, path)
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    return meta
+
+
+class ColumnarData:
+    """
+    An export of `export` with its columns memory-mapped read-only.
+
+    Args:
+        path (str): The directory of the export.
+
+    Attributes:
+        meta (dict): The metadata of the export.
+        performances (dict): The performance columns by name.
+        athletes (dict): The athlete columns by name.
+
+    """
+
+    def __init__(self, path):
+        # all columns from the same export, even if a new one is published
+        path = os.path.realpath(path)
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"{path} was exported in an unsupported format")
+        self.performances = {
+            name: np.load(os.path.join(path, f"performance.{name}.npy"),
+                          mmap_mode="r")
+            for name in PERFORMANCE_COLUMNS
+        }
+        self.athletes = {
+            name: np.load(os.path.join(path, f"athlete.{name}.npy"),
+                          mmap_mode="r")
+            for name in ATHLETE_COLUMNS
+        }
+
+    def discipline_code(self, discipline):
+        """
+        Get the integer code of a discipline.
+
+        Args:
+            discipline (str): The short name of the discipline, e.g. '100'.
+
+        Returns:
+            int: The code or -1 if there are no performances in the
+                discipline.
+
+        """
+        try:
+            return self.meta["disciplines"].index(discipline)
+        except ValueError:
+            return -1
+
+    def city_code(self, city):
+        """
+        Get the integer code of a city.
+
+        Args:
+            city (str): The name of the city.
+
+        Returns:
+            int: The code or -1 if there are no performances in the city.
+
+        """
+        try:
+            return self.meta["cities"].index(city)
+        except ValueError:
+            return -1
+
+    def seasons(self):
+        """
+        Get the season of each performance like `map.get_season_start`.
+        Winter seasons begin in November, summer seasons in April.
+
+        Returns:
+            tuple: The years the seasons began in and whether they are
+                winter seasons as arrays.
+
+        """
+        dates = self.performances["date"]
+        years = dates.astype("datetime64[Y]").astype(np.int64) + 1970
+        months = dates.astype("datetime64[M]").astype(np.int64) % 12 + 1
+        winter = (months <= 3) | (months >= 11)
+        return np.where(months <= 3, years - 1, years), winter
+
+
+def load(path):
+    """
+    Memory-map an export of `export` read-only.
+
+    Args:
+        path (str): The directory of the export.
+
+    Returns:
+        ColumnarData: The columns of the export.
+
+    """
+    return ColumnarData(path)
+
+
+def _parse_date(date):
+    try:
+        return np.datetime64(datetime.strptime(date, "%d.%m.%Y").date(), "D")
+    except (TypeError, ValueError):
+        return np.datetime64("NaT")
+
+
+def _export_prefix(path):
+    return f".{os.path.basename(path)}-export-"
+
+
+def _publish(build_dir, path):
+    parent = os.path.dirname(path)
+    previous = None
+    if os.path.islink(path):
+        previous = os.path.realpath(path)
+    elif os.path.isdir(path):
+        # exports of older versions were written to `path` directly
+        previous = tempfile.mkdtemp(dir=parent, prefix=_export_prefix(path))
+        os.rmdir(previous)
+        os.replace(path, previous)
+    link = os.path.join(parent,
+                        f"{_export_prefix(path)}link-{os.getpid()}")
+    os.symlink(os.path.basename(build_dir), link)
+    os.replace(link, path)
+
+    keep = {os.path.realpath(build_dir), previous}
+    for name in os.listdir(parent):
+        old = os.path.join(parent, name)
+        # only finished exports, not those another process is writing
+        if name.startswith(_export_prefix(path)) and not os.path.islink(old) \
+                and os.path.exists(os.path.join(old, "meta.json")) \
+                and os.path.realpath(old) not in keep:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def main():
+    from tfomat import init_app
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="the directory to export to")
+    parser.add_argument("--database",
+                        help="export this SQLite database instead of the "
+                             "database of the application")
+    args = parser.parse_args()
+
+    test_config = None
+    if args.database:
+        test_config = {"SQLALCHEMY_DATABASE_URI": "sqlite:///"
+                       + os.path.abspath(args.database)}
+    app = init_app(test_config)
+    with app.app_context():
+        meta = export(args.path)
+    print(f"exported {meta['performances']} performances of "
+          f"{meta['athletes']} athletes to {args.path}")
+    return 0
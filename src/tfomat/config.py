@@ -29,4 +29,32 @@ class Config:
     CLUB_NAME = "SV Werder Bremen"
     CLUB_ID = 25
     LV = "BR"
+    CACHE_PATH = os.getenv("CACHE-PATH")
+    RESULT_CACHE_SIZE = 512 * 1024 ** 2
+    CACHE_VERSION = os.getenv("CACHE-VERSION")
+    SINGLE_FLIGHT_TIMEOUT = 50
+    # seconds until listings from ladv are refreshed in the background
+    LISTING_TTL = 15 * 60
+    REFRESH_LEASE = 120
+    # refresh stale listings in the request instead (e.g. tfomat-warm)
+    REFRESH_IN_BACKGROUND = True
+    # "latex" (requires pdflatex) or "direct"
+    PDF_RENDERER = os.getenv("PDF-RENDERER", "latex")
+    BACKGROUND_JOBS = os.getenv("BACKGROUND-JOBS", "false") == "true"
+    JOB_POLL_INTERVAL = 1.0
+    LADV_CACHE_PATH = os.getenv("LADV-CACHE-PATH")
+    LADV_CACHE_SIZE = 256 * 1024 ** 2
+    LADV_OFFLINE = os.getenv("LADV-OFFLINE", "false") == "true"
+    # counter files of all worker processes for /metrics
+    METRICS_PATH = os.getenv("METRICS-PATH")
+    METRICS_FLUSH_INTERVAL = 1.0
+    # required to read /metrics, which is disabled without a token
+    METRICS_TOKEN = os.getenv("METRICS-TOKEN")
+    # log statements that are repeated more often in a request (development)
+    NPLUSONE_THRESHOLD = int(os.getenv("NPLUSONE-THRESHOLD", 0)) or None
+    NPLUSONE_RAISE = os.getenv("NPLUSONE-RAISE", "false") == "true"
+    # maximum number of performances of one request to /api/import-performances
+    IMPORT_MAX_ROWS = 5000
+    # answer the rankings from NumPy arrays in memory (requires numpy)
+    ANALYTICS_ENGINE = os.getenv("ANALYTICS-ENGINE", "false") == "true"
     PORT = 5000
@@ -0,0 +1,160 @@
+"""Background jobs for scraping, database updates and pdf builds."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import json
+from time import time, sleep
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from tfomat.models import db, Job
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+# the result of failed jobs, the traceback is only logged
+FAILED_MESSAGE = "Die Anfrage konnte nicht bearbeitet werden."
+
+TASKS = dict()
+
+
+def task(kind):
+    """
+    Register a function as the task that is run for jobs of `kind`.
+
+    The function is called with the arguments of the job and may return a
+    message that is shown once the job is done.
+
+    Args:
+        kind (str): The kind of the job.
+
+    Returns:
+        function: The decorator.
+
+    """
+    def decorator(func):
+        TASKS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, key, target=None, **kwargs):
+    """
+    Add a job to the queue unless an identical job is already queued or
+    running.
+
+    Args:
+        kind (str): The kind of the job.
+        key (str): A key that identifies identical jobs.
+        target (str): The URL to redirect to once the job is done.
+        **kwargs: The arguments for the task.
+
+    Returns:
+        Job: The new or existing job.
+
+    """
+    key = f"{kind}:{key}"
+    job = Job.query.filter_by(key=key).first()
+    if job is not None and job.status in (QUEUED, RUNNING):
+        return job
+
+    if job is None:
+        job = Job(key=key, kind=kind)
+        db.session.add(job)
+    job.args = json.dumps(kwargs)
+    job.target = target
+    job.status = QUEUED
+    job.result = None
+    job.created = time()
+    job.started = job.finished = None
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # another worker process enqueued the same job in the meantime
+        db.session.rollback()
+        job = Job.query.filter_by(key=key).first()
+    return job
+
+
+def claim():
+    """
+    Take the oldest queued job and mark it as running.
+
+    Returns:
+        Job or None: The claimed job or None if the queue is empty.
+
+    """
+    while True:
+        job = Job.query.filter_by(status=QUEUED).order_by(Job.created).first()
+        if job is None:
+            return None
+        claimed = Job.query.filter_by(id=job.id, status=QUEUED).update(
+            {"status": RUNNING, "started": time()})
+        db.session.commit()
+        if claimed:
+            db.session.refresh(job)
+            return job
+
+
+def run(job):
+    """
+    Run the task of a job and store its outcome.
+
+    Args:
+        job (Job): The job to run.
+
+    Returns:
+        None.
+
+    """
+    try:
+        job.result = TASKS[job.kind](**json.loads(job.args))
+        job.status = DONE
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception(f"Job {job.key} failed")
+        job.result = FAILED_MESSAGE
+        job.status = FAILED
+    job.finished = time()
+    db.session.commit()
+
+
+def work(app, poll_interval=1.0):
+    """
+    Run queued jobs until the process is stopped.
+
+    Jobs that were left running by a previous worker are queued again on
+    startup, so only one worker process should be used.
+
+    Args:
+        app (flask.Flask): The application to run the jobs for.
+        poll_interval (float): Seconds to wait when the queue is empty.
+
+    Returns:
+        None.
+
+    """
+    with app.app_context():
+        Job.query.filter_by(status=RUNNING).update({"status": QUEUED})
+        db.session.commit()
+
+    while True:
+        # templates are rendered in jobs, which requires a request context
+        with app.test_request_context("/"):
+            job = claim()
+            if job is not None:
+                run(job)
+            db.session.remove()
+        if job is None:
+            sleep(poll_interval)
@@ -12,15 +12,22 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
-import json
 import os
 import re
 from datetime import datetime
+from functools import lru_cache
+from importlib.util import find_spec
 
-import requests
-from bs4 import BeautifulSoup
+from dotenv import load_dotenv
+from tfomat.response_store import response_store
 
-LADV_RESULT_URL = "https://ladv.de/ergebnisse/{}/"
+# bs4 and lxml are only imported once the first page is parsed
+PARSER = "lxml" if find_spec("lxml") is not None else "html.parser"
+
+load_dotenv()
+# can be pointed at a local stand-in of ladv, e.g. for load tests
+LADV_URL = os.getenv("LADV-URL", "https://ladv.de").rstrip("/")
+LADV_RESULT_URL = LADV_URL + "/ergebnisse/{}/"
 
 # html classes for the respective fields
 CLASSES = {
@@ -34,6 +41,8 @@ CLASSES = {
     "wind": "wind",
     "date": "erg_headline_right"
 }
+_FIELDS = {v: k for k, v in CLASSES.items()}
+_FIELD_CLASSES = list(_FIELDS)
 
 
 def get_meeting_info(soup):
@@ -68,34 +77,91 @@ def find_results(meeting_id, club_name):
         tuple: Meeting metadata and the individual's results.
 
     """
-    soup = _get_from_ladv(meeting_id)
-    if soup is None:
+    content = _get_from_ladv(meeting_id)
+    if content is None:
         return None, None
+    return parse_results(content, club_name)
+
+
+def parse_results(content, club_name):
+    """
+    Parse the result page of a meeting and extract the results of all
+    members of `club_name`.
+
+    Only the meeting title and the result tables (`erg_runde` blocks) are
+    parsed and all rows are extracted in a single pass over the relevant
+    elements.
+
+    Args:
+        content (bytes or str): The HTML contents of the result page.
+        club_name (str): The name of the club that appears in the results.
+
+    Returns:
+        tuple: Meeting metadata and the individual's results.
+
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, PARSER, parse_only=_get_result_strainer())
     meeting_info = get_meeting_info(soup)
-    tables = soup.find_all("div", class_=CLASSES["tables"])
 
     results = []
-    for table in tables:
-        heading = table.find("div", class_=CLASSES["event"])
-        if heading is None:
+    table = row = None
+    for element in soup.find_all("div", class_=_FIELD_CLASSES):
+        field = _get_field(element)
+        if field == "tables":
+            _add_row(row, table, club_name, results)
+            table = {}
+            row = None
+        elif table is None:
             continue
-        event_data = _get_event_data(heading, table)
-        if event_data is None:
-            continue
-
-        rows = table.find_all("div", class_=CLASSES["row"])
-        _get_event_results(rows, event_data, club_name, results)
+        elif field == "row":
+            _add_row(row, table, club_name, results)
+            row = {}
+        elif row is not None:
+            row.setdefault(field, element)
+        else:
+            table.setdefault(field, element)
+    _add_row(row, table, club_name, results)
     return meeting_info, results
 
 
-def _get_event_results(rows, event_data, club_name, results):
+@lru_cache(maxsize=None)
+def _get_result_strainer():
+    """Get a filter for the only parts of a result page that are needed, the
+    meeting title and the result tables."""
+    from bs4 import SoupStrainer
+
+    return SoupStrainer(
+        "div", class_=["title", "titleortdatum", CLASSES["tables"]])
+
+
+def _get_field(element):
+    """
+    Get the result field an element of the result page belongs to.
+
+    Args:
+        element (bs4.tag): A HTML entity of meeting results.
+
+    Returns:
+        str or None: The key of the field in `CLASSES`.
+
     """
-    Get results from athletes that took part in an event and append it to
-    a results list.
+    for html_class in element.get("class", []):
+        field = _FIELDS.get(html_class)
+        if field is not None:
+            return field
+    return None
+
+
+def _add_row(row, table, club_name, results):
+    """
+    Append the result of one row to a results list if the athlete is a
+    member of the club.
 
     Args:
-        rows (list): A list of HTML entity containing event results of athletes.
-        event_data (dict): Metadata of the event.
+        row (dict or None): The HTML entities of the row by field.
+        table (dict or None): The HTML entities of the table heading by field.
         club_name (str): The name of athlete's club.
         results (list): The list to append the results to.
 
@@ -103,20 +169,19 @@ def _get_event_results(rows, event_data, club_name, results):
         None.
 
     """
-    for row in rows:
-        club = row.find("div", class_=CLASSES["club"])
-        if club and club.text != club_name:
-            continue
-
-        name_div = row.find("div", class_=CLASSES["name"])
-        if name_div is None:
-            continue
-
-        result = _get_individual_result(name_div, row)
-        if result is None:
-            continue
+    if row is None or table.get("event") is None or table.get("date") is None:
+        return
+    club = row.get("club")
+    if club and club.text != club_name:
+        return
+    if any(row.get(f) is None for f in ("name", "rank", "result", "wind")):
+        return
 
-        results.append(result.update(event_data))
+    if "data" not in table:
+        table["data"] = _get_event_data(table["event"], table["date"])
+    result = _get_individual_result(row)
+    result.update(table["data"])
+    results.append(result)
 
 
 def _get_from_ladv(meeting_id):
@@ -127,73 +192,61 @@ def _get_from_ladv(meeting_id):
         meeting_id (int): The id of the meeting at ladv.
 
     Returns:
-        bs4.BeautifulSoup or None: The HTML contents of the result page.
+        bytes or None: The HTML contents of the result page.
 
     """
     url = LADV_RESULT_URL.format(meeting_id)
-    response = requests.get(url)
+    response = response_store.get(url)
     if response.status_code != 200:
         return None
-    content = response.content
-    soup = BeautifulSoup(content, 'html.parser')
-    return soup
+    return response.content
 
 
-def _get_individual_result(name_div, row):
+def _get_individual_result(row):
     """
     Get the one individual's result of an event.
 
     Args:
-        name_div (bs4.tag): A HTML entity containing the name of an athlete.
-        row (bs4.tag): A HTML entity containing the results of an athlete in
-            an event.
+        row (dict): The HTML entities containing the name, rank, result and
+            wind of an athlete in an event.
 
     Returns:
         dict: The result of the individual.
 
     """
-    rank = row.find("div", class_=CLASSES["rank"])
-    result = row.find("div", class_=CLASSES["result"])
-    wind = row.find("div", class_=CLASSES["wind"])
-
-    if any(a is None for a in (rank, result, wind)):
-        return None
-
-    names = [c.strip() for c in name_div.text.split(",")]
+    names = [c.strip() for c in row["name"].text.split(",")]
     surname = names[-1]
     family_name = names[0]
     name = f"{surname} {family_name}"
 
     return {"name": name, "surname": surname, "familyname": family_name,
-            "result": result, "wind": wind.text.strip(),
-            "rank": rank.text.strip()}
+            "result": row["result"].text.strip(),
+            "wind": row["wind"].text.strip(),
+            "rank": row["rank"].text.strip()}
 
 
-def _get_event_data(heading, table):
+def _get_event_data(heading, date):
     """
     Extract the event name, qualifying round, agegroup and date from the
     heading of a result.
 
     Args:
-        heading (str): The heading of the result entry.
-        table (bs4.tag): A HTML entity of meeting results.
+        heading (bs4.tag): A HTML entity containing the heading of the result
+            entry.
+        date (bs4.tag): A HTML entity containing the date of the event.
 
     Returns:
          dict: The name, qualifying round, agegroup and date of the event.
 
     """
-    date = table.find("div", class_=CLASSES["date"])
-    if date is None:
-        return None
-
-    event = re.search(".*(?=\()", heading.text).group(0).strip()
-    subtitle = re.search("(?<=\().*(?=\))", heading.text).group(0).strip()
+    event = re.search(".*(?=\\()", heading.text).group(0).strip()
+    subtitle = re.search("(?<=\\().*(?=\\))", heading.text).group(0).strip()
     age_group = heading.text.split("-")[-1].strip()
-    return {"agegroup": age_group, "date": date, "event": event,
+    return {"agegroup": age_group, "date": date.text.strip(), "event": event,
             "subtitle": subtitle}
 
 
-def get_club_results(club_nr, lv, api_key, year, cache_path, cache=None):
+def get_club_results(club_nr, lv, api_key, year, known_urls=()):
     """
     Get a list of events that athletes from a specific club competed in.
 
@@ -202,53 +255,44 @@ def get_club_results(club_nr, lv, api_key, year, cache_path, cache=None):
         lv (str): The short name of the federal association.
         api_key (str): An API key for ladv.
         year (int): The year that the events took place.
-        cache_path (str): The path to the cache directory.
-        cache (list): Cached known events.
+        known_urls (set): URLs of events that are already known and are
+            skipped.
 
     Returns:
-        list: Events that athletes competed in.
+        list: Events that athletes competed in and that are not known yet.
 
     """
-    url = f"https://ladv.de/api/{api_key}/veaList?vereinnumber={club_nr}&limit=200&datayear={year}&lv={lv}"
-    r = requests.get(url)
+    url = f"{LADV_URL}/api/{api_key}/veaList?vereinnumber={club_nr}&limit=200&datayear={year}&lv={lv}"
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    r = response_store.get(url)
     events = r.json()
 
     new_events = []
-    if cache is not None:
-        event_urls = [c["url"] for c in cache]
-    else:
-        event_urls = []
-
     for event in events:
-        if event["url"] in event_urls:
+        if event["url"] in known_urls:
             continue
-        r = requests.get(event["url"])
-        soup = BeautifulSoup(r.content, 'html.parser')
+        r = response_store.get(event["url"])
+        soup = BeautifulSoup(r.content, PARSER,
+                             parse_only=SoupStrainer("a", class_="ergxml"))
         link = soup.find("a", class_="ergxml")
-        if link is None:
-            pass
-        else:
+        if link is not None:
             result_id = re.search("(?<=/ergebnisse/)[0-9]*", link.attrs["href"]).group(0)
             event["id"] = result_id
         new_events.append(event)
-
-    if cache:
-        events = cache + new_events
-    with open(os.path.join(cache_path, f"events_{year}.json"), "w") as f:
-        json.dump(events, f)
-    return events
+    return new_events
 
 
 def get_upcoming_events(api_key, club_nr, lv):
-    url = f"https://ladv.de/api/{api_key}/meldList?vereinnumber={club_nr}&limit=200&lv={lv}"
-    r = requests.get(url)
+    url = f"{LADV_URL}/api/{api_key}/meldList?vereinnumber={club_nr}&limit=200&lv={lv}"
+    r = response_store.get(url)
     events = r.json()
     return events
 
 
 def get_upcoming_competitions(athlete_id, api_key):
-    this_year = requests.get(f"https://ladv.de/api/{api_key}/athletDetail?id={athlete_id}&datayear={datetime.today().year}&meld=true")
-    next_year = requests.get(f"https://ladv.de/api/{api_key}/athletDetail?id={athlete_id}&datayear={datetime.today().year + 1}&meld=true")
+    this_year = response_store.get(f"{LADV_URL}/api/{api_key}/athletDetail?id={athlete_id}&datayear={datetime.today().year}&meld=true")
+    next_year = response_store.get(f"{LADV_URL}/api/{api_key}/athletDetail?id={athlete_id}&datayear={datetime.today().year + 1}&meld=true")
     if this_year.status_code != 200 or next_year.status_code != 200:
         return {"error": "ladv returned an error"}
 
@@ -262,15 +306,17 @@ def get_upcoming_competitions(athlete_id, api_key):
 def get_ladv_id(athlete_name):
     load_dotenv()
     api_key = os.getenv("LADV-API-KEY")
-    r = requests.get(f"https://ladv.de/api/{api_key}/athletQuery?query={athlete_name}")
+    r = response_store.get(f"{LADV_URL}/api/{api_key}/athletQuery?query={athlete_name}")
     return r.json()[0]["id"]
 
 
-def get_athlete_info(athlete_id, api_key, start_year, end_year=datetime.now().year):
+def get_athlete_info(athlete_id, api_key, club_nr, start_year, end_year=None):
+    if end_year is None:
+        end_year = datetime.now().year
     response = {}
     for year in range(start_year, end_year + 1):
-        r = requests.get(
-            f"https://ladv.de/api/{api_key}/athletDetail?id={athlete_id}&datayear={year}&leistung=true"
+        r = response_store.get(
+            f"{LADV_URL}/api/{api_key}/athletDetail?id={athlete_id}&datayear={year}&leistung=true"
         )
         content = r.json()
         if not content:
@@ -279,6 +325,6 @@ def get_athlete_info(athlete_id, api_key, start_year, end_year=datetime.now().ye
         new_performances = content[0]["leistungen"]
         response.update(content[0])
         response["leistungen"] = previous_performances
-        if content[0].get("vereinnumber") == CLUB_NUMBER:
+        if content[0].get("vereinnumber") == club_nr:
             response["leistungen"] += new_performances
     return response
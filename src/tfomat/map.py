@@ -67,6 +67,9 @@ DISCIPLINE_MAPPER = {
 }
 
 INVERSE_DISCIPLINE_MAPPER = {v: k for k, v in DISCIPLINE_MAPPER.items()}
+# the age groups that can be selected on the rankings page
+AGEGROUPS = ["Alle", "Männer", "MU23", "MJU20", "MJU18", "MJU16", "Frauen",
+             "WU23", "WJU20", "WJU18", "WJU16"]
 
 
 def map_discipline(disc):
@@ -133,4 +136,23 @@ def get_season_end(date):
         return datetime(date.year, 10, 31)
 
     # winter season this year
-    return datetime(date.year + 1, 3, 31)
\ No newline at end of file
+    return datetime(date.year + 1, 3, 31)
+
+
+def get_max_age(agegroup):
+    """
+    Get the maximum age of an age group like 'U18' or 'WJU20'. The age is
+    the difference of the year of the season and the year of birth.
+
+    Args:
+        agegroup (str): The age group.
+
+    Returns:
+        int: The maximum age or None if the age group has no limit (e.g.
+            'Männer').
+
+    """
+    match = re.search(r"U(\d+)", agegroup or "")
+    if match is None:
+        return None
+    return int(match.group(1)) - 1
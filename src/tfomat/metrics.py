@@ -0,0 +1,290 @@
+"""Request metrics that are shared by all worker processes."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import json
+import os
+import tempfile
+from hmac import compare_digest
+from threading import Lock
+from time import perf_counter, time
+
+from flask import Response, abort, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# upper bounds of the request duration histogram in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS = {
+    "tfomat_requests_total": (
+        "counter", "Number of handled requests."),
+    "tfomat_request_duration_seconds": (
+        "histogram", "Time spent in the request handler."),
+    "tfomat_sql_queries_total": (
+        "counter", "Number of SQL statements that were executed."),
+    "tfomat_sql_duration_seconds_total": (
+        "counter", "Time spent executing SQL statements."),
+    "tfomat_ladv_requests_total": (
+        "counter", "Number of requests that were sent to ladv."),
+    "tfomat_ladv_duration_seconds_total": (
+        "counter", "Time spent waiting for ladv."),
+    "tfomat_cache_hits_total": (
+        "counter", "Number of entries that were found in a cache."),
+    "tfomat_cache_misses_total": (
+        "counter", "Number of entries that were not found in a cache.")
+}
+
+
+class Metrics:
+    """
+    Collect the duration, SQL statements, ladv requests and cache lookups of
+    each request by endpoint.
+
+    Every worker process keeps its own counters and writes them to a file
+    in `path` named after its process id. The counters of all files are
+    added up when the metrics are exported, so they cover all processes
+    that share the directory. The export at `/metrics` requires the
+    `METRICS_TOKEN` as bearer token or `token` parameter and is disabled if
+    no token is configured.
+
+    Args:
+        path (str): The directory of the counter files.
+        flush_interval (float): The minimum number of seconds between two
+            writes of the counters of this process.
+
+    """
+
+    def __init__(self, path=None, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.server_timing = False
+        self.token = None
+        self._values = dict()
+        self._lock = Lock()
+        self._pid = None
+        self._flushed = 0
+
+    def init_app(self, app):
+        cache_path = app.config.get("CACHE_PATH") or os.path.join(
+            app.root_path, "cache")
+        self.path = app.config.get("METRICS_PATH") or os.path.join(
+            cache_path, "metrics")
+        self.flush_interval = app.config.get("METRICS_FLUSH_INTERVAL",
+                                             self.flush_interval)
+        self.server_timing = app.debug
+        self.token = app.config.get("METRICS_TOKEN")
+        os.makedirs(self.path, exist_ok=True)
+
+        if not event.contains(Engine, "before_cursor_execute",
+                              _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute",
+                         _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute",
+                         _after_cursor_execute)
+        app.before_request(_start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule("/metrics", "metrics", self._export)
+
+    def record(self, name, value=1, **labels):
+        """
+        Add to the counter of the current request.
+
+        Nothing is recorded outside of requests, e.g. in background jobs.
+
+        Args:
+            name (str): The name of the counter, e.g. 'ladv_requests'.
+            value (float): The value to add.
+            **labels: Labels of the counter in addition to the endpoint.
+
+        Returns:
+            None.
+
+        """
+        if not has_request_context() or "metrics" not in g:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        g.metrics[key] = g.metrics.get(key, 0) + value
+
+    def render(self):
+        """
+        Get the metrics of all processes in the Prometheus text format.
+
+        Returns:
+            str: The metrics.
+
+        """
+        self.flush(force=True)
+        totals = dict()
+        for entry in os.scandir(self.path):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path, "r") as f:
+                    values = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for sample, value in values.items():
+                totals[sample] = totals.get(sample, 0) + value
+
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            samples = sorted(s for s in totals if s.split("{")[0] in (
+                name, f"{name}_bucket", f"{name}_sum", f"{name}_count"))
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines += [f"{s} {totals[s]:g}" for s in samples]
+        return "\n".join(lines) + "\n"
+
+    def flush(self, force=False):
+        """
+        Write the counters of this process to its file.
+
+        Args:
+            force (bool): Whether to write the counters even if they were
+                written less than `flush_interval` seconds ago.
+
+        Returns:
+            None.
+
+        """
+        if self.path is None:
+            return
+        now = time()
+        if not force and now - self._flushed < self.flush_interval:
+            return
+        pid = self._get_pid()
+        with self._lock:
+            data = json.dumps(self._values)
+            self._flushed = now
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(self.path, f"{pid}.json"))
+
+    def _get_pid(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return pid
+        # counters that were inherited from the parent process belong to the
+        # file of the parent, a file of a previous process with the same id
+        # is continued
+        try:
+            with open(os.path.join(self.path, f"{pid}.json"), "r") as f:
+                values = json.load(f)
+        except (OSError, ValueError, TypeError):
+            values = dict()
+        with self._lock:
+            self._values = values
+            self._pid = pid
+        return pid
+
+    def _add(self, sample, value):
+        self._values[sample] = self._values.get(sample, 0) + value
+
+    def _export(self):
+        if not self.token:
+            return abort(404)
+        token = request.args.get("token", "")
+        authorization = request.headers.get("Authorization", "")
+        if authorization.startswith("Bearer "):
+            token = authorization[len("Bearer "):]
+        if not compare_digest(token.encode("utf-8"),
+                              self.token.encode("utf-8")):
+            return abort(403)
+        return Response(self.render(), mimetype="text/plain",
+                        headers={"Cache-Control": "no-store"})
+
+    def _finish_request(self, response):
+        state = g.pop("metrics", None)
+        if state is None or request.endpoint == "metrics":
+            return response
+        duration = perf_counter() - g.pop("metrics_start")
+        endpoint = request.endpoint or "none"
+        self._get_pid()
+        with self._lock:
+            self._add(_sample("tfomat_requests_total", endpoint=endpoint,
+                              method=request.method,
+                              status=response.status_code), 1)
+            for bucket in BUCKETS + ("+Inf",):
+                if bucket == "+Inf" or duration <= bucket:
+                    self._add(_sample("tfomat_request_duration_seconds_bucket",
+                                      endpoint=endpoint, le=bucket), 1)
+            self._add(_sample("tfomat_request_duration_seconds_sum",
+                              endpoint=endpoint), duration)
+            self._add(_sample("tfomat_request_duration_seconds_count",
+                              endpoint=endpoint), 1)
+            for (name, labels), value in state.items():
+                self._add(_sample(f"tfomat_{name}_total", endpoint=endpoint,
+                                  **dict(labels)), value)
+        self.flush()
+
+        if self.server_timing:
+            response.headers["Server-Timing"] = _server_timing(duration,
+                                                               state)
+        return response
+
+    def _teardown_request(self, exception):
+        if "metrics" in g:
+            # the request failed before a response was created
+            self._finish_request(Response(status=500))
+
+
+def _sample(name, **labels):
+    if not labels:
+        return name
+    label_text = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in sorted(labels.items()))
+    return f"{name}{{{label_text}}}"
+
+
+def _server_timing(duration, state):
+    def total(name):
+        return sum(v for (n, _), v in state.items() if n == name)
+
+    entries = [
+        f"app;dur={duration * 1000:.1f}",
+        f'sql;dur={total("sql_duration_seconds") * 1000:.1f};'
+        f'desc="{total("sql_queries"):.0f} queries"'
+    ]
+    if total("ladv_requests"):
+        entries.append(
+            f'ladv;dur={total("ladv_duration_seconds") * 1000:.1f};'
+            f'desc="{total("ladv_requests"):.0f} requests"')
+    hits, misses = total("cache_hits"), total("cache_misses")
+    if hits or misses:
+        entries.append(f'cache;desc="{hits:.0f} hits, {misses:.0f} misses"')
+    return ", ".join(entries)
+
+
+def _start_request():
+    g.metrics = dict()
+    g.metrics_start = perf_counter()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    conn.info.setdefault("query_start", []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    start = conn.info["query_start"].pop()
+    metrics.record("sql_queries")
+    metrics.record("sql_duration_seconds", perf_counter() - start)
+
+
+metrics = Metrics()
@@ -1,13 +1,20 @@
+import sqlite3
 from collections import namedtuple
 from datetime import datetime, timedelta
 
 from flask_sqlalchemy import SQLAlchemy
-from tfomat.map import map_to_number, get_season_start, \
-    INVERSE_DISCIPLINE_MAPPER
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, validates
+from tfomat.map import map_to_number, get_season_start, get_season_end, \
+    get_max_age, INVERSE_DISCIPLINE_MAPPER
 from tfomat import ladv_scraper as ladv
 
 # Database setup
 db = SQLAlchemy()
+# the highest tailwind in m/s for which a performance counts for records
+MAX_LEGAL_WIND = 2.0
 
 
 class Athlete(db.Model):
@@ -18,13 +25,14 @@ class Athlete(db.Model):
     ladv_athlete_number = db.Column(db.Integer)
     ladv_id = db.Column(db.Integer)
 
-    def get_personal_best(self, discipline, date=None):
+    def get_personal_best(self, discipline, date=None, performances=None,
+                          legal_only=False):
         if date is None:
             date = datetime.today()
         if type(date) is str:
             date = datetime.strptime(date, "%d.%m.%Y")
-        performances = Performance.query.filter_by(
-            athlete_id=self.id, discipline=discipline)
+        performances = self._get_performances(discipline, performances,
+                                              legal_only)
         start_date = _get_valid_pb_start_date(discipline, date,
                                               self.year_of_birth, self.gender)
         performances = [
@@ -38,14 +46,15 @@ class Athlete(db.Model):
         performance = namedtuple("Performance", ["value"])
         return performance(value=None)
 
-    def get_seasons_best(self, discipline, date=None):
+    def get_seasons_best(self, discipline, date=None, performances=None,
+                         legal_only=False):
         if date is None:
             date = datetime.today()
         if type(date) is str:
             date = datetime.strptime(date, "%d.%m.%Y")
         season_start = get_season_start(date)
-        performances = Performance.query.filter_by(
-            athlete_id=self.id, discipline=discipline)
+        performances = self._get_performances(discipline, performances,
+                                              legal_only)
         season_performances = []
         for p in performances:
             pdate = datetime.strptime(p.date, "%d.%m.%Y")
@@ -64,14 +73,16 @@ class Athlete(db.Model):
     def is_seasons_best(self, discipline, value, date=None):
         return value == self.get_seasons_best(discipline, date).value
 
-    def is_record(self, discipline, value, date=None):
+    def is_record(self, discipline, value, date=None, legal_only=False):
         if date is None:
             date = datetime.today()
         if type(date) is str:
             date = datetime.strptime(date, "%d.%m.%Y")
         date -= timedelta(days=1)
-        previous_pb = self.get_personal_best(discipline, date)
-        previous_sb = self.get_seasons_best(discipline, date)
+        previous_pb = self.get_personal_best(discipline, date,
+                                             legal_only=legal_only)
+        previous_sb = self.get_seasons_best(discipline, date,
+                                            legal_only=legal_only)
 
         pb_rating = map_to_number(previous_pb.value)
         sb_rating = map_to_number(previous_sb.value)
@@ -110,16 +121,19 @@ class Athlete(db.Model):
 
         return "", None
 
-    def get_disciplines(self):
-        performances = Performance.query.filter_by(athlete_id=self.id).all()
+    def get_disciplines(self, performances=None, legal_only=False):
+        if performances is None:
+            performances = Performance.query.filter_by(athlete_id=self.id).all()
         disciplines = [p.discipline for p in performances]
 
         common_disciplines = []
         for discipline in set(disciplines):
             entry = {"discipline": discipline, "pb": None, "sb": None,
                      "count": disciplines.count(discipline)}
-            pb = self.get_personal_best(discipline)
-            sb = self.get_seasons_best(discipline)
+            pb = self.get_personal_best(discipline, performances=performances,
+                                        legal_only=legal_only)
+            sb = self.get_seasons_best(discipline, performances=performances,
+                                       legal_only=legal_only)
             if pb.value is not None:
                 entry["pb"] = pb.to_dict()
             if sb.value is not None:
@@ -134,14 +148,91 @@ class Athlete(db.Model):
 
         return common_disciplines
 
-    def get_upcoming_competitions(self):
+    def get_progression(self, points=None):
+        """
+        Get the best performance, the personal best and the number of
+        performances of each season in every discipline of the athlete.
+
+        The seasons are aggregated in SQL (see `map.get_season_start`), so
+        only one row per discipline and season is loaded. The personal best
+        is the best performance up to the end of a season regardless of
+        changes of the implements.
+
+        Args:
+            points (int): The maximum number of entries per discipline. If an
+                athlete competed in more seasons, consecutive seasons are
+                merged into one entry.
+
+        Returns:
+            list: The disciplines with their seasons in chronological order,
+                the disciplines with the most performances first.
+
+        """
+        month = db.func.substr(Performance.date, 4, 2)
+        year = db.cast(db.func.substr(Performance.date, 7, 4), db.Integer)
+        season_year = db.case((month <= "03", year - 1), else_=year)
+        winter = db.or_(month <= "03", month >= "11")
+        number = Performance.number
+        ascending = [d for d, higher_is_better in ASCENDING.items()
+                     if higher_is_better]
+        key = db.case((Performance.discipline.in_(ascending), -number),
+                      else_=number)
+        # the bare columns are taken from the row of the minimum (SQLite)
+        rows = db.session.query(
+            Performance.discipline, season_year, winter, db.func.count(),
+            db.func.min(db.case((number > 0, key))), Performance.value,
+            Performance.date, Performance.wind
+        ).filter(
+            Performance.athlete_id == self.id,
+            Performance.date.like("__.__.____")
+        ).group_by(
+            Performance.discipline, season_year, winter
+        ).order_by(Performance.discipline, season_year, winter).all()
+
+        disciplines = dict()
+        for discipline, y, is_winter, count, best, value, date, wind in rows:
+            day = datetime(y, 11, 1) if is_winter else datetime(y, 6, 1)
+            disciplines.setdefault(discipline, []).append({
+                "season": f"Winter {y}/{(y + 1) % 100:02d}" if is_winter
+                else f"Sommer {y}",
+                "start": get_season_start(day).strftime("%d.%m.%Y"),
+                "end": get_season_end(day).strftime("%d.%m.%Y"),
+                "count": count,
+                "key": best,
+                "best": None if best is None else
+                {"value": value, "date": date, "wind": wind}
+            })
+
+        progression = []
+        for discipline, seasons in disciplines.items():
+            if points and len(seasons) > points:
+                seasons = _merge_seasons(seasons, points)
+            pb = None
+            for season in seasons:
+                key = season.pop("key")
+                if key is not None and (pb is None or key < pb[0]):
+                    pb = (key, season["best"])
+                season["pb"] = None if pb is None else pb[1]
+            progression.append({
+                "discipline": INVERSE_DISCIPLINE_MAPPER.get(discipline,
+                                                            discipline),
+                "count": sum(s["count"] for s in seasons),
+                "seasons": seasons
+            })
+        progression.sort(key=lambda x: -x["count"])
+        return progression
+
+    def get_upcoming_competitions(self, api_key):
         if self.ladv_id is None:
             try:
                 self.ladv_id = ladv.get_ladv_id(self.name)
                 db.session.commit()
             except:
                 pass
-        upcoming_competitions = ladv.get_upcoming_competitions(self.ladv_id)
+        upcoming_competitions = ladv.get_upcoming_competitions(self.ladv_id,
+                                                               api_key)
+        if "error" in upcoming_competitions:
+            return upcoming_competitions
 
         for competition in upcoming_competitions:
             for discipline in competition["wettbewerbe"]:
@@ -150,12 +241,15 @@ class Athlete(db.Model):
 
         return upcoming_competitions
 
-    def get_last_competitions(self):
-        performances = Performance.query.filter_by(athlete_id=self.id).all()
+    def get_last_competitions(self, performances=None):
+        if performances is None:
+            performances = Performance.query.filter_by(athlete_id=self.id).all()
         dates = sorted(
             list(set([p.date for p in performances])),
             key=lambda x: datetime.strptime(x, "%d.%m.%Y").timestamp()
         )
+        if not dates:
+            return []
         date_threshold = dates[-min(3, len(dates))]
         datetime_threshold = datetime.strptime(date_threshold, "%d.%m.%Y")
         last_competitions = [
@@ -178,13 +272,25 @@ class Athlete(db.Model):
             competition["wind"] = wind_fmt
         return last_competitions
 
-    def get_athlete_info(self):
+    def get_athlete_info(self, api_key):
+        performances = Performance.query.filter_by(athlete_id=self.id).all()
         return {
-            "upcoming_competitions": self.get_upcoming_competitions(),
-            "last_competitions": self.get_last_competitions(),
-            "disciplines": self.get_disciplines()
+            "upcoming_competitions": self.get_upcoming_competitions(api_key),
+            "last_competitions": self.get_last_competitions(performances),
+            "disciplines": self.get_disciplines(performances)
         }
 
+    def _get_performances(self, discipline, performances=None,
+                          legal_only=False):
+        if performances is None:
+            query = Performance.query.filter_by(athlete_id=self.id,
+                                                discipline=discipline)
+            if legal_only:
+                query = query.filter(Performance.wind_legal.is_(True))
+            return query
+        return [p for p in performances if p.discipline == discipline
+                and (p.wind_legal or not legal_only)]
+
     def add_performances(self, performances):
         for p in performances:
             existing_performance = Performance.query.filter_by(date=p["datum"],
@@ -228,6 +334,33 @@ class Performance(db.Model):
     placement = db.Column(db.Integer)
     championship = db.Column(db.String(150))
     indoor = db.Column(db.Boolean)
+    # whether the wind was at most MAX_LEGAL_WIND or not measured
+    wind_legal = db.Column(db.Boolean,
+                           default=lambda context: is_wind_legal(
+                               context.get_current_parameters().get("wind")))
+    # the value of `map_to_number`, -1 for results that are not a number
+    number = db.Column(db.Float,
+                       default=lambda context: map_to_number(
+                           context.get_current_parameters().get("value")))
+
+    __table_args__ = (
+        # wind_legal last, so the rankings of legal marks use these as well
+        db.Index("ix_performance_athlete_discipline", "athlete_id",
+                 "discipline", "wind_legal"),
+        db.Index("ix_performance_discipline_indoor", "discipline", "indoor",
+                 "wind_legal"),
+        db.Index("ix_performance_discipline_number", "discipline", "number"),
+    )
+
+    @validates("wind")
+    def _validate_wind(self, key, wind):
+        self.wind_legal = is_wind_legal(wind)
+        return wind
+
+    @validates("value")
+    def _validate_value(self, key, value):
+        self.number = map_to_number(value)
+        return value
 
     def update(self, data):
         self.date = data.get("date", self.date)
@@ -253,10 +386,25 @@ class Performance(db.Model):
             "unit": self.unit,
             "wind": self.wind,
             "placement": self.placement,
-            "indoor": self.indoor
+            "indoor": self.indoor,
+            "wind_legal": self.wind_legal
         }
 
 
+def is_wind_legal(wind):
+    """
+    Check if a performance counts for records and rankings of legal marks.
+
+    Args:
+        wind (float): The wind in m/s or None if it was not measured.
+
+    Returns:
+        bool: Whether the wind was at most `MAX_LEGAL_WIND` or not measured.
+
+    """
+    return wind is None or wind <= MAX_LEGAL_WIND
+
+
 def _get_valid_pb_start_date(discipline, date, year_of_birth, gender):
     #  60 m Hurdles (60H): WU14, WU16, WU18, WU20 + W, MU14, MU16, MU18, MU20, M
     # 100 m Hurdles (100H): WU18, WU20 + W
@@ -312,6 +460,25 @@ def _get_valid_pb_start_date(discipline, date, year_of_birth, gender):
     return datetime(date.year - (athlete_age % 2), 1, 1)
 
 
+def _merge_seasons(seasons, points):
+    size = -(-len(seasons) // points)
+    merged = []
+    for i in range(0, len(seasons), size):
+        chunk = seasons[i:i + size]
+        ranked = [s for s in chunk if s["key"] is not None]
+        best = min(ranked, key=lambda s: s["key"]) if ranked else chunk[0]
+        merged.append({
+            "season": chunk[0]["season"] if len(chunk) == 1
+            else f"{chunk[0]['season']} - {chunk[-1]['season']}",
+            "start": chunk[0]["start"],
+            "end": chunk[-1]["end"],
+            "count": sum(s["count"] for s in chunk),
+            "key": best["key"] if ranked else None,
+            "best": best["best"] if ranked else None
+        })
+    return merged
+
+
 class QualificationNorm(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(150))
@@ -342,6 +509,289 @@ class QualificationNorm(db.Model):
         }
 
 
+class Qualification(db.Model):
+    """
+    The best performance with which an athlete met a qualification norm in
+    the year of a season. The table is kept up to date by
+    `update_qualifications` whenever performances, athletes or norms change.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    norm_id = db.Column(db.Integer, db.ForeignKey('qualification_norm.id'),
+                        index=True)
+    athlete_id = db.Column(db.Integer, db.ForeignKey('athlete.id'),
+                           index=True)
+    year = db.Column(db.Integer, index=True)
+    performance_id = db.Column(db.Integer, db.ForeignKey('performance.id'))
+
+
+def update_qualifications(connection, athlete_ids=None, norm_ids=None):
+    """
+    Match qualification norms against the performances of athletes with the
+    same gender and discipline, the same indoor flag and an age in the age
+    group of the norm (see `map.get_max_age`).
+
+    The norms are matched in one statement for the disciplines where higher
+    values are better and one for the others, so the stored `number` of the
+    performances is compared with a range of the index on discipline and
+    number. Performances from November on count for the next year like the
+    winter season they belong to.
+
+    Args:
+        connection (sqlalchemy.engine.Connection): The connection to use.
+        athlete_ids (iterable): Only update the qualifications of these
+            athletes.
+        norm_ids (iterable): Only update the qualifications of these norms.
+            If neither athletes nor norms are given, all qualifications are
+            updated.
+
+    Returns:
+        None.
+
+    """
+    criteria = []
+    if athlete_ids is not None or norm_ids is not None:
+        athlete_ids = list(athlete_ids or [])
+        norm_ids = list(norm_ids or [])
+        criteria = [db.or_(Qualification.athlete_id.in_(athlete_ids),
+                           Qualification.norm_id.in_(norm_ids))]
+        match = db.or_(Performance.athlete_id.in_(athlete_ids),
+                       QualificationNorm.id.in_(norm_ids))
+    connection.execute(Qualification.__table__.delete().where(*criteria))
+
+    norm_number = db.func.map_to_number(QualificationNorm.value)
+    month = db.func.substr(Performance.date, 4, 2)
+    year = db.cast(db.func.substr(Performance.date, 7, 4), db.Integer)
+    season_year = db.case((month >= "11", year + 1), else_=year)
+    max_age = db.func.max_age(QualificationNorm.agegroup)
+    ascending = QualificationNorm.discipline.in_(
+        [d for d, higher_is_better in ASCENDING.items() if higher_is_better])
+    for higher_is_better in (True, False):
+        if higher_is_better:
+            norms = ascending
+            reached = Performance.number >= norm_number
+            best_number = db.func.max(Performance.number)
+        else:
+            norms = ~ascending
+            reached = Performance.number <= norm_number
+            best_number = db.func.min(Performance.number)
+        best = db.select(
+            QualificationNorm.id.label("norm_id"), Performance.athlete_id,
+            season_year.label("year"), Performance.id.label("performance_id"),
+            # the bare columns are taken from the row of the best (SQLite)
+            best_number
+        ).select_from(QualificationNorm).join(
+            Performance,
+            db.and_(Performance.discipline == QualificationNorm.discipline,
+                    Performance.indoor == QualificationNorm.indoor)
+        ).join(Athlete, Athlete.id == Performance.athlete_id).where(
+            norms,
+            Athlete.gender == QualificationNorm.gender,
+            Performance.date.like("__.__.____"),
+            Performance.number > 0,
+            reached,
+            db.or_(max_age.is_(None),
+                   season_year - Athlete.year_of_birth <= max_age)
+        ).group_by(QualificationNorm.id, Performance.athlete_id, season_year)
+        if criteria:
+            best = best.where(match)
+        best = best.subquery()
+        connection.execute(Qualification.__table__.insert().from_select(
+            ["norm_id", "athlete_id", "year", "performance_id"],
+            db.select(best.c.norm_id, best.c.athlete_id, best.c.year,
+                      best.c.performance_id)))
+
+
+class Event(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    url = db.Column(db.String(300), unique=True)
+    result_id = db.Column(db.Integer)
+    date = db.Column(db.String(150))
+    city = db.Column(db.String(150))
+    name = db.Column(db.String(300))
+    year = db.Column(db.Integer, index=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "url": self.url,
+            "result_id": self.result_id,
+            "date": self.date,
+            "city": self.city,
+            "name": self.name,
+            "year": self.year
+        }
+
+
+def upsert_events(events, year):
+    """
+    Insert events from the ladv event list or update them if they exist.
+
+    Args:
+        events (list): The events as returned by
+            `ladv_scraper.get_club_results`.
+        year (int): The year of the events.
+
+    Returns:
+        None.
+
+    """
+    if not events:
+        return
+    rows = [
+        {
+            "url": e["url"],
+            "result_id": int(e["id"]) if e.get("id") else None,
+            "date": e["datumText"].split("/")[-1],
+            "city": e["ort"],
+            "name": e["name"],
+            "year": int(year)
+        }
+        for e in events
+    ]
+    statement = sqlite_insert(Event).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[Event.url],
+        set_={k: statement.excluded[k]
+              for k in ("result_id", "date", "city", "name", "year")}
+    )
+    db.session.execute(statement)
+    db.session.commit()
+
+
+class DataVersion(db.Model):
+    """
+    A counter that is incremented with every change of athletes,
+    performances or qualification norms, so data that is derived from them
+    can be cached by version.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+def get_data_version():
+    """
+    Get the current version of the athletes, performances and qualification
+    norms.
+
+    Returns:
+        int: The version.
+
+    """
+    return db.session.query(DataVersion.version).filter_by(id=1).scalar() or 0
+
+
+class PerformanceChange(db.Model):
+    """
+    A log of the ids of performances that were added, changed or deleted,
+    so copies of the performance table can be updated incrementally.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    performance_id = db.Column(db.Integer, nullable=False)
+
+
+# number of entries that are kept in the change log
+CHANGE_LOG_SIZE = 10000
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    # flushes happen often (autoflush), so the changes are only collected
+    # here and recorded once per transaction in `_record_changes`
+    changed = list(session.new) + list(session.deleted) + [
+        o for o in session.dirty if session.is_modified(o)]
+    if not any(isinstance(o, (Athlete, Performance, QualificationNorm))
+               for o in changed):
+        return
+    changes = session.info.setdefault(
+        "changes", {"performances": set(), "athletes": set(), "norms": set()})
+    for o in changed:
+        if isinstance(o, Performance):
+            changes["performances"].add(o.id)
+            changes["athletes"].add(o.athlete_id)
+            changes["athletes"].update(
+                inspect(o).attrs.athlete_id.history.deleted)
+        elif isinstance(o, Athlete):
+            changes["athletes"].add(o.id)
+        elif isinstance(o, QualificationNorm):
+            changes["norms"].add(o.id)
+
+
+@event.listens_for(Session, "before_commit")
+def _record_changes(session):
+    # the last flush of a commit happens after this event
+    session.flush()
+    changes = session.info.pop("changes", None)
+    if changes is None:
+        return
+    # in the transaction of the changes, so all are committed together
+    connection = session.connection()
+    statement = sqlite_insert(DataVersion).values(id=1, version=1)
+    statement = statement.on_conflict_do_update(
+        index_elements=[DataVersion.id],
+        set_={"version": DataVersion.version + 1})
+    connection.execute(statement)
+
+    if changes["performances"]:
+        connection.execute(
+            PerformanceChange.__table__.insert(),
+            [{"performance_id": i} for i in changes["performances"]])
+        latest = db.select(db.func.max(PerformanceChange.id)).scalar_subquery()
+        connection.execute(PerformanceChange.__table__.delete().where(
+            PerformanceChange.id <= latest - CHANGE_LOG_SIZE))
+
+    changes["athletes"].discard(None)
+    if changes["athletes"] or changes["norms"]:
+        update_qualifications(connection, changes["athletes"],
+                              changes["norms"])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("changes", None)
+
+
+@event.listens_for(Engine, "connect")
+def _register_functions(dbapi_connection, connection_record):
+    # lets queries compare and aggregate the values of performances
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function("map_to_number", 1, map_to_number,
+                                         deterministic=True)
+        dbapi_connection.create_function("max_age", 1, get_max_age,
+                                         deterministic=True)
+
+
+class Listing(db.Model):
+    name = db.Column(db.String(150), primary_key=True)
+    payload = db.Column(db.Text)
+    refreshed = db.Column(db.Float)
+    refreshing = db.Column(db.Float)
+
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(150), unique=True)
+    kind = db.Column(db.String(150))
+    args = db.Column(db.Text)
+    target = db.Column(db.String(150))
+    status = db.Column(db.String(150), index=True)
+    result = db.Column(db.Text)
+    created = db.Column(db.Float)
+    started = db.Column(db.Float)
+    finished = db.Column(db.Float)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "target": self.target,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished
+        }
+
+
 ASCENDING = {
     "60H": False,
     "80H": False,
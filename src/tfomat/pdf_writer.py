@@ -0,0 +1,240 @@
+"""Export of meeting results as pdf without pdflatex."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import os
+import tempfile
+
+# A4 in points and page margins of 15mm (top) and 20mm
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+MARGIN_TOP = 42.52
+MARGIN = 56.69
+
+REGULAR = "F1"
+BOLD = "F2"
+FONTS = {REGULAR: "Helvetica", BOLD: "Helvetica-Bold"}
+
+# glyph widths of the standard fonts for the characters 32 to 126 in 1/1000
+# of the font size
+_WIDTHS = {
+    REGULAR: [
+        278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333,
+        278, 278, 556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278,
+        584, 584, 584, 556, 1015, 667, 667, 722, 722, 667, 611, 778, 722, 278,
+        500, 667, 556, 833, 722, 778, 667, 778, 722, 667, 611, 722, 667, 944,
+        667, 667, 611, 278, 278, 278, 469, 556, 333, 556, 556, 500, 556, 556,
+        278, 556, 556, 222, 222, 500, 222, 833, 556, 556, 556, 556, 333, 500,
+        278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584
+    ],
+    BOLD: [
+        278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333,
+        278, 278, 556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333,
+        584, 584, 584, 611, 975, 722, 722, 722, 722, 667, 611, 778, 722, 278,
+        556, 722, 611, 833, 722, 778, 667, 778, 722, 667, 611, 722, 667, 944,
+        667, 667, 611, 333, 278, 333, 584, 556, 333, 556, 611, 556, 611, 556,
+        333, 611, 611, 278, 278, 556, 278, 889, 611, 611, 611, 611, 389, 556,
+        333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584
+    ]
+}
+# accented characters have the width of their base character
+_BASE_CHARS = {"Ä": "A", "Ö": "O", "Ü": "U", "ä": "a", "ö": "o", "ü": "u",
+               "ß": "B", "é": "e", "è": "e", "á": "a", "à": "a", "ó": "o",
+               "ç": "c", "ñ": "n"}
+
+# relative column widths and alignment of name, round, rank, result and SB/PB
+COLUMNS = ((2.5, "l"), (1.5, "l"), (1, "r"), (1.5, "r"), (1, "r"))
+CELL_PADDING = 4
+ROW_HEIGHT = 16
+ZEBRA_GRAY = 0.9
+
+
+def make_pdf(data, title, subtitle, name="main"):
+    """
+    Create a pdf file with the results of a meeting.
+
+    The pdf is written directly with the standard fonts, so neither a LaTeX
+    installation nor any other dependency is required.
+
+    Args:
+        data (dict): The results grouped by age group and discipline.
+        title (str): The title of the document.
+        subtitle (str): The subtitle of the document.
+        name (str): The path of the output file without the extension.
+
+    Returns:
+        None.
+
+    """
+    doc = _Document()
+    doc.text(title, 16, BOLD)
+    doc.skip(4)
+    doc.text(subtitle, 12, BOLD)
+    doc.skip(ROW_HEIGHT)
+
+    header = ["Name", "", "Rang", "Leistung", "SB/PB"]
+    row_counter = 0
+    for age in data:
+        doc.ensure_space(3 * ROW_HEIGHT + 40)
+        doc.text(age, 14, BOLD)
+        doc.skip(ROW_HEIGHT / 2)
+        for disc in data[age]:
+            doc.ensure_space(3 * ROW_HEIGHT + 20)
+            doc.text(disc, 12, BOLD)
+            doc.row(header, BOLD)
+            doc.hline()
+            for r in data[age][disc]:
+                doc.ensure_space(ROW_HEIGHT)
+                doc.row([r["name"], r["subtitle"], r["rank"], r["result"],
+                         r["pborsb"]], REGULAR, shaded=row_counter % 2)
+                row_counter += 1
+            doc.skip(ROW_HEIGHT)
+        doc.skip(ROW_HEIGHT)
+    doc.save(name + ".pdf")
+
+
+def text_width(text, font, size):
+    """
+    Get the width of a text in points.
+
+    Args:
+        text (str): The text.
+        font (str): The font, `REGULAR` or `BOLD`.
+        size (float): The font size in points.
+
+    Returns:
+        float: The width of the text.
+
+    """
+    widths = _WIDTHS[font]
+    total = 0
+    for c in text:
+        c = _BASE_CHARS.get(c, c)
+        code = ord(c) - 32
+        total += widths[code] if 0 <= code < len(widths) else 556
+    return total * size / 1000
+
+
+class _Document:
+    """Pages of a pdf that are filled from top to bottom."""
+
+    def __init__(self):
+        self.pages = []
+        self.y = 0
+        total = sum(w for w, _ in COLUMNS)
+        text_width = PAGE_WIDTH - 2 * MARGIN
+        self.columns = []
+        x = MARGIN
+        for width, align in COLUMNS:
+            width = width / total * text_width
+            self.columns.append((x, width, align))
+            x += width
+        self.new_page()
+
+    def new_page(self):
+        self.pages.append([])
+        self.y = PAGE_HEIGHT - MARGIN_TOP
+
+    def ensure_space(self, height):
+        if self.y - height < MARGIN:
+            self.new_page()
+
+    def skip(self, height):
+        self.y -= height
+
+    def text(self, text, size, font):
+        self.ensure_space(size * 1.5)
+        self.y -= size * 1.5
+        self._draw_text(MARGIN, self.y + size * 0.4, text, size, font)
+
+    def row(self, cells, font, shaded=False, size=10):
+        self.y -= ROW_HEIGHT
+        if shaded:
+            self.pages[-1].append(
+                f"{ZEBRA_GRAY} g {MARGIN:.2f} {self.y:.2f} "
+                f"{PAGE_WIDTH - 2 * MARGIN:.2f} {ROW_HEIGHT} re f 0 g"
+            )
+        for (x, width, align), cell in zip(self.columns, cells):
+            cell = _fit(str(cell or ""), width - 2 * CELL_PADDING, font, size)
+            if align == "r":
+                x += width - CELL_PADDING - text_width(cell, font, size)
+            else:
+                x += CELL_PADDING
+            self._draw_text(x, self.y + 4.5, cell, size, font)
+
+    def hline(self):
+        self.pages[-1].append(
+            f"0.5 w {MARGIN:.2f} {self.y:.2f} m "
+            f"{PAGE_WIDTH - MARGIN:.2f} {self.y:.2f} l S"
+        )
+
+    def _draw_text(self, x, y, text, size, font):
+        if not text:
+            return
+        self.pages[-1].append(
+            f"BT /{font} {size} Tf {x:.2f} {y:.2f} Td ({_pdf_string(text)}) Tj ET"
+        )
+
+    def save(self, path):
+        objects = [
+            "<< /Type /Catalog /Pages 2 0 R >>",
+            None,
+            *[f"<< /Type /Font /Subtype /Type1 /BaseFont /{FONTS[f]} "
+              f"/Encoding /WinAnsiEncoding >>" for f in (REGULAR, BOLD)]
+        ]
+        page_ids = []
+        for content in self.pages:
+            stream = "\n".join(content).encode("cp1252", errors="replace")
+            objects.append(b"<< /Length %d >>\nstream\n" % len(stream)
+                           + stream + b"\nendstream")
+            page_ids.append(len(objects) + 1)
+            objects.append(
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} "
+                f"{PAGE_HEIGHT}] /Resources << /Font << /{REGULAR} 3 0 R "
+                f"/{BOLD} 4 0 R >> >> /Contents {len(objects)} 0 R >>"
+            )
+        objects[1] = "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            " ".join(f"{i} 0 R" for i in page_ids), len(page_ids))
+
+        pdf = bytearray(b"%PDF-1.4\n")
+        offsets = []
+        for i, obj in enumerate(objects, start=1):
+            if isinstance(obj, str):
+                obj = obj.encode("ascii")
+            offsets.append(len(pdf))
+            pdf += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+        xref = len(pdf)
+        pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        for offset in offsets:
+            pdf += b"%010d 00000 n \n" % offset
+        pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" \
+            % (len(objects) + 1, xref)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+                                        suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf)
+        os.replace(tmp_path, path)
+
+
+def _fit(text, width, font, size):
+    """Shorten a text with an ellipsis until it fits into `width`."""
+    if text_width(text, font, size) <= width:
+        return text
+    while text and text_width(text + "...", font, size) > width:
+        text = text[:-1]
+    return text + "..."
+
+
+def _pdf_string(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
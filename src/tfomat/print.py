@@ -1,64 +1,266 @@
-from pylatex import Document, Section, MultiColumn, NewLine, \
-    MediumText, LargeText, LongTabu, NoEscape, Package
-from pylatex.utils import bold
+"""Export of meeting results as pdf via pdflatex."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+
+from tfomat.cache import result_cache
+
+# maximum number of pdflatex runs at the same time in this process
+MAX_WORKERS = int(os.getenv("PDF-BUILD-WORKERS", 2))
+
+PREAMBLE = r"""\documentclass{article}
+\usepackage[T1]{fontenc}
+\usepackage[utf8]{inputenc}
+\usepackage{lmodern}
+\usepackage{textcomp}
+\usepackage[tmargin=15mm,lmargin=20mm,rmargin=20mm,bmargin=20mm]{geometry}
+\usepackage[table]{xcolor}
+\usepackage{array}
+\usepackage{longtable}
+\pagestyle{empty}
+\renewcommand{\arraystretch}{1.5}
+"""
+FORMAT_NAME = "tfomat-" + sha256(PREAMBLE.encode("utf-8")).hexdigest()[:12]
+
+# relative column widths of name, round, rank, result and SB/PB
+COLUMNS = ((2.5, "raggedright"), (1.5, "raggedright"), (1, "raggedleft"),
+           (1.5, "raggedleft"), (1, "raggedleft"))
+ZEBRA = r"\rowcolor{black!10}"
+LATEX_SPECIAL_CHARS = {
+    "&": r"\&", "%": r"\%", "$": r"\$", "#": r"\#", "_": r"\_", "{": r"\{",
+    "}": r"\}", "~": r"\textasciitilde{}", "^": r"\textasciicircum{}",
+    "\\": r"\textbackslash{}"
+}
+
+_executor = None
+_format_build = None
 
 
 def make_pdf(data, title, subtitle, name="main"):
+    """
+    Create a pdf file with the results of a meeting.
+
+    The LaTeX source is written directly and compiled with a precompiled
+    format of the fixed preamble in a bounded pool of processes. Compiled
+    files are cached by the hash of their source, so unchanged results are
+    never compiled twice.
+
+    Args:
+        data (dict): The results grouped by age group and discipline.
+        title (str): The title of the document.
+        subtitle (str): The subtitle of the document.
+        name (str): The path of the output file without the extension.
+
+    Returns:
+        None.
+
+    """
+    tex = make_tex(data, title, subtitle)
+    store_key = sha256(tex.encode("utf-8")).hexdigest() + ".pdf"
+    stored_file = result_cache.get_path(store_key) \
+        if result_cache.path is not None else None
+    if stored_file is not None:
+        shutil.copyfile(stored_file, name + ".pdf")
+        return
+
+    fmt = _get_format()
+    pdf_file = _get_executor().submit(_compile, tex, fmt,
+                                      _get_format_path()).result()
+    try:
+        shutil.copyfile(pdf_file, name + ".pdf")
+        if result_cache.path is not None:
+            with result_cache.build_dir() as build_dir:
+                tmp_file = os.path.join(build_dir, store_key)
+                shutil.move(pdf_file, tmp_file)
+                result_cache.put_file(store_key, tmp_file)
+    finally:
+        shutil.rmtree(os.path.dirname(pdf_file), ignore_errors=True)
+
+
+def make_tex(data, title, subtitle):
+    """
+    Create the LaTeX source for the results of a meeting.
+
+    Args:
+        data (dict): The results grouped by age group and discipline.
+        title (str): The title of the document.
+        subtitle (str): The subtitle of the document.
+
+    Returns:
+        str: The LaTeX source.
+
+    """
+    total = sum(w for w, _ in COLUMNS)
+    column_spec = "".join(
+        r">{\%s\arraybackslash}p{\dimexpr %.4f\linewidth-2\tabcolsep\relax}"
+        % (align, width / total) for width, align in COLUMNS)
+
+    lines = [
+        PREAMBLE,
+        r"\csname endofdump\endcsname",
+        r"\begin{document}",
+        r"\section*{%s}" % _escape(title),
+        r"{\large\textbf{%s}}\newline\newline" % _escape(subtitle),
+        r"\begin{longtable}{%s}" % column_spec
+    ]
+    header = r"\textbf{Name} & & \textbf{Rang} & \textbf{Leistung} & " \
+             r"\textbf{SB/PB} \\ \hline"
+    row_counter = 0
+    for age in data:
+        lines.append(r"\multicolumn{5}{l}{\Large\textbf{%s}} \\" % _escape(age))
+        lines.append(r"\\")
+        for disc in data[age]:
+            lines.append(
+                r"\multicolumn{5}{l}{\large\textbf{%s}} \\" % _escape(disc))
+            lines.append(header)
+            for r in data[age][disc]:
+                cells = " & ".join(_escape(r[k]) for k in (
+                    "name", "subtitle", "rank", "result", "pborsb"))
+                lines.append((ZEBRA if row_counter % 2 else "") + cells + r" \\")
+                row_counter += 1
+            lines.append(r"\\")
+        lines.append(r"\\")
+        lines.append(r"\\")
+    lines += [r"\end{longtable}", r"\end{document}", ""]
+    return "\n".join(lines)
+
+
+def _escape(text):
+    return "".join(LATEX_SPECIAL_CHARS.get(c, c) for c in str(text or ""))
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+    return _executor
+
+
+def _get_format_path():
+    """
+    Get the directory of the precompiled format. It is inside the result
+    cache, so all containers that share the cache use the same format.
+
+    Returns:
+        str: The path of the directory.
+
+    """
+    if result_cache.path is None:
+        return os.path.join(tempfile.gettempdir(), "tfomat-latex")
+    return os.path.join(result_cache.path, "latex")
+
+
+def build_format(format_path=None):
+    """
+    Precompile the fixed preamble into a pdflatex format file, so every pdf
+    is compiled without loading the packages again. Called by `init_db`, so
+    requests do not have to wait for it.
+
+    Args:
+        format_path (str): The directory of the format file, by default
+            the one of `_get_format_path`.
+
+    Returns:
+        bool: Whether the format file is available.
+
+    """
+    format_path = format_path or _get_format_path()
+    if os.path.exists(os.path.join(format_path, FORMAT_NAME + ".fmt")):
+        return True
+
+    os.makedirs(format_path, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=format_path) as build_dir:
+        with open(os.path.join(build_dir, "preamble.tex"), "w",
+                  encoding="utf-8") as f:
+            f.write(PREAMBLE + "\\begin{document}\n\\end{document}\n")
+        try:
+            returncode = subprocess.run(
+                ["pdflatex", "-ini", "-interaction=nonstopmode",
+                 f"-jobname={FORMAT_NAME}", "&pdflatex", "mylatexformat.ltx",
+                 "preamble.tex"],
+                cwd=build_dir, stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL, timeout=50
+            ).returncode
+        except (OSError, subprocess.TimeoutExpired):
+            returncode = -1
+        fmt_file = os.path.join(build_dir, FORMAT_NAME + ".fmt")
+        if returncode == 0 and os.path.exists(fmt_file):
+            os.replace(fmt_file, os.path.join(format_path,
+                                              FORMAT_NAME + ".fmt"))
+            return True
+    return False
+
+
+def _get_format():
+    """
+    Get the precompiled format if it exists. Otherwise it is built in the
+    process pool and the pdfs are compiled without it in the meantime. A
+    build that failed is started again with the next pdf.
+
+    Returns:
+        str: The name of the format or None.
+
+    """
+    global _format_build
+    format_path = _get_format_path()
+    if os.path.exists(os.path.join(format_path, FORMAT_NAME + ".fmt")):
+        return FORMAT_NAME
+    if _format_build is not None and _format_build.done() and (
+            _format_build.exception() is not None
+            or not _format_build.result()):
+        _format_build = None
+    if _format_build is None:
+        _format_build = _get_executor().submit(build_format, format_path)
+    return None
+
+
+def _compile(tex, fmt=None, format_path=None):
+    """
+    Compile LaTeX source with pdflatex in a new temporary directory.
+
+    Args:
+        tex (str): The LaTeX source.
+        fmt (str): The name of a precompiled format in `format_path`.
+        format_path (str): The directory of the format file.
 
+    Returns:
+        str: The path to the pdf file.
 
-    geometry_options = {
-        "tmargin": "15mm", "lmargin": "20mm", "rmargin": "20mm",
-        "bmargin": "20mm"
-    }
-    doc = Document(geometry_options=geometry_options, page_numbers=False)
-    doc.change_length("\\tabulinesep", "4pt")
-    doc.packages.append(Package("xcolor"))
-    # remove dependency of Package("longtable") from LongTabu
-    # and add longtable[_v4.13] to the preambel for compatibility
-    # purposes
-    LongTabu.packages = [Package("tabu")]
-    doc.preamble.append(NoEscape(r'\usepackage{longtable}[=v4.13]'))
-    with doc.create(Section(title, numbering=False)):
-        doc.append(MediumText(bold(subtitle)))
-        doc.append(NewLine())
-        doc.append(NewLine())
-        # Generate data table
-        fmt_string = r"\hspace*{-1mm}\colorbox{black!10}{\strut\parbox{\dimexpr\textwidth - 2\fboxsep\relax}{"
-        with doc.create(
-                LongTabu(
-                    "X[2.5, l] X[1.5, l] X[r] X[1.5, r] X[r]")) as data_table:
-            header_row1 = ["Name", "", "Rang", "Leistung", "SB/PB"]
-            row_counter = 0
-            for age in data:
-                data_table.add_row((MultiColumn(5, align='l',
-                                                data=LargeText(bold(age))),))
-                data_table.add_empty_row()
-                for disc in data[age]:
-                    data_table.add_row(
-                        (MultiColumn(
-                            5, align='l', data=MediumText(bold(disc))),)
-                    )
-                    data_table.add_row(header_row1, mapper=[bold])
-                    data_table.add_hline()
-
-                    for r in data[age][disc]:
-                        if row_counter % 2:
-                            row = [
-                                NoEscape(fmt_string + r["name"] + r"}}"),
-                                r["subtitle"], r["rank"], r["result"],
-                                r["pborsb"]
-                            ]
-                        else:
-                            row = [r["name"], r["subtitle"], r["rank"],
-                                   r["result"], r["pborsb"]
-                                   ]
-                        data_table.add_row(row)
-                        row_counter += 1
-                    data_table.add_empty_row()
-                data_table.add_empty_row()
-                data_table.add_empty_row()
-    doc.generate_pdf(name, clean_tex=True)
+    """
+    build_dir = tempfile.mkdtemp(prefix="tfomat-")
+    with open(os.path.join(build_dir, "main.tex"), "w", encoding="utf-8") as f:
+        f.write(tex)
+    command = ["pdflatex", "-interaction=nonstopmode", "-halt-on-error"]
+    env = dict(os.environ)
+    if fmt is not None:
+        command.append(f"-fmt={fmt}")
+        env["TEXFORMATS"] = format_path + os.pathsep
+    command.append("main.tex")
+    try:
+        subprocess.run(command, cwd=build_dir, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       timeout=50)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    return os.path.join(build_dir, "main.pdf")
 
 
 if __name__ == '__main__':
-    make_pdf([], "", "")
+    make_pdf({}, "", "")
@@ -0,0 +1,215 @@
+"""Detection of repeated SQL statements of the same shape (N+1 queries)."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from threading import local
+
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PACKAGE_PATH = os.path.dirname(os.path.abspath(__file__))
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+# the query logs that statements of the current thread are added to
+_active = local()
+
+
+class NPlusOneError(AssertionError):
+    """Raised if a request repeats a statement more often than allowed."""
+
+
+def fingerprint(statement):
+    """
+    Get the shape of an SQL statement without its literal values.
+
+    Args:
+        statement (str): The SQL statement.
+
+    Returns:
+        str: The statement with placeholders for all literals and lists of
+            values and with normalized whitespace.
+
+    """
+    statement = _LITERALS.sub("?", statement)
+    statement = _LISTS.sub("(?)", statement)
+    return _SPACE.sub(" ", statement).strip()
+
+
+class QueryLog:
+    """The SQL statements that were executed, by fingerprint."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.call_sites = dict()
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def record(self, statement):
+        """
+        Add a statement to the log.
+
+        Args:
+            statement (str): The SQL statement.
+
+        Returns:
+            None.
+
+        """
+        shape = fingerprint(statement)
+        self.counts[shape] += 1
+        self.call_sites.setdefault(shape, Counter())[_get_call_site()] += 1
+
+    def repeated(self, threshold):
+        """
+        Get the statements that were executed more than `threshold` times.
+
+        Args:
+            threshold (int): The number of times a statement may be executed.
+
+        Returns:
+            list: Tuples of the fingerprint, the number of executions and the
+                call sites by number of executions, most frequent first.
+
+        """
+        return [
+            (shape, count, self.call_sites[shape].most_common())
+            for shape, count in self.counts.most_common() if count > threshold
+        ]
+
+    def report(self, threshold=0):
+        """
+        Describe the statements that were executed more than `threshold`
+        times.
+
+        Args:
+            threshold (int): The number of times a statement may be executed.
+
+        Returns:
+            str: One line per statement and call site.
+
+        """
+        lines = [f"{len(self)} statements, {len(self.counts)} distinct"]
+        for shape, count, call_sites in self.repeated(threshold):
+            lines.append(f"{count:5d} x {shape}")
+            lines += [f"        {n:5d} x at {site}" for site, n in call_sites]
+        return "\n".join(lines)
+
+
+@contextmanager
+def capture():
+    """
+    Log the SQL statements that the current thread executes.
+
+    Yields:
+        QueryLog: The log of the statements.
+
+    """
+    _listen()
+    log = QueryLog()
+    logs = _get_active()
+    logs.append(log)
+    try:
+        yield log
+    finally:
+        logs.remove(log)
+
+
+class NPlusOneDetector:
+    """
+    Report requests that execute a statement of the same shape more than
+    `NPLUSONE_THRESHOLD` times.
+
+    The detector is only active if the threshold is set. Repeated statements
+    are logged as warnings with their call sites or, if `NPLUSONE_RAISE` is
+    set, raise a `NPlusOneError`.
+    """
+
+    def __init__(self):
+        self.threshold = None
+        self.raise_error = False
+
+    def init_app(self, app):
+        self.threshold = app.config.get("NPLUSONE_THRESHOLD")
+        self.raise_error = app.config.get("NPLUSONE_RAISE", False)
+        if not self.threshold:
+            return
+        _listen()
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._teardown_request)
+
+    def _start_request(self):
+        g.query_log = QueryLog()
+        _get_active().append(g.query_log)
+
+    def _finish_request(self, response):
+        log = g.pop("query_log", None)
+        if log is None:
+            return response
+        _get_active().remove(log)
+        if not log.repeated(self.threshold):
+            return response
+        message = f"Repeated statements in {request.method} " \
+                  f"{request.full_path}:\n{log.report(self.threshold)}"
+        if self.raise_error:
+            raise NPlusOneError(message)
+        current_app.logger.warning(message)
+        return response
+
+    def _teardown_request(self, exception):
+        log = g.pop("query_log", None)
+        if log is not None:
+            _get_active().remove(log)
+
+
+def _get_active():
+    if not hasattr(_active, "logs"):
+        _active.logs = []
+    return _active.logs
+
+
+def _get_call_site():
+    """Get the innermost frame of the application that led to a statement."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PACKAGE_PATH) and filename != __file__:
+            return f"{os.path.relpath(filename, os.path.dirname(PACKAGE_PATH))}" \
+                   f":{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    for log in _get_active():
+        log.record(statement)
+
+
+def _listen():
+    if not event.contains(Engine, "before_cursor_execute",
+                          _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+
+
+nplusone = NPlusOneDetector()
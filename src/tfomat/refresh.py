@@ -0,0 +1,134 @@
+"""Stale-while-revalidate refresh of data that is listed from ladv."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import json
+from email.utils import formatdate
+from threading import Thread
+from time import time
+
+from flask import current_app
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from tfomat.models import db, Listing
+
+
+def get_listing(name, func, *args, has_data=None):
+    """
+    Get a listing from the database and refresh it if it is outdated.
+
+    If there is no data for the listing yet, `func` is called right away.
+    Otherwise, the stored listing is returned immediately and, if it is older
+    than `LISTING_TTL` seconds, `func` is run in a background thread or,
+    unless `REFRESH_IN_BACKGROUND` is set, right away. Only one worker
+    process refreshes a listing at a time.
+
+    Args:
+        name (str): The name of the listing.
+        func (function): The function that fetches the listing. It is called
+            with `args` and returns the payload that is stored with the
+            listing or None if it stores its data elsewhere.
+        *args: The arguments for `func`.
+        has_data (bool): Whether data for the listing exists. By default,
+            this is whether the listing has a payload.
+
+    Returns:
+        Listing: The listing.
+
+    """
+    listing = db.session.get(Listing, name)
+    if has_data is None:
+        has_data = listing is not None and listing.payload is not None
+
+    if not has_data:
+        _claim(name)
+        _run(name, func, args)
+    elif _is_stale(listing) and _claim(name):
+        if current_app.config["REFRESH_IN_BACKGROUND"]:
+            app = current_app._get_current_object()
+            Thread(target=_run_in_background, args=(app, name, func, args),
+                   daemon=True).start()
+        else:
+            _run(name, func, args)
+    return db.session.get(Listing, name)
+
+
+def freshness_headers(listing):
+    """
+    Get HTTP headers describing how fresh a listing is.
+
+    Args:
+        listing (Listing or None): The listing.
+
+    Returns:
+        dict: The headers.
+
+    """
+    if listing is None or listing.refreshed is None:
+        return {"Cache-Control": "no-cache"}
+    age = max(0, int(time() - listing.refreshed))
+    max_age = max(0, current_app.config["LISTING_TTL"] - age)
+    return {
+        "Age": str(age),
+        "Cache-Control": f"max-age={max_age}",
+        "Last-Modified": formatdate(listing.refreshed, usegmt=True)
+    }
+
+
+def _is_stale(listing):
+    if listing is None or listing.refreshed is None:
+        return True
+    return time() - listing.refreshed > current_app.config["LISTING_TTL"]
+
+
+def _claim(name):
+    """
+    Mark a listing as being refreshed unless another worker already does.
+
+    Returns:
+        bool: Whether the refresh was claimed.
+
+    """
+    now = time()
+    db.session.execute(
+        sqlite_insert(Listing).values(name=name).on_conflict_do_nothing())
+    claimed = Listing.query.filter(
+        Listing.name == name,
+        (Listing.refreshing.is_(None)) |
+        (Listing.refreshing < now - current_app.config["REFRESH_LEASE"])
+    ).update({"refreshing": now}, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+
+def _run(name, func, args):
+    try:
+        payload = func(*args)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception(f"Could not refresh {name}")
+        Listing.query.filter_by(name=name).update({"refreshing": None})
+        db.session.commit()
+        return
+    values = {"refreshed": time(), "refreshing": None}
+    if payload is not None:
+        values["payload"] = json.dumps(payload)
+    Listing.query.filter_by(name=name).update(values)
+    db.session.commit()
+
+
+def _run_in_background(app, name, func, args):
+    with app.app_context():
+        try:
+            _run(name, func, args)
+        finally:
+            db.session.remove()
@@ -0,0 +1,226 @@
+"""On-disk store of raw responses from ladv."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import gzip
+import json
+import os
+from hashlib import sha256
+from time import perf_counter, time
+
+from tfomat.cache import atomic_write, EVICT_INTERVAL
+from tfomat.metrics import metrics
+
+
+class StoredResponse:
+    """A response replayed from the store with the interface of
+    `requests.Response` that is used by the scraper."""
+
+    def __init__(self, url, status_code, content, headers):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ResponseStore:
+    """
+    Store raw responses from ladv on disk keyed by the hash of their URL.
+
+    Bodies are stored gzip-compressed next to a JSON file with their
+    metadata. Stored responses are revalidated with `ETag` and
+    `Last-Modified` and the least recently used entries are removed once the
+    store exceeds its size limit. Like the `ResultCache`, the store is only
+    scanned for entries to remove after `EVICT_INTERVAL` of the size limit
+    has been written since the last scan. In offline mode no requests are
+    sent and only stored responses are replayed.
+    """
+
+    def __init__(self, path=None, max_size=256 * 1024 ** 2, offline=False):
+        self.path = path
+        self.max_size = max_size
+        self.offline = offline
+        # scan on the first write
+        self._written = float("inf")
+
+    def init_app(self, app):
+        cache_path = app.config.get("CACHE_PATH") or os.path.join(
+            app.root_path, "cache")
+        self.path = app.config.get("LADV_CACHE_PATH") or os.path.join(
+            cache_path, "ladv")
+        self.max_size = app.config.get("LADV_CACHE_SIZE", self.max_size)
+        self.offline = app.config.get("LADV_OFFLINE", self.offline)
+        os.makedirs(self.path, exist_ok=True)
+
+    def get(self, url):
+        """
+        Get the response for `url` from ladv or the store.
+
+        Args:
+            url (str): The URL to request.
+
+        Returns:
+            requests.Response or StoredResponse: The response.
+
+        """
+        if self.path is None:
+            return _request(url)
+
+        key = sha256(url.encode("utf-8")).hexdigest()
+        meta = self._read_meta(key)
+        if self.offline:
+            stored = self._load(key, meta)
+            if stored is None:
+                metrics.record("cache_misses", cache="ladv")
+                return StoredResponse(url, 504, b"", {})
+            metrics.record("cache_hits", cache="ladv")
+            return stored
+
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        response = _request(url, headers)
+        if response.status_code == 304:
+            stored = self._load(key, meta)
+            if stored is not None:
+                metrics.record("cache_hits", cache="ladv")
+                return stored
+            # the body was evicted in the meantime
+            response = _request(url)
+        metrics.record("cache_misses", cache="ladv")
+        if response.status_code == 200:
+            self._store(key, url, response)
+        return response
+
+    def load(self, url):
+        """
+        Replay the stored response for `url` without sending a request.
+
+        Args:
+            url (str): The URL of the response.
+
+        Returns:
+            StoredResponse or None: The stored response if there is one.
+
+        """
+        key = sha256(url.encode("utf-8")).hexdigest()
+        return self._load(key, self._read_meta(key))
+
+    def urls(self):
+        """
+        Get the URLs of all stored responses.
+
+        Returns:
+            list: The URLs of the stored responses.
+
+        """
+        urls = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".json"):
+                meta = self._read_meta(entry.name[:-len(".json")])
+                if meta is not None:
+                    urls.append(meta["url"])
+        return urls
+
+    def _body_path(self, key):
+        return os.path.join(self.path, f"{key}.gz")
+
+    def _meta_path(self, key):
+        return os.path.join(self.path, f"{key}.json")
+
+    def _read_meta(self, key):
+        try:
+            with open(self._meta_path(key), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _load(self, key, meta):
+        if meta is None:
+            return None
+        try:
+            with gzip.open(self._body_path(key), "rb") as f:
+                content = f.read()
+            # mark the entry as recently used
+            os.utime(self._body_path(key))
+        except OSError:
+            return None
+        return StoredResponse(meta["url"], 200, content, meta["headers"])
+
+    def _store(self, key, url, response):
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "headers": {k: response.headers[k] for k in ("Content-Type",)
+                        if k in response.headers},
+            "fetched": time()
+        }
+        body = gzip.compress(response.content)
+        atomic_write(self._body_path(key), body)
+        atomic_write(self._meta_path(key), json.dumps(meta).encode("utf-8"))
+        self._evict(len(body))
+
+    def _evict(self, written):
+        self._written += written
+        if self._written < self.max_size * EVICT_INTERVAL:
+            return
+        self._written = 0
+        bodies = []
+        for entry in os.scandir(self.path):
+            if not entry.name.endswith(".gz"):
+                continue
+            try:
+                bodies.append((entry.stat().st_mtime, entry.stat().st_size,
+                               entry))
+            except OSError:
+                # removed by another process
+                continue
+        size = sum(b[1] for b in bodies)
+        # leave room for the writes until the next scan
+        max_size = self.max_size * (1 - EVICT_INTERVAL)
+        for _, entry_size, entry in sorted(bodies, key=lambda b: b[0]):
+            if size <= max_size:
+                break
+            size -= entry_size
+            key = entry.name[:-len(".gz")]
+            for path in (self._meta_path(key), entry.path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def _request(url, headers=None):
+    # requests is slow to import and only needed once ladv is contacted
+    import requests
+
+    start = perf_counter()
+    try:
+        return requests.get(url, headers=headers)
+    finally:
+        metrics.record("ladv_requests")
+        metrics.record("ladv_duration_seconds", perf_counter() - start)
+
+
+response_store = ResponseStore()
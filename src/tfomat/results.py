@@ -0,0 +1,105 @@
+"""Grouping and sorting of scraped meeting results."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from tfomat.map import map_discipline, map_to_number
+from tfomat.models import ASCENDING
+
+
+def group_results(results):
+    """
+    Group results by age group and discipline and sort them by performance.
+
+    The results are grouped in a single pass. Age groups and disciplines are
+    sorted by name and the results of a discipline from best to worst with
+    results that are not a performance (e.g. 'DNF') at the bottom.
+
+    Args:
+        results (list): The results of a meeting as returned by
+            `ladv_scraper.find_results`.
+
+    Returns:
+        dict: The sorted results by age group and discipline.
+
+    """
+    grouped = dict()
+    for r in results:
+        grouped.setdefault(r["agegroup"], dict()).setdefault(
+            r["event"], []).append(r)
+
+    return {
+        agegroup: {
+            discipline: sort_results(grouped[agegroup][discipline], discipline)
+            for discipline in sorted(grouped[agegroup])
+        }
+        for agegroup in sorted(grouped)
+    }
+
+
+def flatten(grouped):
+    """
+    Get the results of `group_results` as a single list in the same order.
+
+    Args:
+        grouped (dict): The results by age group and discipline.
+
+    Returns:
+        list: The results.
+
+    """
+    return [r for disciplines in grouped.values()
+            for matches in disciplines.values() for r in matches]
+
+
+def sort_results(results, discipline):
+    """
+    Sort the results of a discipline from best to worst.
+
+    Args:
+        results (list): The results of the discipline.
+        discipline (str): The name of the discipline as it appears in the
+            results.
+
+    Returns:
+        list: The sorted results.
+
+    """
+    return sorted(results, key=result_sort_key(discipline))
+
+
+def result_sort_key(discipline):
+    """
+    Get a key function that sorts results of a discipline from best to
+    worst.
+
+    Args:
+        discipline (str): The name of the discipline as it appears in the
+            results.
+
+    Returns:
+        function: The key function.
+
+    """
+    code = map_discipline(discipline)
+    if code in ASCENDING:
+        higher_is_better = ASCENDING[code]
+    else:
+        # unknown disciplines with a distance in their name are races
+        higher_is_better = not any(d in discipline for d in "123456789")
+
+    def key(result):
+        value = map_to_number(result["result"])
+        if value < 0:
+            return 1, 0
+        return 0, -value if higher_is_better else value
+    return key
@@ -0,0 +1,78 @@
+"""pytest fixtures for testing the application and its query budgets.
+
+Enable them in a ``conftest.py`` with::
+
+    pytest_plugins = ["tfomat.testing"]
+
+and limit the number of SQL statements of an endpoint with::
+
+    def test_rankings(client, query_budget):
+        with query_budget(max_queries=5, max_repeats=1):
+            client.get("/api/ranking?disc=100 m&year=2024")
+"""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from contextlib import contextmanager
+
+import pytest
+from tfomat import init_app, init_db
+from tfomat.query_log import capture
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An application with an empty database that does not contact ladv."""
+    app = init_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + str(tmp_path / "test.db"),
+        "CACHE_PATH": str(tmp_path / "cache"),
+        "LADV_OFFLINE": True,
+        "BACKGROUND_JOBS": False
+    })
+    init_db(app)
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Get a context manager that fails the test if the code in its block
+    executes more SQL statements than allowed.
+
+    The context manager takes the maximum number of statements
+    (`max_queries`) and the maximum number of times a statement of the same
+    shape may be executed (`max_repeats`) and yields the `QueryLog` of the
+    block.
+    """
+    @contextmanager
+    def budget(max_queries=None, max_repeats=None):
+        with capture() as log:
+            yield log
+        problems = []
+        if max_queries is not None and len(log) > max_queries:
+            problems.append(f"{len(log)} statements were executed, the "
+                            f"budget is {max_queries}")
+        if max_repeats is not None and log.repeated(max_repeats):
+            problems.append(f"statements were repeated more than "
+                            f"{max_repeats} times")
+        if problems:
+            pytest.fail("\n".join(problems) + "\n"
+                        + log.report(max_repeats or 0), pytrace=False)
+    return budget
@@ -1,25 +1,46 @@
+import csv
+import io
 import json
 import os
 from datetime import datetime
+from hashlib import sha256
 from hmac import compare_digest
+from itertools import islice
 
 from flask import Blueprint, render_template, request, url_for, redirect, \
-    send_from_directory, current_app, abort
+    send_file, current_app, abort, Response, stream_with_context
 from flask_nav import Nav
 from flask_nav.elements import Navbar, View
 from flask_restful import Resource
 from tfomat import db
+from tfomat.cache import result_cache
+from tfomat.jobs import enqueue, task, DONE, FAILED
 from tfomat.ladv_scraper import find_results, get_club_results, \
-    get_werder_events, get_athlete_info, get_ladv_id
+    get_upcoming_events, get_athlete_info, get_ladv_id
 from tfomat.map import map_discipline, DISCIPLINE_MAPPER, map_to_number, \
-    INVERSE_DISCIPLINE_MAPPER
+    INVERSE_DISCIPLINE_MAPPER, AGEGROUPS
 from tfomat.models import Athlete, Performance, ASCENDING, \
-    QualificationNorm
-from tfomat.print import make_pdf
+    QualificationNorm, Qualification, Job, Event, upsert_events, \
+    get_data_version
+from tfomat.pdf_writer import make_pdf as make_direct_pdf
+from tfomat.print import make_pdf as make_latex_pdf
+from tfomat.refresh import get_listing, freshness_headers
+from tfomat.results import group_results, flatten
 
 nav = Nav()
 views = Blueprint('views', __name__)
 
+PDF_RENDERERS = {"latex": make_latex_pdf, "direct": make_direct_pdf}
+# the columns of a performance that can be entered through the API
+PERFORMANCE_FIELDS = ("date", "city", "athlete_id", "discipline", "value",
+                      "unit", "wind", "placement", "championship", "indoor")
+# performances with the same values in these columns are the same
+CONFLICT_FIELDS = ("date", "city", "athlete_id", "discipline", "value")
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# number of rows that are loaded and sent at once by the exports
+EXPORT_BATCH_SIZE = 1000
+NO_RESULTS = "Keine Ergebnisse verfügbar, vielleicht kannst du sie hier finden: https://ladv.de/veranstaltung/detail/{}/"
+
 
 @nav.navigation()
 def navbar():
@@ -60,79 +81,324 @@ def performance_overview():
 
 @views.route("/results/<int:meeting_id>")
 def show_results(meeting_id):
-    cache_path = os.path.join(current_app.root_path, "cache")
-    cached_file = os.path.join(cache_path, "{}.html".format(meeting_id))
+    page = result_cache.read(f"{meeting_id}.html")
+    if page is not None:
+        return page.decode("utf-8")
+
+    championship = request.args.get("championship")
+    if current_app.config["BACKGROUND_JOBS"]:
+        job = enqueue("results", _job_key(meeting_id, "html", championship),
+                      target=url_for("views.show_results", meeting_id=meeting_id,
+                                     championship=championship),
+                      meeting_id=meeting_id, championship=championship)
+        return redirect(url_for("views.job_status", job_id=job.id))
+
+    try:
+        page = _get_results_page(meeting_id, championship)
+    except TimeoutError:
+        return abort(503)
+    if page is None:
+        return NO_RESULTS.format(meeting_id)
+    return page
+
+
+def _job_key(meeting_id, fmt, championship=None):
+    # jobs with different arguments must not be merged
+    return f"{meeting_id}:{fmt}:{championship or ''}"
+
+
+@task("results")
+def _results_task(meeting_id, championship=None):
+    if _get_results_page(meeting_id, championship) is None:
+        return NO_RESULTS.format(meeting_id)
+    return None
+
+
+def _get_results_page(meeting_id, championship=None):
+    # concurrent requests for the same meeting wait for the first one and
+    # reuse its result instead of scraping and ingesting the meeting again
+    with result_cache.lock(f"meeting-{meeting_id}"):
+        page = result_cache.read(f"{meeting_id}.html")
+        if page is not None:
+            return page.decode("utf-8")
+        return _render_results(meeting_id, championship)
+
+
+def _get_meeting(meeting_id, championship=None):
+    """
+    Get the results of a meeting after they were added to the database.
+
+    The meeting is scraped and ingested only once, the results are cached
+    for the page and the pdf. The caller must hold the lock of the meeting.
+
+    Args:
+        meeting_id (int): The id of the meeting at ladv.
+        championship (str): The championship of the meeting, if any.
+
+    Returns:
+        tuple: The information about the meeting and the results as returned
+            by `ladv_scraper.find_results` or None and None if there are no
+            results yet.
+
+    """
+    cached = result_cache.read(f"{meeting_id}.json")
+    if cached is not None:
+        meeting = json.loads(cached)
+        return meeting["meeting_info"], meeting["results"]
 
-    if os.path.exists(cached_file):
-        with open(cached_file, "r", encoding="utf-8") as f:
-            return f.read()
+    meeting_info, results = find_results(
+        meeting_id, current_app.config["CLUB_NAME"])
+    if meeting_info is None:
+        return None, None
+    _update_database(meeting_info["city"], results, championship=championship)
+    result_cache.put(f"{meeting_id}.json", json.dumps({
+        "meeting_info": meeting_info, "results": results
+    }).encode("utf-8"))
+    return meeting_info, results
 
-    meeting_info, results = find_results(meeting_id)
 
+def _render_results(meeting_id, championship=None):
+    meeting_info, results = _get_meeting(meeting_id, championship)
     if meeting_info is None:
-        return "Keine Ergebnisse verfügbar, vielleicht kannst du sie hier finden: https://ladv.de/veranstaltung/detail/{}/".format(meeting_id)
+        return None
     title = f"{meeting_info['title']} am {meeting_info['date']}" \
             f" in {meeting_info['city']}\n"
 
-    city = meeting_info["city"]
-    _update_database(city, results, championship=request.args.get("championship"))
-
     medals = {"&#129351;": 0, "&#129352;": 0, "&#129353;": 0}
     for medal in medals:
         medal_count = sum(medal in r.get("medal", "") for r in results)
         medals[medal] = medal_count
+    results = flatten(group_results(results))
     page = render_template("results.html", title=title, results=results, len=len, medals=medals)
-    with open(cached_file, "w", encoding="utf-8") as f:
-        f.write(page)
+    result_cache.put(f"{meeting_id}.html", page)
     return page
 
 
-def _move_nans_to_bottom(results):
-    contains_digits = lambda s: any(d in s for d in "1 2 3 4 5 6 7 8 9".split())
+@views.route("/results/print-view/<int:meeting_id>")
+def print_results(meeting_id):
+    cached_file = result_cache.get_path(f"{meeting_id}.pdf")
+    if cached_file is not None:
+        return send_file(cached_file, mimetype="application/pdf")
+
+    championship = request.args.get("championship")
+    if current_app.config["BACKGROUND_JOBS"]:
+        job = enqueue("print", _job_key(meeting_id, "pdf", championship),
+                      target=url_for("views.print_results", meeting_id=meeting_id,
+                                     championship=championship),
+                      meeting_id=meeting_id, championship=championship)
+        return redirect(url_for("views.job_status", job_id=job.id))
+
+    try:
+        cached_file = _get_results_pdf(meeting_id, championship)
+    except TimeoutError:
+        return abort(503)
+    if cached_file is None:
+        return NO_RESULTS.format(meeting_id)
+    return send_file(cached_file, mimetype="application/pdf")
+
+
+@task("print")
+def _print_task(meeting_id, championship=None):
+    if _get_results_pdf(meeting_id, championship) is None:
+        return NO_RESULTS.format(meeting_id)
+    return None
+
+
+def _get_results_pdf(meeting_id, championship=None):
+    with result_cache.lock(f"meeting-{meeting_id}"):
+        cached_file = result_cache.get_path(f"{meeting_id}.pdf")
+        if cached_file is not None:
+            return cached_file
+        return _build_results_pdf(meeting_id, championship)
+
+
+def _build_results_pdf(meeting_id, championship=None):
+    meeting_info, results = _get_meeting(meeting_id, championship)
+    if meeting_info is None:
+        return None
+    title = f"{meeting_info['title']}"
+    subtitle = f"am {meeting_info['date']} in {meeting_info['city']}"
 
-    real_results = [r for r in results if contains_digits(r["result"])]
-    nan_results = [r for r in results if
-                   not contains_digits(r["result"])]
-    return real_results + nan_results
+    print_view = group_results(results)
+    with result_cache.build_dir() as build_dir:
+        make_pdf = PDF_RENDERERS[current_app.config["PDF_RENDERER"]]
+        make_pdf(print_view, title, subtitle,
+                 name=os.path.join(build_dir, f"{meeting_id}"))
+        return result_cache.put_file(
+            f"{meeting_id}.pdf", os.path.join(build_dir, f"{meeting_id}.pdf"))
+
+
+@views.route("/qualifications/<int:year>/print")
+def print_qualifications(year):
+    title = request.args.get("title")
+    qualifications = _get_cached("qualifications",
+                                 Qualifications._get_qualifications, year,
+                                 title)
+    data = dict()
+    for q in qualifications:
+        norm = q["norm"]
+        heading = f"{norm['discipline']} {norm['gender']}{norm['agegroup']}" \
+                  f" ({'Halle' if norm['indoor'] else 'Freiluft'}): " \
+                  f"{norm['value']}"
+        data.setdefault(norm["title"], dict())[heading] = [
+            {"name": a["name"], "subtitle": f"{a['city']}, den {a['date']}",
+             "rank": "", "result": a["value"], "pborsb": ""}
+            for a in q["athletes"]
+        ]
+    pdf = _get_pdf(f"qualifications-{year}-{title}", data,
+                   f"Qualifikationen {year}", current_app.config["CLUB_NAME"])
+    return send_file(pdf, mimetype="application/pdf")
+
+
+@views.route("/leaderboard/<int:year>/print")
+def print_leaderboard(year):
+    k = max(request.args.get("k", 3, type=int), 1)
+    where = request.args.get("where") or "Halle + Freiluft"
+    legal = request.args.get("legal") == "true"
+    leaderboard = _get_cached("leaderboard", Leaderboard._get_leaderboard,
+                              year, k, where, legal)
+    data = {
+        discipline: {
+            agegroup: [
+                {"name": name, "subtitle": place, "rank": str(rank),
+                 "result": value, "pborsb": athlete_agegroup}
+                for rank, name, athlete_agegroup, value, place in rows
+            ]
+            for agegroup, rows in agegroups.items()
+        }
+        for discipline, agegroups in leaderboard.items()
+    }
+    subtitle = f"{current_app.config['CLUB_NAME']}, {where}"
+    if legal:
+        subtitle += ", nur windlegale Leistungen"
+    pdf = _get_pdf(f"leaderboard-{year}-{k}-{where}-{legal}", data,
+                   f"Saisonübersicht {year}", subtitle)
+    return send_file(pdf, mimetype="application/pdf")
+
+
+@views.route("/export/performances.<fmt>")
+def export_performances(fmt):
+    if fmt not in EXPORT_FORMATS:
+        return abort(404)
+    query = db.session.query(
+        Performance.id, Performance.date, Performance.city,
+        Performance.athlete_id, Athlete.name.label("athlete"),
+        Performance.discipline, Performance.value, Performance.wind,
+        Performance.placement, Performance.championship, Performance.indoor
+    ).outerjoin(Athlete, Athlete.id == Performance.athlete_id)
+    athlete_id = request.args.get("athlete", type=int)
+    if athlete_id is not None:
+        query = query.filter(Performance.athlete_id == athlete_id)
+    discipline = request.args.get("disc")
+    if discipline:
+        query = query.filter(Performance.discipline == DISCIPLINE_MAPPER.get(
+            discipline, discipline))
+    year = request.args.get("year", type=int)
+    if year is not None:
+        query = query.filter(Performance.date.like(f"%.{year}"))
+    indoor = request.args.get("indoor")
+    if indoor in ("true", "false"):
+        query = query.filter(Performance.indoor == (indoor == "true"))
+    query = query.order_by(Performance.id).execution_options(
+        yield_per=EXPORT_BATCH_SIZE)
+
+    def rows():
+        for p in query:
+            row = p._asdict()
+            row["discipline"] = INVERSE_DISCIPLINE_MAPPER.get(
+                p.discipline, p.discipline)
+            yield row
+
+    header = ["id", "date", "city", "athlete_id", "athlete", "discipline",
+              "value", "wind", "placement", "championship", "indoor"]
+    return _stream_export("performances", fmt, header, rows())
+
+
+@views.route("/export/ranking.<fmt>")
+def export_ranking(fmt):
+    if fmt not in EXPORT_FORMATS:
+        return abort(404)
+    discipline = request.args.get("disc")
+    year = request.args.get("year")
+    if not discipline or not year:
+        return abort(400)
+    agegroup = request.args.get("age") or "Alle"
+    where = request.args.get("where") or "Halle + Freiluft"
+    legal = request.args.get("legal") == "true"
+    ranking = _get_cached("ranking", Rankings()._get_rankings, agegroup,
+                          discipline, year, where, legal)
+    header = ["rank", "name", "agegroup", "value", "place"]
+    rows = (dict(zip(header, row)) for row in ranking)
+    return _stream_export("ranking", fmt, header, rows)
+
+
+def _stream_export(name, fmt, header, rows):
+    """
+    Create a response that sends rows as CSV or newline-delimited JSON while
+    they are produced, in chunks of `EXPORT_BATCH_SIZE` rows.
 
+    Args:
+        name (str): The name of the downloaded file without the extension.
+        fmt (str): 'csv' or 'ndjson'.
+        header (list): The names of the columns.
+        rows (iterable): The rows as dictionaries.
 
-def _sort_by_result(value):
-    digits = "".join(c for c in value["result"] if c.isdigit())
-    if not digits:
-        return 0
-    return int(digits)
+    Returns:
+        flask.Response: The streamed response.
 
+    """
+    def generate():
+        buffer = io.StringIO()
+        if fmt == "csv":
+            writer = csv.DictWriter(buffer, header, extrasaction="ignore")
+            writer.writeheader()
+            # send the header before the first rows are loaded
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        for i, row in enumerate(rows, start=1):
+            if fmt == "csv":
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(row, ensure_ascii=False) + "\n")
+            if i % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
 
-@views.route("/results/print-view/<int:meeting_id>")
-def print_results(meeting_id):
-    cache_path = os.path.join(current_app.root_path, "cache")
-    cached_file = os.path.join(cache_path, "{}.pdf".format(meeting_id))
-    if os.path.exists(cached_file):
-        return send_from_directory(directory="./cache",
-                                   path=f"./{meeting_id}.pdf")
+    return Response(stream_with_context(generate()),
+                    mimetype=EXPORT_FORMATS[fmt], headers={
+                        "Content-Disposition":
+                            f"attachment; filename={name}.{fmt}"})
 
-    meeting_info, results = find_results(meeting_id)
-    title = f"{meeting_info['title']}"
-    subtitle = f"am {meeting_info['date']} in {meeting_info['city']}"
-    _update_database(meeting_info['city'], results, championship=request.args.get("championship"))
-
-    agegroups = sorted(list(set(r["agegroup"] for r in results)))
-    print_view = dict()
-    for agegroup in agegroups:
-        events = [r for r in results if r["agegroup"] == agegroup]
-        disc = sorted(list(set(e["event"] for e in events)))
-        print_view[agegroup] = {}
-        for d in disc:
-            matches = [e for e in events if e["event"] == d]
-            matches.sort(key=_sort_by_result)
-            is_sprint = any(digit in d for digit in "123456789")
-            if not is_sprint:
-                matches.reverse()
-            matches = _move_nans_to_bottom(matches)
-            print_view[agegroup][d] = matches
-    make_pdf(print_view, title, subtitle,
-             name=os.path.join(cache_path, f"{meeting_id}"))
-    return send_from_directory(directory="./cache", path=f"./{meeting_id}.pdf")
+
+def _get_pdf(name, data, title, subtitle):
+    """
+    Get a pdf of data that is derived from the database from the result
+    cache or create and cache it with the configured renderer.
+
+    Args:
+        name (str): The name of the document, which identifies it together
+            with the version of the data.
+        data (dict): The rows of the document grouped by section and
+            table like the results of `results.group_results`.
+        title (str): The title of the document.
+        subtitle (str): The subtitle of the document.
+
+    Returns:
+        str: The path to the pdf.
+
+    """
+    key = f"{name}-{get_data_version()}"
+    key = f"{sha256(key.encode('utf-8')).hexdigest()[:32]}.pdf"
+    cached_file = result_cache.get_path(key)
+    if cached_file is not None:
+        return cached_file
+    with result_cache.build_dir() as build_dir:
+        make_pdf = PDF_RENDERERS[current_app.config["PDF_RENDERER"]]
+        make_pdf(data, title, subtitle, name=os.path.join(build_dir, "main"))
+        return result_cache.put_file(key, os.path.join(build_dir, "main.pdf"))
 
 
 def _update_database(city, results, championship=None):
@@ -196,13 +462,8 @@ def _update_database(city, results, championship=None):
 
 @views.route("/clear-results/<int:meeting_id>")
 def clear_result_cache(meeting_id):
-    cache_path = os.path.join(current_app.root_path, "cache")
-    cached_file_base = os.path.join(cache_path, f"{meeting_id}")
-    for ext in (".html", ".pdf", ".tex"):
-        cached_file = cached_file_base + ext
-        if os.path.exists(cached_file):
-            os.remove(cached_file)
-
+    result_cache.invalidate(f"{meeting_id}.json", f"{meeting_id}.html",
+                            f"{meeting_id}.pdf")
     return redirect(url_for('views.get_results'))
 
 
@@ -227,13 +488,28 @@ def event_results():
 
 @views.route("/upcoming-events/")
 def coming_events():
-    new_events = get_werder_events()
+    listing = get_listing("upcoming-events", _fetch_upcoming_events)
+    new_events = json.loads(listing.payload) if listing.payload else []
     page = render_template("coming_events.html", events=new_events)
-    return page
+    return page, 200, freshness_headers(listing)
+
+
+def _fetch_upcoming_events():
+    return get_upcoming_events(current_app.config["LADV_API_KEY"],
+                               current_app.config["CLUB_ID"],
+                               current_app.config["LV"])
 
 
 @views.route("/add-athlete/<name>")
 def add_athlete(name):
+    if current_app.config["BACKGROUND_JOBS"]:
+        job = enqueue("add-athlete", name, name=name)
+        return redirect(url_for("views.job_status", job_id=job.id))
+    return _add_athlete(name)
+
+
+@task("add-athlete")
+def _add_athlete(name):
     existing_athletes = Athlete.query.all()
     if name in [a.name for a in existing_athletes]:
         return "AthletIn existiert bereits in der Datenbank."
@@ -241,7 +517,9 @@ def add_athlete(name):
     ladv_id = get_ladv_id(name)
     start_year = 2010
     end_year = datetime.now().year
-    athlete_info = get_athlete_info(ladv_id, start_year, end_year)
+    athlete_info = get_athlete_info(ladv_id, current_app.config["LADV_API_KEY"],
+                                    current_app.config["CLUB_ID"],
+                                    start_year, end_year)
     new_athlete = Athlete(
         name=athlete_info["forename"] + " " + athlete_info["surname"],
         year_of_birth=athlete_info["birthyear"],
@@ -257,6 +535,22 @@ def add_athlete(name):
     return "AthletIn zur Datenbank hinzugefügt."
 
 
+@views.route("/jobs/<int:job_id>")
+def job_status(job_id):
+    job = Job.query.get(job_id)
+    if job is None:
+        return abort(404)
+    if job.status == DONE:
+        if job.result is None and job.target:
+            return redirect(job.target)
+        return job.result or ""
+    if job.status == FAILED:
+        return "Bei der Verarbeitung ist ein Fehler aufgetreten.", 500
+    # the page reloads itself after as many seconds
+    return render_template("processing.html", job=job), 200, \
+        {"Retry-After": "2"}
+
+
 @views.route("/athletes/<athlete_id>")
 def athlete_profile(athlete_id):
     athlete = Athlete.query.get(athlete_id)
@@ -303,7 +597,7 @@ class AthleteInfo(Resource):
             return {"error": "Missing parameters."}
 
         athlete = Athlete.query.get(athlete_id)
-        return athlete.get_athlete_info()
+        return athlete.get_athlete_info(current_app.config["LADV_API_KEY"])
 
 
 class AthleteLastCompetitions(Resource):
@@ -321,7 +615,60 @@ class AthleteUpcomingCompetitions(Resource):
         if athlete_id is None:
             return {"error": "Missing parameters."}
         athlete = Athlete.query.get(athlete_id)
-        return athlete.get_upcoming_competitions()
+        return athlete.get_upcoming_competitions(
+            current_app.config["LADV_API_KEY"])
+
+
+class AthleteProfile(Resource):
+    """
+    API Endpoint for all data of an athlete's profile that is stored in the
+    database. The upcoming competitions from ladv are served separately by
+    `AthleteUpcomingCompetitions`.
+    """
+
+    def get(self):
+        athlete_id = request.args.get("id")
+        if athlete_id is None:
+            return {"error": "Missing parameters."}
+        athlete = Athlete.query.get(athlete_id)
+        if athlete is None:
+            return {"error": "Athlete does not exist."}
+        legal = request.args.get("legal") == "true"
+        return _get_cached("profile", self._get_profile, athlete.id, legal)
+
+    @staticmethod
+    def _get_profile(athlete_id, legal=False):
+        athlete = Athlete.query.get(athlete_id)
+        performances = Performance.query.filter_by(athlete_id=athlete.id).all()
+        return {
+            "disciplines": athlete.get_disciplines(performances,
+                                                   legal_only=legal),
+            "last_competitions": athlete.get_last_competitions(performances),
+            "performances": _format_performances(performances)
+        }
+
+
+class AthleteProgression(Resource):
+    """
+    API Endpoint for the season bests, the development of the personal best
+    and the number of performances per season in each discipline of an
+    athlete.
+    """
+
+    def get(self):
+        athlete_id = request.args.get("id")
+        if athlete_id is None:
+            return {"error": "Missing parameters."}
+        athlete = Athlete.query.get(athlete_id)
+        if athlete is None:
+            return {"error": "Athlete does not exist."}
+        points = request.args.get("points", 40, type=int)
+        return _get_cached("progression", self._get_progression, athlete.id,
+                           max(points, 1))
+
+    @staticmethod
+    def _get_progression(athlete_id, points):
+        return Athlete.query.get(athlete_id).get_progression(points)
 
 
 class AthleteDisciplines(Resource):
@@ -345,65 +692,15 @@ class AddDatabaseEntry(Resource):
             return {"status": "failed", "value": "forbidden"}
 
         overwrite = request.args.get("overwrite", False)
-        required_keys = ["date", "city", "athlete", "discipline", "value",
-                         "indoor"]
-
-        payload = request.json
-        if not all([k in payload for k in required_keys]):
-            return {"status": "failed", "value": "Missing required values"}
-
-        try:
-            datetime.strptime(payload["date"], "%d.%m.%Y")
-        except ValueError:
-            return {"status": "failed", "value": "Could not interpret date. Expected format: dd.mm.yyyy"}
+        payload, error = _validate_performance(request.json)
+        if error is not None:
+            return {"status": "failed", "value": error}
 
         athlete = Athlete.query.filter_by(name=payload["athlete"]).first()
         if not athlete:
             return {"status": "failed", "value": "Athlete does not exist"}
         payload["athlete_id"] = athlete.id
 
-        if payload["discipline"] not in DISCIPLINE_MAPPER.items() and not DISCIPLINE_MAPPER.get(payload["discipline"]):
-            return {"status": "failed", "value": "Discipline not recognized"}
-        payload["discipline"] = DISCIPLINE_MAPPER.get(payload["discipline"], payload["discipline"])
-
-        if map_to_number(payload["value"]) < 0:
-            reason = "Value format not recognized. Expected formats: long distance: {}, sprint or technical event: {}, multievent: {}".format(
-                "[0-9]*:[0-9][0-9],[0-9][0-9]",  # long distance
-                "[0-9]*,[0-9]*",  # sprint or technical event
-                "[0-9].[0-9][0-9][0-9]"  # multi-event"
-            )
-            return {"status": "failed", "value": reason}
-
-        unit = payload.get("unit")
-        if not unit:
-            payload["unit"] = None
-
-        wind = payload.get("wind")
-        if wind:
-            try:
-                payload["wind"] = float(wind.replace(",", "."))
-            except ValueError:
-                return {"status": "failed", "value": "Wind format not recognized"}
-        else:
-            payload["wind"] = None
-
-        placement = payload.get("placement")
-        if placement:
-            try:
-                payload["placement"] = int(placement.replace(".", ""))
-            except ValueError:
-                return {"status": "failed", "value": "Placement format not recognized"}
-        else:
-            payload["placement"] = None
-
-        championship = payload.get("championship")
-        if not championship:
-            payload["championship"] = None
-
-        if payload["indoor"] not in ("true", "false"):
-            return {"status": "failed", "value": "Indoor needs to be 'true' or 'false'"}
-        payload["indoor"] = True if payload["indoor"] == "true" else False
-
         existing_performances = Performance.query.filter_by(
             date=payload["date"],
             city=payload["city"],
@@ -412,12 +709,7 @@ class AddDatabaseEntry(Resource):
             value=payload["value"],
         ).all()
         if not existing_performances:
-            performance_info = {
-                k: payload[k] for k in ("date", "city", "athlete_id",
-                                        "discipline", "value", "unit",
-                                        "wind", "placement", "championship",
-                                        "indoor")
-            }
+            performance_info = {k: payload[k] for k in PERFORMANCE_FIELDS}
             new_performance = Performance(**performance_info)
             db.session.add(new_performance)
             db.session.commit()
@@ -432,6 +724,180 @@ class AddDatabaseEntry(Resource):
         return {"status": "success", "value": performance.to_dict()}
 
 
+class ImportPerformances(Resource):
+    """
+    API Endpoint for adding many performances at once from a JSON array, CSV
+    (text/csv) or newline-delimited JSON (application/x-ndjson) with the
+    fields of `AddDatabaseEntry`.
+
+    All rows are validated before anything is written. If a row is invalid
+    or its athlete does not exist, nothing is imported. Otherwise all new
+    performances are committed together and performances that already exist
+    are skipped. The response contains the status of every row.
+    """
+
+    def post(self):
+        token = request.args.get("token", "")
+        if not compare_digest(token, "lebenslanggruenweiss"):
+            return {"status": "failed", "value": "forbidden"}
+
+        max_rows = current_app.config["IMPORT_MAX_ROWS"]
+        try:
+            rows = list(islice(_read_rows(request), max_rows + 1))
+        except (ValueError, UnicodeDecodeError) as e:
+            return {"status": "failed", "value": f"Could not read rows: {e}"}
+        if len(rows) > max_rows:
+            return {"status": "failed",
+                    "value": f"At most {max_rows} rows can be imported at once"}
+
+        report = []
+        performances = []
+        for i, row in enumerate(rows):
+            payload, error = _validate_performance(row)
+            report.append({"row": i, "status": "failed" if error else "valid",
+                           "value": error})
+            performances.append(payload)
+
+        names = {p["athlete"] for p in performances if p is not None}
+        athletes = {
+            a.name: a.id for a in
+            Athlete.query.filter(Athlete.name.in_(names))
+        } if names else dict()
+        for entry, payload in zip(report, performances):
+            if payload is None:
+                continue
+            payload["athlete_id"] = athletes.get(payload["athlete"])
+            if payload["athlete_id"] is None:
+                entry.update(status="failed", value="Athlete does not exist")
+        if any(entry["status"] == "failed" for entry in report):
+            return {"status": "failed", "inserted": 0, "rows": report}
+
+        keys = [tuple(p[k] for k in CONFLICT_FIELDS) for p in performances]
+        existing = {
+            tuple(getattr(p, k) for k in CONFLICT_FIELDS): p
+            for p in Performance.query.filter(db.tuple_(
+                *(getattr(Performance, k) for k in CONFLICT_FIELDS)
+            ).in_(set(keys)))
+        } if keys else dict()
+
+        new_performances = dict()
+        for entry, payload, key in zip(report, performances, keys):
+            if key in existing:
+                entry.update(status="exists",
+                             value=existing[key].to_dict())
+            elif key in new_performances:
+                entry.update(status="duplicate", value=None)
+            else:
+                new_performances[key] = Performance(
+                    **{k: payload[k] for k in PERFORMANCE_FIELDS})
+                entry["status"] = "inserted"
+        db.session.add_all(new_performances.values())
+        db.session.commit()
+
+        inserted = iter(new_performances.values())
+        for entry in report:
+            if entry["status"] == "inserted":
+                entry["value"] = next(inserted).to_dict()
+        return {"status": "success", "inserted": len(new_performances),
+                "rows": report}
+
+
+def _read_rows(req):
+    """
+    Read the rows of an import from the body of a request. CSV and
+    newline-delimited JSON are read from the stream line by line.
+
+    Args:
+        req (flask.Request): The request.
+
+    Returns:
+        iterable: The rows as dictionaries.
+
+    """
+    mimetype = req.mimetype
+    if mimetype == "text/csv":
+        stream = io.TextIOWrapper(req.stream, encoding="utf-8-sig")
+        return csv.DictReader(stream)
+    if mimetype in ("application/x-ndjson", "application/jsonl"):
+        stream = io.TextIOWrapper(req.stream, encoding="utf-8")
+        return (json.loads(line) for line in stream if line.strip())
+    rows = req.get_json(silent=True)
+    if not isinstance(rows, list):
+        raise ValueError("expected a JSON array of performances")
+    return rows
+
+
+def _validate_performance(payload):
+    """
+    Check a performance of `AddDatabaseEntry` or `ImportPerformances` and
+    convert its fields to the values that are stored.
+
+    Args:
+        payload (dict): The fields of the performance. 'wind' and
+            'placement' may be strings like '+1,2' and '3.', 'indoor' is
+            'true' or 'false'.
+
+    Returns:
+        tuple: The converted fields and None, or None and the reason why the
+            performance is invalid.
+
+    """
+    required_keys = ["date", "city", "athlete", "discipline", "value",
+                     "indoor"]
+    if not isinstance(payload, dict) \
+            or not all([k in payload for k in required_keys]):
+        return None, "Missing required values"
+    payload = dict(payload)
+
+    try:
+        datetime.strptime(payload["date"], "%d.%m.%Y")
+    except (TypeError, ValueError):
+        return None, "Could not interpret date. Expected format: dd.mm.yyyy"
+
+    if payload["discipline"] not in DISCIPLINE_MAPPER.items() and not DISCIPLINE_MAPPER.get(payload["discipline"]):
+        return None, "Discipline not recognized"
+    payload["discipline"] = DISCIPLINE_MAPPER.get(payload["discipline"], payload["discipline"])
+
+    if map_to_number(payload["value"]) < 0:
+        reason = "Value format not recognized. Expected formats: long distance: {}, sprint or technical event: {}, multievent: {}".format(
+            "[0-9]*:[0-9][0-9],[0-9][0-9]",  # long distance
+            "[0-9]*,[0-9]*",  # sprint or technical event
+            "[0-9].[0-9][0-9][0-9]"  # multi-event"
+        )
+        return None, reason
+
+    unit = payload.get("unit")
+    if not unit:
+        payload["unit"] = None
+
+    wind = payload.get("wind")
+    if wind:
+        try:
+            payload["wind"] = float(str(wind).replace(",", "."))
+        except ValueError:
+            return None, "Wind format not recognized"
+    else:
+        payload["wind"] = None
+
+    placement = payload.get("placement")
+    if placement:
+        try:
+            payload["placement"] = int(str(placement).replace(".", ""))
+        except ValueError:
+            return None, "Placement format not recognized"
+    else:
+        payload["placement"] = None
+
+    championship = payload.get("championship")
+    if not championship:
+        payload["championship"] = None
+
+    if payload["indoor"] not in ("true", "false"):
+        return None, "Indoor needs to be 'true' or 'false'"
+    payload["indoor"] = True if payload["indoor"] == "true" else False
+    return payload, None
+
+
 class AddQualificationNorm(Resource):
     """
     API Endpoint for getting data from a sensor.
@@ -493,6 +959,139 @@ class AddQualificationNorm(Resource):
         return {"status": "success", "value": qualification_norm.to_dict()}
 
 
+class Qualifications(Resource):
+    """
+    API Endpoint for the athletes that met the qualification norms in a
+    year, optionally only of the norms with a title (e.g. 'DM').
+    """
+
+    def get(self):
+        year = request.args.get("year", datetime.now().year, type=int)
+        title = request.args.get("title")
+        return _get_cached("qualifications", self._get_qualifications, year,
+                           title)
+
+    @staticmethod
+    def _get_qualifications(year, title=None):
+        query = db.session.query(
+            QualificationNorm, Athlete, Performance
+        ).select_from(Qualification).join(
+            QualificationNorm, QualificationNorm.id == Qualification.norm_id
+        ).join(Athlete, Athlete.id == Qualification.athlete_id).join(
+            Performance, Performance.id == Qualification.performance_id
+        ).filter(Qualification.year == year)
+        if title:
+            query = query.filter(QualificationNorm.title == title)
+
+        qualifications = dict()
+        for norm, athlete, performance in query:
+            qualifications.setdefault(norm, []).append((athlete, performance))
+
+        report = []
+        for norm, athletes in sorted(
+                qualifications.items(),
+                key=lambda x: (x[0].title or "", x[0].discipline or "",
+                               x[0].gender or "", x[0].agegroup or "")):
+            athletes.sort(key=lambda x: map_to_number(x[1].value),
+                          reverse=ASCENDING.get(norm.discipline, False))
+            norm = norm.to_dict()
+            norm["discipline"] = INVERSE_DISCIPLINE_MAPPER.get(
+                norm["discipline"], norm["discipline"])
+            report.append({
+                "norm": norm,
+                "athletes": [
+                    {"id": athlete.id, "name": athlete.name,
+                     "value": performance.value, "wind": performance.wind,
+                     "date": performance.date, "city": performance.city}
+                    for athlete, performance in athletes
+                ]
+            })
+        return report
+
+
+class Leaderboard(Resource):
+    """
+    API Endpoint for the best athletes of a year in every discipline and age
+    group of the rankings.
+    """
+
+    def get(self):
+        year = request.args.get("year", type=int)
+        if year is None:
+            return {"error": "Missing parameters."}
+        k = request.args.get("k", 10, type=int)
+        where = request.args.get("where") or "Halle + Freiluft"
+        legal = request.args.get("legal") == "true"
+        return _get_cached("leaderboard", self._get_leaderboard, year,
+                           max(k, 1), where, legal)
+
+    @staticmethod
+    def _get_leaderboard(year, k, where, legal=False):
+        """
+        Get the `k` best athletes of every discipline and age group with one
+        query for the best performance of each athlete in each discipline.
+
+        Args:
+            year (int): The year of the performances.
+            k (int): The number of athletes per discipline and age group.
+            where (str): 'Halle', 'Freiluft' or 'Halle + Freiluft'.
+            legal (bool): Only include performances with legal wind.
+
+        Returns:
+            dict: The rows of the rankings (see `Rankings`) by discipline
+                and age group.
+
+        """
+        number = Performance.number
+        ascending = Performance.discipline.in_(
+            [d for d, higher_is_better in ASCENDING.items()
+             if higher_is_better])
+        query = db.session.query(
+            Performance.discipline, Performance.value, Performance.wind,
+            Performance.city, Performance.date, Athlete.name, Athlete.gender,
+            Athlete.year_of_birth,
+            # the bare columns are taken from the row of the minimum (SQLite)
+            db.func.min(db.case((ascending, -number), else_=number)
+                        ).label("key")
+        ).join(Athlete, Athlete.id == Performance.athlete_id).filter(
+            Performance.date.like(f"%.{year}"),
+            Athlete.year_of_birth.isnot(None),
+            ~Performance.value.contains("a"),
+            ~Performance.value.contains("d"),
+            ~Performance.value.contains("o"),
+            number > 0
+        )
+        if where != "Halle + Freiluft":
+            query = query.filter(Performance.indoor == (where == "Halle"))
+        if legal:
+            query = query.filter(Performance.wind_legal.is_(True))
+        query = query.group_by(Performance.discipline, Performance.athlete_id)
+
+        disciplines = dict()
+        for row in query:
+            disciplines.setdefault(row.discipline, []).append(row)
+
+        leaderboard = dict()
+        for discipline, rows in disciplines.items():
+            rows.sort(key=lambda x: x.key)
+            agegroups = dict()
+            for agegroup in AGEGROUPS:
+                gender, max_age = _get_agegroup_filter(agegroup)
+                best = [
+                    r for r in rows
+                    if (gender is None or r.gender == gender)
+                    and year - r.year_of_birth <= max_age
+                ][:k]
+                if best:
+                    agegroups[agegroup] = [
+                        [i + 1] + _get_ranking_row(r, r, str(year))[1:]
+                        for i, r in enumerate(best)
+                    ]
+            name = INVERSE_DISCIPLINE_MAPPER.get(discipline, discipline)
+            leaderboard[name] = agegroups
+        return {name: leaderboard[name] for name in sorted(leaderboard)}
+
+
 class Rankings(Resource):
     """
     API Endpoint for getting data from a sensor.
@@ -510,83 +1109,35 @@ class Rankings(Resource):
             agegroup = "Alle"
         if not where:
             where = "Halle + Freiluft"
-        return self._get_rankings(agegroup, discipline, year, where)
-
-    def _get_rankings(self, agegroup, discipline, year, where):
-        agegroup_offset = {
-            "U23": 22, "JU20": 19, "JU18": 17, "JU16": 15
-        }.get(agegroup[1:], 100)
-        if agegroup != "Alle":
-            query_gender = "M" if agegroup[0] == "M" else "W"
+        legal = request.args.get("legal") == "true"
+        return _get_cached("ranking", self._get_rankings, agegroup,
+                           discipline, year, where, legal)
+
+    def _get_rankings(self, agegroup, discipline, year, where, legal=False):
+        query_gender, agegroup_offset = _get_agegroup_filter(agegroup)
+        if query_gender is not None:
             athletes = Athlete.query.filter_by(gender=query_gender).all()
         else:
             athletes = Athlete.query.all()
-        performances = dict()
         athlete_dict = {a.id: a for a in athletes}
-
         query_disc = DISCIPLINE_MAPPER.get(discipline)
-
-        query = Performance.query.filter_by(discipline=query_disc).filter(
-            ~Performance.value.contains("a"),
-            ~Performance.value.contains("d"),
-            ~Performance.value.contains("o")
-        )
-        if year != "Ewige":
-            query = query.filter(Performance.date.contains(year))
-        if where != "Halle + Freiluft":
-            query = query.filter_by(indoor=where == "Halle")
-        for athlete in athletes:
-            performances[athlete.id] = query.filter_by(athlete_id=athlete.id).all()
+        indoor = None if where == "Halle + Freiluft" else where == "Halle"
+        if current_app.config["ANALYTICS_ENGINE"]:
+            best_performances = _get_best_performances_vectorized(
+                athlete_dict, query_disc, year, indoor, agegroup_offset,
+                legal)
+        else:
+            best_performances = _get_best_performances(
+                athlete_dict, query_disc, year, indoor, agegroup_offset,
+                legal)
 
         ranking_performances = []
-        for athlete_key in performances:
-            athlete = athlete_dict[athlete_key]
-            age = athlete.year_of_birth
-
-            valid_performances = []
-            for p in performances[athlete_key]:
-                pyear = int(p.date.split(".")[-1])
-                if pyear - age > agegroup_offset:
-                    continue
-                valid_performances.append(p)
-
-            if not valid_performances:
+        for athlete in athletes:
+            best_performance = best_performances.get(athlete.id)
+            if best_performance is None:
                 continue
-
-            valid_performances.sort(
-                key=lambda x: map_to_number(x.value),
-                reverse=ASCENDING.get(DISCIPLINE_MAPPER[discipline], False)
-            )
-            best_performance = valid_performances[0]
-            best_performance_year = int(best_performance.date.split(".")[-1])
-            if year == "Ewige":
-                athlete_age = datetime.now().year - age
-            else:
-                athlete_age = best_performance_year - age
-            if athlete_age < 16:
-                athlete_agegroup = "JU16"
-            elif athlete_age < 18:
-                athlete_agegroup = "JU18"
-            elif athlete_age < 20:
-                athlete_agegroup = "JU20"
-            elif athlete_age < 23:
-                athlete_agegroup = "U23"
-            else:
-                athlete_agegroup = ""
-
-            if best_performance.wind is not None:
-                value = f"{best_performance.value} ({'+' if best_performance.wind > 0.0 else ''}{best_performance.wind:.1f})"
-            else:
-                value = best_performance.value
-
-            ranking_performance = [
-                best_performance.value,
-                athlete.name,
-                athlete.gender + athlete_agegroup,
-                value,
-                f"{best_performance.city}, den {best_performance.date}"
-            ]
-            ranking_performances.append(ranking_performance)
+            ranking_performances.append(
+                _get_ranking_row(athlete, best_performance, year))
 
         ranking_performances.sort(
             key=lambda x: map_to_number(x[0]),
@@ -596,6 +1147,160 @@ class Rankings(Resource):
         return [[i + 1] + l[1:] for i, l in enumerate(ranking_performances)]
 
 
+def _get_agegroup_filter(agegroup):
+    """
+    Get the athletes of an age group of the rankings.
+
+    Args:
+        agegroup (str): The age group, e.g. 'MJU18', 'Frauen' or 'Alle'.
+
+    Returns:
+        tuple: The gender of the athletes (None for all) and their maximum
+            age in the year of a performance.
+
+    """
+    max_age = {
+        "U23": 22, "JU20": 19, "JU18": 17, "JU16": 15
+    }.get(agegroup[1:], 100)
+    if agegroup == "Alle":
+        return None, max_age
+    return "M" if agegroup[0] == "M" else "W", max_age
+
+
+def _get_ranking_row(athlete, performance, year):
+    """
+    Get the row of the rankings for the best performance of an athlete.
+
+    Args:
+        athlete: The athlete with `name`, `gender` and `year_of_birth`.
+        performance: The performance with `value`, `wind`, `city` and
+            `date`.
+        year (str): The year of the rankings or 'Ewige' for all years.
+
+    Returns:
+        list: The value, the name, the age group, the value with the wind
+            and the place of the performance.
+
+    """
+    age = athlete.year_of_birth
+    best_performance_year = int(performance.date.split(".")[-1])
+    if year == "Ewige":
+        athlete_age = datetime.now().year - age
+    else:
+        athlete_age = best_performance_year - age
+    if athlete_age < 16:
+        athlete_agegroup = "JU16"
+    elif athlete_age < 18:
+        athlete_agegroup = "JU18"
+    elif athlete_age < 20:
+        athlete_agegroup = "JU20"
+    elif athlete_age < 23:
+        athlete_agegroup = "U23"
+    else:
+        athlete_agegroup = ""
+
+    if performance.wind is not None:
+        value = f"{performance.value} ({'+' if performance.wind > 0.0 else ''}{performance.wind:.1f})"
+    else:
+        value = performance.value
+
+    return [
+        performance.value,
+        athlete.name,
+        athlete.gender + athlete_agegroup,
+        value,
+        f"{performance.city}, den {performance.date}"
+    ]
+
+
+def _get_best_performances(athletes, discipline, year, indoor, max_age,
+                           legal=False):
+    """
+    Get the best performance of each athlete in a discipline with one query
+    per athlete.
+
+    Args:
+        athletes (dict): The athletes to include by id.
+        discipline (str): The discipline as stored, e.g. '100'.
+        year (str): The year of the performances or 'Ewige' for all years.
+        indoor (bool): Only include indoor (True) or outdoor (False)
+            performances, all if None.
+        max_age (int): The maximum age of the athletes in the year of the
+            performances.
+        legal (bool): Only include performances with legal wind.
+
+    Returns:
+        dict: The best performances by athlete id.
+
+    """
+    query = Performance.query.filter_by(discipline=discipline).filter(
+        ~Performance.value.contains("a"),
+        ~Performance.value.contains("d"),
+        ~Performance.value.contains("o")
+    )
+    if year != "Ewige":
+        query = query.filter(Performance.date.contains(year))
+    if indoor is not None:
+        query = query.filter_by(indoor=indoor)
+    if legal:
+        query = query.filter(Performance.wind_legal.is_(True))
+
+    best_performances = dict()
+    for athlete in athletes.values():
+        valid_performances = []
+        for p in query.filter_by(athlete_id=athlete.id).all():
+            pyear = int(p.date.split(".")[-1])
+            if pyear - athlete.year_of_birth > max_age:
+                continue
+            if map_to_number(p.value) < 0:
+                continue
+            valid_performances.append(p)
+        if not valid_performances:
+            continue
+        valid_performances.sort(key=lambda x: map_to_number(x.value),
+                                reverse=ASCENDING.get(discipline, False))
+        best_performances[athlete.id] = valid_performances[0]
+    return best_performances
+
+
+def _get_best_performances_vectorized(athletes, discipline, year, indoor,
+                                      max_age, legal=False):
+    """
+    Get the best performance of each athlete in a discipline like
+    `_get_best_performances` from the arrays of `tfomat.analytics`.
+
+    Args:
+        athletes (dict): The athletes to include by id.
+        discipline (str): The discipline as stored, e.g. '100'.
+        year (str): The year of the performances or 'Ewige' for all years.
+        indoor (bool): Only include indoor (True) or outdoor (False)
+            performances, all if None.
+        max_age (int): The maximum age of the athletes in the year of the
+            performances.
+        legal (bool): Only include performances with legal wind.
+
+    Returns:
+        dict: The best performances by athlete id.
+
+    """
+    from tfomat.analytics import performance_arrays
+
+    if year != "Ewige" and not year.isdigit():
+        return dict()
+    best = performance_arrays.best_per_athlete(
+        discipline, year=None if year == "Ewige" else int(year),
+        indoor=indoor,
+        years_of_birth={a.id: a.year_of_birth for a in athletes.values()},
+        max_age=max_age, legal=legal)
+    performances = {
+        p.id: p for p in
+        Performance.query.filter(Performance.id.in_(list(best.values())))
+    }
+    return {athlete_id: performances[performance_id]
+            for athlete_id, performance_id in best.items()
+            if performance_id in performances}
+
+
 class AthletePerformances(Resource):
     def get(self):
         athlete_id = request.args.get("id")
@@ -603,60 +1308,148 @@ class AthletePerformances(Resource):
             return {}
 
         performances = Performance.query.filter_by(athlete_id=athlete_id).all()
-        fmt_performances = []
-        for p in performances:
-            if map_to_number(p.value) < 0:
-                continue
-            if not p.wind:
-                value = p.value
-            else:
-                value = f"{p.value} ({'+' if p.wind > 0 else ''}{p.wind:.1f})"
-            fmt_performances.append(
-                [p.date, p.city, INVERSE_DISCIPLINE_MAPPER.get(p.discipline, p.discipline), value]
-            )
-        discipline_options = list(set([fp[2] for fp in fmt_performances]))
-        year_options = list(set([fp[0].split(".")[-1] for fp in fmt_performances]))
-        return {
-            "discipline_options": discipline_options,
-            "year_options": year_options,
-            "table_data": fmt_performances
-        }
+        return _format_performances(performances)
+
+
+def _format_performances(performances):
+    fmt_performances = []
+    for p in performances:
+        if map_to_number(p.value) < 0:
+            continue
+        if not p.wind:
+            value = p.value
+        else:
+            value = f"{p.value} ({'+' if p.wind > 0 else ''}{p.wind:.1f})"
+        fmt_performances.append(
+            [p.date, p.city, INVERSE_DISCIPLINE_MAPPER.get(p.discipline, p.discipline), value]
+        )
+    discipline_options = list(set([fp[2] for fp in fmt_performances]))
+    year_options = list(set([fp[0].split(".")[-1] for fp in fmt_performances]))
+    return {
+        "discipline_options": discipline_options,
+        "year_options": year_options,
+        "table_data": fmt_performances
+    }
+
+
+class JobStatus(Resource):
+    def get(self):
+        job_id = request.args.get("id")
+        if job_id is None:
+            return {"error": "Missing parameters."}
+        job = Job.query.get(job_id)
+        if job is None:
+            return {"error": "Job does not exist."}
+        return job.to_dict()
 
 
 class Events(Resource):
     def get(self):
-        cache_path = os.path.join(current_app.root_path, "cache")
         year = request.args.get("year")
         if not year:
             return {"status": "failed", "value": "parameter 'year' was not specified"}
-        cache_path = os.path.join(current_app.root_path, "cache")
-        cached_file = os.path.join(cache_path, f"events_{year}.json")
-        if os.path.exists(cached_file):
-            with open(cached_file, "r") as f:
-                cache = json.load(f)
-        else:
-            cache = None
-        if int(year) == datetime.now().year or not cache:
-            club_id = current_app.config["CLUB_ID"]
-            lv = current_app.config["LV"]
-            ladv_key = current_app.config["LADV-API-KEY"]
-            new_events = get_club_results(club_id, lv, ladv_key, year,
-                                          cache_path=cache_path, cache=cache)
-        else:
-            new_events = cache
+        try:
+            year = int(year)
+        except ValueError:
+            return {"status": "failed", "value": "parameter 'year' needs to be a number"}
+
+        known_urls = {
+            url for (url,) in
+            db.session.query(Event.url).filter_by(year=year)
+        }
+        if not known_urls:
+            known_urls = _import_cached_events(year)
+        headers = {}
+        if year == datetime.now().year:
+            listing = get_listing(f"events-{year}", _refresh_events, year,
+                                  has_data=bool(known_urls))
+            headers = freshness_headers(listing)
+        elif not known_urls:
+            _refresh_events(year)
 
         fmt_events = [
             [
-                e["datumText"].split("/")[-1],
-                e["ort"],
-                '<a href="{}">{}</a>'.format(
-                    url_for("views.show_results", meeting_id=e["id"]),
-                    e["name"]
+                e.date,
+                e.city,
+                e.name if e.result_id is None else '<a href="{}">{}</a>'.format(
+                    url_for("views.show_results", meeting_id=e.result_id),
+                    e.name
                 )
             ]
-            for e in new_events
+            for e in Event.query.filter_by(year=year)
         ]
-        return {"status": "success", "value": fmt_events}
+        return {"status": "success", "value": fmt_events}, 200, headers
+
+
+def _refresh_events(year):
+    today = datetime.today()
+    known_urls = set()
+    for url, result_id, date in db.session.query(
+            Event.url, Event.result_id, Event.date).filter_by(year=year):
+        try:
+            upcoming = datetime.strptime(date, "%d.%m.%Y") > today
+        except (TypeError, ValueError):
+            upcoming = False
+        # past events without results are fetched again until the results
+        # are published
+        if result_id is not None or upcoming:
+            known_urls.add(url)
+    new_events = get_club_results(
+        current_app.config["CLUB_ID"], current_app.config["LV"],
+        current_app.config["LADV_API_KEY"], year, known_urls=known_urls
+    )
+    upsert_events(new_events, year)
+
+
+def _import_cached_events(year):
+    """
+    Move the events of a year from the former `events_<year>.json` cache
+    file into the database.
+
+    Args:
+        year (int): The year of the events.
+
+    Returns:
+        set: The URLs of the imported events.
+
+    """
+    cache_path = current_app.config["CACHE_PATH"] or os.path.join(
+        current_app.root_path, "cache")
+    cached_file = os.path.join(cache_path, f"events_{year}.json")
+    if not os.path.exists(cached_file):
+        return set()
+    with open(cached_file, "r") as f:
+        events = json.load(f)
+    upsert_events(events, year)
+    os.remove(cached_file)
+    return {e["url"] for e in events}
+
+
+def _get_cached(name, func, *args):
+    """
+    Get data that is derived from the database from the result cache or
+    compute and cache it.
+
+    Entries are cached by the version of the data, so they are recomputed
+    after every change of athletes, performances or qualification norms.
+
+    Args:
+        name (str): The name of the data, e.g. 'ranking'.
+        func (function): The function that computes the data from `args`.
+        *args: The arguments for `func`, which identify the entry.
+
+    Returns:
+        The data.
+
+    """
+    key = json.dumps([get_data_version(), *args])
+    key = f"{name}-{sha256(key.encode('utf-8')).hexdigest()[:32]}.json"
+    cached = result_cache.read(key)
+    if cached is not None:
+        return json.loads(cached)
+    data = func(*args)
+    result_cache.put(key, json.dumps(data).encode("utf-8"))
+    return data
 
 
 def add_resources(api):
@@ -671,10 +1464,16 @@ def add_resources(api):
     """
     api.add_resource(AthleteInfo, "/api/athlete-info")
     api.add_resource(Rankings, "/api/ranking")
+    api.add_resource(Leaderboard, "/api/leaderboard")
     api.add_resource(AddDatabaseEntry, "/api/add-database-entry")
+    api.add_resource(ImportPerformances, "/api/import-performances")
     api.add_resource(AthletePerformances, "/api/athlete-performances")
     api.add_resource(Events, "/api/events")
     api.add_resource(AthleteDisciplines, "/api/athlete-disciplines")
+    api.add_resource(AthleteProfile, "/api/athlete-profile")
+    api.add_resource(AthleteProgression, "/api/athlete-progression")
     api.add_resource(AthleteUpcomingCompetitions, "/api/athlete-upcoming-competitions")
     api.add_resource(AthleteLastCompetitions, "/api/athlete-last-competitions")
     api.add_resource(AddQualificationNorm, "/api/add-qualification-norm")
+    api.add_resource(Qualifications, "/api/qualifications")
+    api.add_resource(JobStatus, "/api/job-status")
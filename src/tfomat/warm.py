@@ -0,0 +1,113 @@
+"""Prebuild the cached rankings, profiles and event listings."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from time import perf_counter
+from urllib.parse import urlencode
+
+from tfomat.map import DISCIPLINE_MAPPER, AGEGROUPS
+from tfomat.models import db, Performance
+
+
+def get_sections(app, profiles=50):
+    """
+    Get the URLs of the most requested pages by section.
+
+    Args:
+        app (flask.Flask): The application.
+        profiles (int): The number of athlete profiles to prebuild. The
+            athletes with the most performances in this and the last year
+            are chosen.
+
+    Returns:
+        dict: The URLs to request by section.
+
+    """
+    year = datetime.now().year
+    with app.app_context():
+        recent = Performance.date.like(f"%.{year}") | \
+            Performance.date.like(f"%.{year - 1}")
+        athlete_ids = [
+            athlete_id for athlete_id, in db.session.query(
+                Performance.athlete_id
+            ).filter(recent).group_by(Performance.athlete_id).order_by(
+                db.func.count().desc()
+            ).limit(profiles)
+        ]
+    return {
+        "rankings": [
+            "/api/ranking?" + urlencode({"disc": discipline, "year": y,
+                                         "age": agegroup})
+            for discipline in DISCIPLINE_MAPPER
+            for y in (year, year - 1)
+            for agegroup in AGEGROUPS
+        ],
+        "profiles": [f"/api/athlete-profile?id={athlete_id}"
+                     for athlete_id in athlete_ids],
+        "events": [f"/api/events?year={year}", "/upcoming-events/"]
+    }
+
+
+def warm(app, profiles=50, workers=4):
+    """
+    Request the most requested pages once, so they are cached before the
+    first visitor requests them.
+
+    Args:
+        app (flask.Flask): The application.
+        profiles (int): The number of athlete profiles to prebuild.
+        workers (int): The number of requests that are made at the same
+            time.
+
+    Returns:
+        dict: The number of requests, failed requests and seconds by
+            section.
+
+    """
+    def get(url):
+        response = app.test_client().get(url)
+        return response.status_code < 400
+
+    report = dict()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for section, urls in get_sections(app, profiles).items():
+            start = perf_counter()
+            succeeded = list(executor.map(get, urls))
+            report[section] = {
+                "requests": len(urls),
+                "failed": succeeded.count(False),
+                "seconds": perf_counter() - start
+            }
+    return report
+
+
+def main():
+    from tfomat import init_app
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--profiles", type=int, default=50,
+                        help="number of athlete profiles to prebuild")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="number of requests at the same time")
+    args = parser.parse_args()
+
+    # the process exits before background refreshes of listings would end
+    app = init_app({"REFRESH_IN_BACKGROUND": False})
+    report = warm(app, args.profiles, args.workers)
+    for section, stats in report.items():
+        print(f"{section}: {stats['requests']} requests in "
+              f"{stats['seconds']:.1f} s ({stats['failed']} failed)")
+    return 1 if any(s["failed"] for s in report.values()) else 0
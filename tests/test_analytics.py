@@ -0,0 +1,166 @@
+"""Check that the NumPy rankings agree with the SQL rankings."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import random
+
+import pytest
+from tfomat import analytics
+from tfomat.map import AGEGROUPS
+from tfomat.models import db, Athlete, Performance
+from tfomat.views import Rankings
+
+YEARS = ["2023", "2024", "Ewige"]
+WHERE = ["Halle + Freiluft", "Halle", "Freiluft"]
+WINDS = [None, -0.4, 1.8, 2.0, 2.1, 3.5]
+INVALID_VALUES = ["aufg.", "disq.", "DNS"]
+# display name, whether there is a wind measurement and the possible values
+DISCIPLINES = {
+    "100": ("100 m", True, [f"{v // 100},{v % 100:02d}"
+                            for v in range(1050, 1500)]),
+    "60": ("60 m", False, [f"{v // 100},{v % 100:02d}"
+                           for v in range(680, 950)]),
+    "WEI": ("Weitsprung", True, [f"{v // 100},{v % 100:02d}"
+                                 for v in range(400, 720)])
+}
+
+
+@pytest.fixture
+def arrays(monkeypatch):
+    """Fresh arrays, so no data of the database of another test remains."""
+    arrays = analytics.PerformanceArrays()
+    monkeypatch.setattr(analytics, "performance_arrays", arrays)
+    return arrays
+
+
+@pytest.fixture
+def data(app):
+    """Add athletes and performances and get the random number generator."""
+    rng = random.Random(0)
+    athletes = [
+        Athlete(name=f"Athlet {i}", gender=gender, year_of_birth=year)
+        for i, (gender, year) in enumerate([
+            ("M", 1998), ("M", 2005), ("M", 2007), ("M", 2009),
+            ("W", 1999), ("W", 2004), ("W", 2006), ("W", 2008)
+        ])
+    ]
+    db.session.add_all(athletes)
+    db.session.commit()
+    _add_performances(rng, 150)
+    return rng
+
+
+def _add_performances(rng, n):
+    """Add `n` performances of each discipline and commit them."""
+    athletes = Athlete.query.all()
+    used = {p.value for p in Performance.query.all()}
+    for code, (_, has_wind, values) in DISCIPLINES.items():
+        # values are unique, so the order of a ranking is well defined
+        choices = [v for v in values if v not in used]
+        for value in rng.sample(choices, n):
+            if rng.random() < 0.05:
+                value = rng.choice(INVALID_VALUES)
+            month = rng.randint(1, 12)
+            db.session.add(Performance(
+                date=f"{rng.randint(1, 28):02d}.{month:02d}."
+                     f"{rng.choice(YEARS[:-1])}",
+                city="Bremen",
+                athlete_id=rng.choice(athletes).id,
+                discipline=code,
+                value=value,
+                wind=rng.choice(WINDS) if has_wind else None,
+                indoor=not 2 < month < 11
+            ))
+    db.session.commit()
+
+
+def _compare(app):
+    """Get the rankings that differ and the number of rankings compared."""
+    mismatches = []
+    compared = 0
+    for name, _, _ in DISCIPLINES.values():
+        for year in YEARS:
+            for agegroup in AGEGROUPS:
+                for where in WHERE:
+                    for legal in (False, True):
+                        rankings = dict()
+                        for engine in (False, True):
+                            app.config["ANALYTICS_ENGINE"] = engine
+                            rankings[engine] = Rankings()._get_rankings(
+                                agegroup, name, year, where, legal)
+                        if rankings[False] != rankings[True]:
+                            mismatches.append(
+                                (name, year, agegroup, where, legal))
+                        compared += bool(rankings[False])
+    return mismatches, compared
+
+
+def test_rankings_match_sql(app, arrays, data):
+    mismatches, compared = _compare(app)
+    assert mismatches == []
+    assert compared > 0
+
+
+def test_legal_rankings_exclude_wind_assisted(app, arrays, data):
+    app.config["ANALYTICS_ENGINE"] = True
+    ranking = Rankings()._get_rankings("Alle", "100 m", "Ewige",
+                                       "Halle + Freiluft", True)
+    legal = {p.value for p in Performance.query.filter(
+        Performance.discipline == "100", Performance.wind_legal.is_(True))}
+    assert ranking
+    # the value is followed by the wind, values are unique
+    assert all(row[3].split(" (")[0] in legal for row in ranking)
+
+
+def _insert(rng):
+    _add_performances(rng, 10)
+
+
+def _update(rng):
+    performances = rng.sample(Performance.query.all(), 30)
+    for p in performances[:10]:
+        p.value = rng.choice(INVALID_VALUES)
+    for p in performances[10:20]:
+        p.wind = rng.choice(WINDS) if p.wind is not None else None
+    for p in performances[20:]:
+        p.athlete_id = rng.choice(Athlete.query.all()).id
+    db.session.commit()
+
+
+def _delete(rng):
+    best = Performance.query.filter(Performance.number > 0).order_by(
+        Performance.number).limit(10).all()
+    for p in set(best + rng.sample(Performance.query.all(), 10)):
+        db.session.delete(p)
+    db.session.commit()
+
+
+@pytest.mark.parametrize("change", [_insert, _update, _delete])
+def test_refresh_applies_changes(app, arrays, data, change):
+    assert arrays.refresh()
+    assert not arrays.refresh()
+    loaded = []
+    query_rows = arrays._query_rows
+
+    def spy(*criteria):
+        loaded.append(criteria)
+        return query_rows(*criteria)
+
+    arrays._query_rows = spy
+    change(data)
+    assert arrays.refresh()
+    # only the changed performances were read again
+    assert len(loaded) == 1 and loaded[0]
+    mismatches, compared = _compare(app)
+    assert mismatches == []
+    assert compared > 0
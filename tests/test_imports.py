@@ -0,0 +1,111 @@
+"""Check the validation, rollback and deduplication of bulk imports."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import pytest
+from tfomat.models import db, Athlete, Performance
+
+URL = "/api/import-performances?token=lebenslanggruenweiss"
+
+
+@pytest.fixture
+def athlete(app):
+    athlete = Athlete(name="Lena Meyer", gender="W", year_of_birth=2007)
+    db.session.add(athlete)
+    db.session.commit()
+    return athlete
+
+
+def _row(**fields):
+    row = {"date": "01.06.2024", "city": "Bremen", "athlete": "Lena Meyer",
+           "discipline": "100 m", "value": "12,34", "wind": "+1,2",
+           "placement": "2.", "indoor": "false"}
+    row.update(fields)
+    return row
+
+
+def test_import_inserts_all_rows(client, athlete):
+    response = client.post(URL, json=[_row(), _row(value="12,10")])
+    data = response.get_json()
+    assert data["status"] == "success"
+    assert data["inserted"] == 2
+    assert [r["status"] for r in data["rows"]] == ["inserted", "inserted"]
+    performances = Performance.query.order_by(Performance.id).all()
+    assert [p.value for p in performances] == ["12,34", "12,10"]
+    assert performances[0].athlete_id == athlete.id
+    assert performances[0].discipline == "100"
+    assert performances[0].wind == 1.2
+    assert performances[0].placement == 2
+    assert performances[0].number == pytest.approx(12.34)
+    assert performances[0].wind_legal
+
+
+@pytest.mark.parametrize("field, value", [
+    ("date", "2024-06-01"),
+    ("discipline", "Sackhüpfen"),
+    ("value", "schnell"),
+    ("wind", "viel"),
+    ("indoor", "ja"),
+    ("athlete", "Unbekannt")
+])
+def test_import_writes_nothing_if_a_row_is_invalid(client, athlete, field,
+                                                   value):
+    rows = [_row(), _row(value="12,10", **{field: value}), _row(value="12,50")]
+    data = client.post(URL, json=rows).get_json()
+    assert data["status"] == "failed"
+    assert data["inserted"] == 0
+    assert [r["status"] for r in data["rows"]] == ["valid", "failed", "valid"]
+    assert data["rows"][1]["value"]
+    assert Performance.query.count() == 0
+
+
+def test_import_skips_duplicates_and_existing_performances(client, athlete):
+    data = client.post(URL, json=[_row(), _row()]).get_json()
+    assert [r["status"] for r in data["rows"]] == ["inserted", "duplicate"]
+    assert data["inserted"] == 1
+
+    data = client.post(URL, json=[_row(), _row(value="12,10")]).get_json()
+    assert [r["status"] for r in data["rows"]] == ["exists", "inserted"]
+    assert data["rows"][0]["value"]["value"] == "12,34"
+    assert Performance.query.count() == 2
+
+
+def test_import_reads_csv_and_ndjson(client, athlete):
+    csv = "date,city,athlete,discipline,value,indoor\n" \
+          "01.02.2024,Berlin,Lena Meyer,60 m,\"7,80\",true\n"
+    data = client.post(URL, data=csv.encode("utf-8"),
+                       content_type="text/csv").get_json()
+    assert data["inserted"] == 1
+
+    ndjson = '{"date": "02.02.2024", "city": "Berlin", ' \
+             '"athlete": "Lena Meyer", "discipline": "60 m", ' \
+             '"value": "7,75", "indoor": "true"}\n\n'
+    data = client.post(URL, data=ndjson.encode("utf-8"),
+                       content_type="application/x-ndjson").get_json()
+    assert data["inserted"] == 1
+    assert {p.value for p in Performance.query} == {"7,80", "7,75"}
+
+
+def test_import_rejects_too_many_rows(app, client, athlete):
+    app.config["IMPORT_MAX_ROWS"] = 2
+    rows = [_row(value=f"12,{i:02d}") for i in range(3)]
+    data = client.post(URL, json=rows).get_json()
+    assert data["status"] == "failed"
+    assert Performance.query.count() == 0
+
+
+def test_import_requires_token(client, athlete):
+    data = client.post("/api/import-performances?token=falsch",
+                       json=[_row()]).get_json()
+    assert data == {"status": "failed", "value": "forbidden"}
+    assert Performance.query.count() == 0
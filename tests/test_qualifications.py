@@ -0,0 +1,109 @@
+"""Check that qualifications follow changes of athletes, performances and
+norms."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import pytest
+from tfomat.models import db, Athlete, Performance, Qualification, \
+    QualificationNorm
+
+
+@pytest.fixture
+def athlete(app):
+    # 16 in 2024
+    athlete = Athlete(name="Finn Koch", gender="M", year_of_birth=2008)
+    db.session.add(athlete)
+    db.session.add(QualificationNorm(
+        title="DM", agegroup="MJU18", gender="M", discipline="100",
+        value="11,80", indoor=False))
+    db.session.add(QualificationNorm(
+        title="DM", agegroup="MJU18", gender="M", discipline="WEI",
+        value="6,20", indoor=False))
+    db.session.commit()
+    return athlete
+
+
+def _add(athlete, discipline, value, date="01.06.2024"):
+    performance = Performance(date=date, city="Bremen",
+                              athlete_id=athlete.id, discipline=discipline,
+                              value=value, indoor=False)
+    db.session.add(performance)
+    db.session.commit()
+    return performance
+
+
+def _qualified():
+    """Get the disciplines, years and performance values that qualified."""
+    query = db.session.query(
+        QualificationNorm.discipline, Qualification.year, Performance.value
+    ).select_from(Qualification).join(
+        QualificationNorm, QualificationNorm.id == Qualification.norm_id
+    ).join(Performance, Performance.id == Qualification.performance_id)
+    return {tuple(row) for row in query}
+
+
+def test_best_performance_qualifies(athlete):
+    _add(athlete, "100", "11,75")
+    _add(athlete, "100", "11,60")
+    _add(athlete, "100", "11,90")
+    _add(athlete, "WEI", "6,10")
+    _add(athlete, "WEI", "6,35")
+    _add(athlete, "WEI", "aufg.")
+    assert _qualified() == {("100", 2024, "11,60"), ("WEI", 2024, "6,35")}
+
+
+def test_year_of_birth_change_updates_qualifications(athlete):
+    _add(athlete, "100", "11,60")
+    assert _qualified() == {("100", 2024, "11,60")}
+
+    # 19 in 2024, too old for U18
+    athlete.year_of_birth = 2005
+    db.session.commit()
+    assert _qualified() == set()
+
+    athlete.year_of_birth = 2008
+    db.session.commit()
+    assert _qualified() == {("100", 2024, "11,60")}
+
+
+def test_performance_changes_update_qualifications(athlete):
+    performance = _add(athlete, "100", "11,60")
+    performance.value = "12,00"
+    db.session.commit()
+    assert _qualified() == set()
+
+    performance.value = "11,70"
+    db.session.commit()
+    assert _qualified() == {("100", 2024, "11,70")}
+
+    db.session.delete(performance)
+    db.session.commit()
+    assert _qualified() == set()
+
+
+def test_november_counts_for_next_year(athlete):
+    _add(athlete, "100", "11,60", date="15.11.2024")
+    assert _qualified() == {("100", 2025, "11,60")}
+
+
+def test_norm_changes_update_qualifications(athlete):
+    _add(athlete, "100", "11,60")
+    norm = QualificationNorm.query.filter_by(discipline="100").one()
+    norm.value = "11,50"
+    db.session.commit()
+    assert _qualified() == set()
+
+    norm.gender = "W"
+    norm.value = "12,00"
+    db.session.commit()
+    assert _qualified() == set()
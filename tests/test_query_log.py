@@ -0,0 +1,93 @@
+"""Check the query budgets of hot endpoints and the N+1 detection."""
+# Copyright (C) 2024  Keno Krieger <kriegerk@uni-bremen.de>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import pytest
+from tfomat import analytics
+from tfomat.models import db, Athlete, Performance
+from tfomat.query_log import fingerprint, NPlusOneDetector, NPlusOneError
+
+
+@pytest.fixture
+def athletes(app, monkeypatch):
+    """Athletes with performances in several disciplines and years."""
+    monkeypatch.setattr(analytics, "performance_arrays",
+                        analytics.PerformanceArrays())
+    athletes = [Athlete(name=f"Athlet {i}", gender="MW"[i % 2],
+                        year_of_birth=2000 + i) for i in range(20)]
+    db.session.add_all(athletes)
+    db.session.commit()
+    for i, athlete in enumerate(athletes):
+        for j, (discipline, value) in enumerate(
+                [("100", f"11,{i:02d}"), ("WEI", f"6,{i:02d}"),
+                 ("100", f"12,{i:02d}")]):
+            db.session.add(Performance(
+                date=f"{j + 1:02d}.06.202{j}", city="Bremen",
+                athlete_id=athlete.id, discipline=discipline, value=value,
+                wind=1.0, indoor=False))
+    db.session.commit()
+    return athletes
+
+
+def test_fingerprint_replaces_literals():
+    assert fingerprint("SELECT * FROM athlete WHERE id = 12") == \
+        fingerprint("SELECT * FROM athlete WHERE id = 3")
+    assert fingerprint(
+        "SELECT name\n  FROM athlete  WHERE name = 'O''Brien' AND x = 1.5"
+    ) == "SELECT name FROM athlete WHERE name = ? AND x = ?"
+
+
+def test_fingerprint_collapses_lists():
+    assert fingerprint("SELECT * FROM performance WHERE id IN (?, ?, ?)") == \
+        fingerprint("SELECT * FROM performance WHERE id IN (1, 2)") == \
+        "SELECT * FROM performance WHERE id IN (?)"
+
+
+def test_fingerprint_keeps_identifiers():
+    assert fingerprint("SELECT t1.value FROM performance AS t1") == \
+        "SELECT t1.value FROM performance AS t1"
+
+
+def test_athlete_profile_budget(client, query_budget, athletes):
+    with query_budget(max_queries=6, max_repeats=1):
+        response = client.get(f"/api/athlete-profile?id={athletes[0].id}")
+    assert len(response.get_json()["disciplines"]) == 2
+
+
+def test_vectorized_ranking_budget(app, client, query_budget, athletes):
+    app.config["ANALYTICS_ENGINE"] = True
+    with query_budget(max_queries=10, max_repeats=1):
+        response = client.get("/api/ranking?disc=100 m&year=Ewige")
+    assert len(response.get_json()) == len(athletes)
+
+
+def test_query_budget_fails_on_repeated_statements(query_budget, athletes):
+    with pytest.raises(pytest.fail.Exception):
+        with query_budget(max_repeats=3):
+            for athlete in athletes:
+                Performance.query.filter_by(athlete_id=athlete.id).all()
+
+
+def test_detector_raises_on_repeated_statements(app, client, athletes):
+    app.config["NPLUSONE_THRESHOLD"] = 3
+    app.config["NPLUSONE_RAISE"] = True
+    NPlusOneDetector().init_app(app)
+
+    @app.route("/n-plus-one")
+    def n_plus_one():
+        return str(sum(
+            len(Performance.query.filter_by(athlete_id=a.id).all())
+            for a in Athlete.query.all()))
+
+    with pytest.raises(NPlusOneError):
+        client.get("/n-plus-one")
@@ -1,2 +1,4 @@
 cd /home/adb
 python3 update_database.py
+# prebuild the rankings and profiles that the update invalidated
+tfomat-warm